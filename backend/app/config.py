@@ -13,10 +13,80 @@ class Settings(BaseModel):
     supabase_anon_key: str = Field(default_factory=lambda: getenv('SUPABASE_ANON_KEY', ''))
     supabase_jwt_secret: str = Field(default_factory=lambda: getenv('SUPABASE_JWT_SECRET', ''))
     supabase_schema: str = Field(default_factory=lambda: getenv('SUPABASE_DB_SCHEMA', 'public'))
+    supabase_pool_size: int = Field(default_factory=lambda: int(getenv('SUPABASE_POOL_SIZE', '20')))
+    supabase_pool_keepalive: int = Field(default_factory=lambda: int(getenv('SUPABASE_POOL_KEEPALIVE', '10')))
+    supabase_timeout_seconds: float = Field(default_factory=lambda: float(getenv('SUPABASE_TIMEOUT_SECONDS', '10')))
+    supabase_jwt_audience: str = Field(default_factory=lambda: getenv('SUPABASE_JWT_AUDIENCE', 'authenticated'))
+    # Auth: tokens are verified locally with the JWT secret; GoTrue is only asked when opted in.
+    auth_remote_fallback: bool = Field(default_factory=lambda: getenv('AUTH_REMOTE_FALLBACK', 'false').lower() in ('1', 'true', 'yes'))
+    auth_token_cache_size: int = Field(default_factory=lambda: int(getenv('AUTH_TOKEN_CACHE_SIZE', '4096')))
+    auth_token_cache_ttl: int = Field(default_factory=lambda: int(getenv('AUTH_TOKEN_CACHE_TTL', '300')))
     openai_api_key: str = Field(default_factory=lambda: getenv('OPENAI_API_KEY', ''))
     openai_model: str = Field(default_factory=lambda: getenv('OPENAI_MODEL', 'gpt-4o-mini'))
+    openai_base_url: str = Field(default_factory=lambda: getenv('OPENAI_BASE_URL', ''))
+    openai_max_concurrency: int = Field(default_factory=lambda: int(getenv('OPENAI_MAX_CONCURRENCY', '16')))
+    openai_timeout_seconds: float = Field(default_factory=lambda: float(getenv('OPENAI_TIMEOUT_SECONDS', '60')))
+    openai_max_retries: int = Field(default_factory=lambda: int(getenv('OPENAI_MAX_RETRIES', '3')))
+    openai_backoff_base_seconds: float = Field(default_factory=lambda: float(getenv('OPENAI_BACKOFF_BASE_SECONDS', '0.5')))
+    openai_backoff_max_seconds: float = Field(default_factory=lambda: float(getenv('OPENAI_BACKOFF_MAX_SECONDS', '8')))
+    # LLM response cache: memory LRU plus optional SQLite file that survives restarts. Stages a user
+    # can ask to regenerate are skipped; fused runs and tone analysis are cached.
+    llm_cache_enabled: bool = Field(default_factory=lambda: getenv('LLM_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+    llm_cache_size: int = Field(default_factory=lambda: int(getenv('LLM_CACHE_SIZE', '1024')))
+    llm_cache_ttl: int = Field(default_factory=lambda: int(getenv('LLM_CACHE_TTL', '86400')))
+    llm_cache_path: str = Field(default_factory=lambda: getenv('LLM_CACHE_PATH', ''))
+    llm_cache_skip_stages: str = Field(
+        default_factory=lambda: getenv(
+            'LLM_CACHE_SKIP_STAGES',
+            'voice,ideas,angles,tweets,tweets_repair,tweet_slot,shitpost,generate,tone_generate,tone_generate_repair,playground'
+        )
+    )
+    # Identical prompts in flight at the same time share one OpenAI call.
+    llm_coalesce_enabled: bool = Field(default_factory=lambda: getenv('LLM_COALESCE_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+    # Prompt token budgets: "<stage>=<tokens>" overrides STAGE_PROMPT_BUDGETS; 0 disables trimming.
+    llm_prompt_budget_default: int = Field(default_factory=lambda: int(getenv('LLM_PROMPT_BUDGET_DEFAULT', '8000')))
+    llm_prompt_budgets: str = Field(default_factory=lambda: getenv('LLM_PROMPT_BUDGETS', ''))
+    # /tone/analyze: "local" scores with LocalToneScorer unless ?refine=true; "llm" always asks the model.
+    tone_analyze_mode: str = Field(default_factory=lambda: getenv('TONE_ANALYZE_MODE', 'local'))
+    usage_flush_interval_seconds: float = Field(default_factory=lambda: float(getenv('USAGE_FLUSH_INTERVAL_SECONDS', '2')))
+    usage_flush_max_pending: int = Field(default_factory=lambda: int(getenv('USAGE_FLUSH_MAX_PENDING', '500')))
+    # Large notes: upload cap, and the chunking used to map-reduce idea mining.
+    note_max_bytes: int = Field(default_factory=lambda: int(getenv('NOTE_MAX_BYTES', str(512 * 1024))))
+    pipeline_chunk_chars: int = Field(default_factory=lambda: int(getenv('PIPELINE_CHUNK_CHARS', '12000')))
+    pipeline_chunk_concurrency: int = Field(default_factory=lambda: int(getenv('PIPELINE_CHUNK_CONCURRENCY', '4')))
+    pipeline_max_ideas: int = Field(default_factory=lambda: int(getenv('PIPELINE_MAX_IDEAS', '8')))
+    # Background /pipeline/batch jobs: SQLite queue file and how many notes run at once.
+    pipeline_batch_path: str = Field(default_factory=lambda: getenv('PIPELINE_BATCH_PATH', 'pipeline_batch.sqlite3'))
+    pipeline_batch_concurrency: int = Field(default_factory=lambda: int(getenv('PIPELINE_BATCH_CONCURRENCY', '4')))
+    pipeline_batch_max_notes: int = Field(default_factory=lambda: int(getenv('PIPELINE_BATCH_MAX_NOTES', '50')))
+    # Seconds a worker holds a claimed note without renewing it before another process may take it over.
+    pipeline_batch_lease_seconds: float = Field(default_factory=lambda: float(getenv('PIPELINE_BATCH_LEASE_SECONDS', '60')))
+    # Seconds to wait for another process's write lock on the queue file before giving up on the operation.
+    pipeline_batch_busy_timeout: float = Field(default_factory=lambda: float(getenv('PIPELINE_BATCH_BUSY_TIMEOUT', '30')))
+    # Finished jobs (note texts and results) are deleted this long after their last note finished; 0 keeps them.
+    pipeline_batch_retention_seconds: int = Field(default_factory=lambda: int(getenv('PIPELINE_BATCH_RETENTION_SECONDS', '604800')))
+    # Validated pipeline stage results kept per session for /pipeline/stage.
+    pipeline_session_cache_size: int = Field(default_factory=lambda: int(getenv('PIPELINE_SESSION_CACHE_SIZE', '1024')))
+    pipeline_session_cache_ttl: int = Field(default_factory=lambda: int(getenv('PIPELINE_SESSION_CACHE_TTL', '1800')))
+    # Prometheus text-format metrics at /metrics.
+    metrics_enabled: bool = Field(default_factory=lambda: getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+    # Tracing: Server-Timing on every response; JSON trace logs for requests slower than TRACE_LOG_MIN_MS.
+    tracing_enabled: bool = Field(default_factory=lambda: getenv('TRACING_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+    trace_log_min_ms: float = Field(default_factory=lambda: float(getenv('TRACE_LOG_MIN_MS', '1000')))
+    log_format: str = Field(default_factory=lambda: getenv('LOG_FORMAT', 'text'))
+    # Sampling profiler: requests sent with X-Profile-Token, or a random PROFILE_SAMPLE_RATE share of them.
+    profile_admin_token: str = Field(default_factory=lambda: getenv('PROFILE_ADMIN_TOKEN', ''))
+    profile_sample_rate: float = Field(default_factory=lambda: float(getenv('PROFILE_SAMPLE_RATE', '0')))
+    profile_interval_ms: float = Field(default_factory=lambda: float(getenv('PROFILE_INTERVAL_MS', '5')))
     frontend_origin: str = Field(default_factory=lambda: getenv('FRONTEND_ORIGIN', 'http://localhost:3000'))
-    rate_limit_generate: str = Field(default_factory=lambda: getenv('RATE_LIMIT_GENERATE', '25/minute'))
+    # Rate limiting: per-user token buckets; plans are "<units>/<seconds>", costs override ROUTE_COSTS.
+    rate_limit_enabled: bool = Field(default_factory=lambda: getenv('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+    rate_limit_backend: str = Field(default_factory=lambda: getenv('RATE_LIMIT_BACKEND', 'memory'))
+    rate_limit_plans: str = Field(default_factory=lambda: getenv('RATE_LIMIT_PLANS', 'anonymous=10/60,free=30/60,pro=120/60'))
+    rate_limit_costs: str = Field(default_factory=lambda: getenv('RATE_LIMIT_COSTS', ''))
+    rate_limit_shm_path: str = Field(default_factory=lambda: getenv('RATE_LIMIT_SHM_PATH', '/tmp/tweetable-rate-limit.bin'))
+    rate_limit_shm_slots: int = Field(default_factory=lambda: int(getenv('RATE_LIMIT_SHM_SLOTS', '16384')))
+    rate_limit_redis_url: str = Field(default_factory=lambda: getenv('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0'))
     # Stripe
     stripe_secret_key: str = Field(default_factory=lambda: getenv('STRIPE_SECRET_KEY', ''))
     stripe_price_id: str = Field(default_factory=lambda: getenv('STRIPE_PRICE_ID', ''))
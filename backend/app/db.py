@@ -1,29 +1,175 @@
+import time
 from functools import lru_cache
-from typing import Optional
+from typing import Any, Dict, Optional
 
-from fastapi import Depends, HTTPException, status
-from supabase import Client, create_client
+import httpx
+from fastapi import HTTPException, status
+from postgrest import AsyncPostgrestClient
+from postgrest._async.request_builder import AsyncRequestBuilder
 
 from .config import get_settings, Settings
+from .repositories import (
+    DraftsRepository,
+    NoteAnalysesRepository,
+    NotesRepository,
+    PersonasRepository,
+    StageRepository,
+    UsageRepository,
+    UsersRepository
+)
+from .utils.metrics import DB_LATENCY_BUCKETS, registry
+from .utils.tracing import span
+
+
+SUPABASE_REQUEST_SECONDS = registry.histogram(
+    'tweetable_supabase_request_duration_seconds',
+    'Supabase latency to response headers, by table (or rpc:<function>, auth), method and status.',
+    ('table', 'method', 'status'),
+    buckets=DB_LATENCY_BUCKETS
+)
+
+
+def _table_label(path: str) -> str:
+    parts = [part for part in path.split('/') if part]
+    if parts[:2] == ['rest', 'v1'] and len(parts) > 2:
+        return f'rpc:{parts[3]}' if parts[2] == 'rpc' and len(parts) > 3 else parts[2]
+    return parts[0] if parts else 'other'
+
+
+class _TimedTransport(httpx.AsyncBaseTransport):
+    """Records every Supabase round trip in ``SUPABASE_REQUEST_SECONDS`` and the request trace."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        table = _table_label(request.url.path)
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            with span(f'db.{table}', method=request.method):
+                response = await self._transport.handle_async_request(request)
+            outcome = str(response.status_code)
+            return response
+        finally:
+            SUPABASE_REQUEST_SECONDS.observe(time.perf_counter() - started, table, request.method, outcome)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class _PooledPostgrestClient(AsyncPostgrestClient):
+    """PostgREST client whose session is a long-lived, keep-alive connection pool."""
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        limits: httpx.Limits,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        **kwargs: Any
+    ) -> None:
+        self._limits = limits
+        self._transport = transport
+        super().__init__(base_url, **kwargs)
+
+    def create_session(self, base_url, headers, timeout, verify=True) -> httpx.AsyncClient:
+        transport = self._transport or httpx.AsyncHTTPTransport(http2=True, limits=self._limits, verify=verify)
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            transport=_TimedTransport(transport)
+        )
+
+
+class Database:
+    """Async Supabase data-access layer shared by every request in the worker.
+
+    Table access goes through the repositories hanging off this object so that
+    no route issues blocking ``.execute()`` calls from the event loop.
+    """
+
+    def __init__(self, settings: Settings, transport: Optional[httpx.AsyncBaseTransport] = None) -> None:
+        self._supabase_url = settings.supabase_url.rstrip('/')
+        self._service_key = settings.supabase_service_key
+        self.postgrest = _PooledPostgrestClient(
+            f'{self._supabase_url}/rest/v1',
+            schema=settings.supabase_schema,
+            headers={
+                'Accept': 'application/json',
+                'Content-Type': 'application/json',
+                'apikey': self._service_key,
+                'Authorization': f'Bearer {self._service_key}',
+            },
+            timeout=settings.supabase_timeout_seconds,
+            limits=httpx.Limits(
+                max_connections=settings.supabase_pool_size,
+                max_keepalive_connections=settings.supabase_pool_keepalive,
+                keepalive_expiry=30.0
+            ),
+            transport=transport
+        )
+
+        self.users = UsersRepository(self)
+        self.usage = UsageRepository(self)
+        self.notes = NotesRepository(self)
+        self.note_analyses = NoteAnalysesRepository(self)
+        self.drafts = DraftsRepository(self)
+        self.personas = PersonasRepository(self)
+        self.stages = StageRepository(self)
+
+    def table(self, name: str) -> AsyncRequestBuilder:
+        return self.postgrest.from_(name)
+
+    async def rpc(self, function: str, params: Dict[str, Any]) -> Any:
+        response = await self.postgrest.rpc(function, params).execute()
+        return response.data
+
+    async def get_auth_user(self, access_token: str) -> Optional[Dict[str, Any]]:
+        """Look a token up against GoTrue, reusing the pooled connection."""
+        response = await self.postgrest.session.get(
+            f'{self._supabase_url}/auth/v1/user',
+            headers={'apikey': self._service_key, 'Authorization': f'Bearer {access_token}'}
+        )
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+    async def aclose(self) -> None:
+        await self.postgrest.aclose()
 
 
 @lru_cache
-def _init_supabase_client() -> Optional[Client]:
+def _init_database() -> Optional[Database]:
     settings = get_settings()
     if not settings.supabase_url or not settings.supabase_service_key:
         return None
 
-    return create_client(settings.supabase_url, settings.supabase_service_key)
+    return Database(settings)
+
 
+async def close_database() -> None:
+    database = _init_database()
+    if database is not None:
+        await database.aclose()
+    _init_database.cache_clear()
 
-def get_supabase_client() -> Client:
-    client = _init_supabase_client()
-    if client is None:
+
+def get_supabase_client() -> Database:
+    database = _init_database()
+    if database is None:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail='Supabase client is not configured. Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY.'
         )
-    return client
+    return database
+
+
+def get_optional_supabase_client() -> Optional[Database]:
+    """For routes that work without Supabase and only use it to reuse stored results."""
+    return _init_database()
 
 
 def get_settings_dependency() -> Settings:
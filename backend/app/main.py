@@ -1,21 +1,50 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import FastAPI, Header, HTTPException, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 
 from .config import get_settings
+from .db import close_database
 from .routes import auth, billing, drafts, generate, persona, pipeline, tone, playground, upload
-from .utils.limiter import register_limiter
+from .services.batch_service import batch_worker
+from .services.llm_cache import llm_cache
+from .services.llm_gateway import llm_gateway
+from .services.token_budget import token_ledger
+from .utils.limiter import limiter, register_limiter
+from .utils.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from .utils.serialization import ORJSONResponse
+from .utils.tracing import TracingMiddleware, configure_logging, is_profile_admin, profile_reports
+from .utils.usage import usage_buffer
 
 settings = get_settings()
+configure_logging(settings)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    await batch_worker.start(persist=pipeline.persist_stage)
+    yield
+    await batch_worker.close()
+    await usage_buffer.close()
+    await close_database()
+    await llm_gateway.aclose()
+    await limiter.aclose()
+    llm_cache.close()
 
-app = FastAPI(title='Tweetable API', version='0.1.0')
+
+app = FastAPI(title='Tweetable API', version='0.1.0', lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[settings.frontend_origin],
     allow_credentials=True,
     allow_methods=['*'],
-    allow_headers=['*']
+    allow_headers=['*'],
+    expose_headers=['ETag', 'X-Next-Cursor', 'Server-Timing', 'X-Trace-Id']
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 
 register_limiter(app)
 
@@ -33,3 +62,25 @@ app.include_router(playground.router)
 @app.get('/health')
 async def health_check():
     return {'status': 'ok'}
+
+
+@app.get('/health/llm')
+async def llm_stats():
+    """Process-wide LLM cache counters and per-stage token accounting."""
+    return {'cache': llm_cache.stats(), 'tokens': token_ledger.stats()}
+
+
+@app.get('/metrics', include_in_schema=False)
+async def metrics():
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Not Found')
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+@app.get('/debug/profiles/{trace_id}', include_in_schema=False)
+async def get_profile(trace_id: str, x_profile_token: Optional[str] = Header(None)):
+    """Sampling-profiler report of a recently profiled request (see ``utils/tracing.py``)."""
+    report = profile_reports.get(trace_id) if is_profile_admin(x_profile_token) else None
+    if report is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Not Found')
+    return report
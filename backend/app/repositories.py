@@ -0,0 +1,216 @@
+"""Async repositories over the Supabase tables used by the API.
+
+Each repository owns the queries for one table so routes and utilities never
+build PostgREST requests themselves.
+"""
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:  # pragma: no cover - import cycle with db.py
+    from .db import Database
+
+
+class _Repository:
+    table_name: str = ''
+
+    def __init__(self, database: 'Database') -> None:
+        self._db = database
+
+    def _table(self, name: Optional[str] = None):
+        return self._db.table(name or self.table_name)
+
+
+class UsersRepository(_Repository):
+    table_name = 'users'
+
+    async def get_plan(self, user_id: str) -> str:
+        response = await self._table().select('plan').eq('id', user_id).limit(1).execute()
+        rows = response.data or []
+        if rows:
+            return rows[0].get('plan') or 'free'
+        return 'free'
+
+    async def set_plan(self, user_id: str, plan: str) -> None:
+        await self._table().upsert({'id': user_id, 'plan': plan}, on_conflict='id').execute()
+
+
+class UsageRepository(_Repository):
+    table_name = 'usage'
+
+    async def get_counts(self, user_id: str, month: str) -> tuple[int, int]:
+        response = await (
+            self._table()
+            .select('uploads,generations')
+            .eq('user_id', user_id)
+            .eq('month', month)
+            .limit(1)
+            .execute()
+        )
+        rows = response.data or []
+        if not rows:
+            return 0, 0
+        return rows[0].get('uploads') or 0, rows[0].get('generations') or 0
+
+    async def increment_many(self, rows: List[Dict[str, Any]]) -> None:
+        """Apply aggregated ``{user_id, month, uploads, generations}`` deltas in one round trip."""
+        await self._db.rpc('increment_usage_bulk', {'p_rows': rows})
+
+    async def reserve_generation(
+        self,
+        user_id: str,
+        month: str,
+        note_id: Optional[str],
+        free_limit: int,
+        pending: int,
+        require_note: bool
+    ) -> Dict[str, Any]:
+        """Fetch note, plan and counts and reserve one generation slot in a single RPC."""
+        rows = await self._db.rpc('generation_preflight', {
+            'p_user_id': user_id,
+            'p_month': month,
+            'p_note_id': note_id,
+            'p_free_limit': free_limit,
+            'p_pending': pending,
+            'p_require_note': require_note,
+        })
+        if isinstance(rows, list):
+            return rows[0] if rows else {}
+        return rows or {}
+
+    async def refund_generation(self, user_id: str, month: str) -> None:
+        await self._db.rpc('refund_generation', {'p_user_id': user_id, 'p_month': month})
+
+
+class NotesRepository(_Repository):
+    table_name = 'notes'
+
+    async def get_content(self, note_id: str) -> Optional[str]:
+        response = await self._table().select('content').eq('id', note_id).limit(1).execute()
+        rows = response.data or []
+        return rows[0].get('content') if rows else None
+
+    async def find_by_hash(self, user_id: str, content_hash: str) -> Optional[Dict[str, Any]]:
+        response = await (
+            self._table()
+            .select('id,size_bytes')
+            .eq('user_id', user_id)
+            .eq('content_hash', content_hash)
+            .limit(1)
+            .execute()
+        )
+        rows = response.data or []
+        return rows[0] if rows else None
+
+    async def insert(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        response = await self._table().insert(record).execute()
+        rows = response.data or []
+        return rows[0] if rows else None
+
+    async def insert_unique(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Insert unless ``(user_id, content_hash)`` already exists; returns ``None`` on a duplicate."""
+        response = await self._table().upsert(
+            record, on_conflict='user_id,content_hash', ignore_duplicates=True
+        ).execute()
+        rows = response.data or []
+        return rows[0] if rows else None
+
+
+class NoteAnalysesRepository(_Repository):
+    """LLM analyses (voice profile, tone scores) of a note, keyed by the note's content hash."""
+
+    table_name = 'note_analyses'
+
+    async def get(self, user_id: str, content_hash: str, kind: str) -> Optional[Dict[str, Any]]:
+        response = await (
+            self._table()
+            .select('data,model')
+            .eq('user_id', user_id)
+            .eq('content_hash', content_hash)
+            .eq('kind', kind)
+            .limit(1)
+            .execute()
+        )
+        rows = response.data or []
+        return rows[0] if rows else None
+
+    async def upsert(self, record: Dict[str, Any]) -> None:
+        await self._table().upsert(record, on_conflict='user_id,content_hash,kind').execute()
+
+
+class DraftsRepository(_Repository):
+    table_name = 'drafts'
+
+    async def list_page(
+        self,
+        user_id: str,
+        *,
+        limit: int,
+        columns: str = '*',
+        before: Optional[tuple[str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Newest-first page of drafts, keyset-paginated on ``(created_at, id)``.
+
+        ``before`` is the ``(created_at, id)`` of the last row already seen.
+        """
+        query = (
+            self._table()
+            .select(columns)
+            .eq('user_id', user_id)
+            .order('created_at', desc=True)
+            .order('id', desc=True)
+            .limit(limit)
+        )
+        if before is not None:
+            created_at, draft_id = before
+            query = query.or_(
+                f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{draft_id}")'
+            )
+        response = await query.execute()
+        return response.data or []
+
+    async def insert(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        response = await self._table().insert(record).execute()
+        rows = response.data or []
+        return rows[0] if rows else None
+
+
+class PersonasRepository(_Repository):
+    table_name = 'personas'
+
+    async def get_for_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        response = await self._table().select('*').eq('user_id', user_id).limit(1).execute()
+        rows = response.data or []
+        return rows[0] if rows else None
+
+    async def upsert(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        response = await self._table().upsert(record, on_conflict='user_id').execute()
+        rows = response.data or []
+        return rows[0] if rows else None
+
+
+class StageRepository(_Repository):
+    """Per-session pipeline stage outputs, one jsonb row per session in each stage table."""
+
+    async def upsert(
+        self, table: str, session_id: str, user_id: str, data: Dict[str, Any], note_text: Optional[str] = None
+    ) -> None:
+        row = {'session_id': session_id, 'user_id': user_id, 'data': data}
+        if note_text is not None:
+            # Only voice_profiles has the column: the session's note, for stages regenerated later without it.
+            row['note_text'] = note_text
+        await self._table(table).upsert(row, on_conflict='session_id').execute()
+
+    async def get(self, table: str, session_id: str, user_id: str, column: str = 'data') -> Optional[Any]:
+        response = await (
+            self._table(table)
+            .select(column)
+            .eq('session_id', session_id)
+            .eq('user_id', user_id)
+            .limit(1)
+            .execute()
+        )
+        rows = response.data or []
+        return rows[0].get(column) if rows else None
+
+    async def delete(self, table: str, session_id: str, user_id: str) -> None:
+        await self._table(table).delete().eq('session_id', session_id).eq('user_id', user_id).execute()
@@ -11,11 +11,11 @@ from typing import Any, Dict
 
 import stripe
 from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
-from supabase import Client
 
 from ..config import get_settings
-from ..db import get_supabase_client
+from ..db import Database, get_supabase_client
 from ..utils.auth import get_current_user, get_user_id
+from ..utils.limiter import limiter
 
 router = APIRouter(prefix="/billing", tags=["billing"])
 
@@ -24,7 +24,7 @@ router = APIRouter(prefix="/billing", tags=["billing"])
 async def create_checkout_session(
     payload: Dict[str, Any],
     request: Request,
-    supabase: Client = Depends(get_supabase_client),
+    db: Database = Depends(get_supabase_client),
     user: Dict[str, Any] = Depends(get_current_user)
 ):
     settings = get_settings()
@@ -67,7 +67,7 @@ async def create_checkout_session(
 @router.post("/webhook")
 async def stripe_webhook(
     request: Request,
-    supabase: Client = Depends(get_supabase_client),
+    db: Database = Depends(get_supabase_client),
     stripe_signature: str = Header(None, alias="Stripe-Signature"),
 ):
     settings = get_settings()
@@ -87,7 +87,8 @@ async def stripe_webhook(
         user_id = metadata.get("user_id")
         if user_id:
             # Update the user's plan to 'pro' in Supabase (assuming a 'users' table with 'id' and 'plan').
-            supabase.table("users").upsert({"id": user_id, "plan": "pro"}, on_conflict="id").execute()
+            await db.users.set_plan(user_id, "pro")
+            limiter.forget_plan(user_id)
 
     return {"received": True}
 
@@ -1,38 +1,122 @@
-from typing import Any, Dict, List
+import base64
+import binascii
+import hashlib
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from supabase import Client
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 
-from ..db import get_supabase_client
+from ..db import Database, get_supabase_client
 from ..schemas import DraftCreateRequest, DraftResponse
 from ..utils.auth import get_current_user, get_user_id
+from ..utils.serialization import dumps
 
 router = APIRouter(prefix='/drafts', tags=['drafts'])
 
 
-@router.get('', response_model=List[DraftResponse])
+DRAFT_FIELDS = tuple(DraftResponse.model_fields)
+MAX_PAGE_SIZE = 200
+_PAGE_HEADERS = {
+    'ETag': {'description': 'Weak validator of the page body, for `If-None-Match`.', 'schema': {'type': 'string'}},
+    'X-Next-Cursor': {
+        'description': 'Pass as `cursor` to fetch the next page; absent on the last page.',
+        'schema': {'type': 'string'}
+    }
+}
+
+
+def _encode_cursor(row: Dict[str, Any]) -> str:
+    raw = json.dumps([row['created_at'], row['id']], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_cursor(cursor: str) -> tuple[str, str]:
+    # Both values end up inside a PostgREST filter string, so accept nothing but a timestamp and a UUID.
+    try:
+        created_at, draft_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        datetime.fromisoformat(created_at)
+        draft_id = str(uuid.UUID(draft_id))
+    except (ValueError, TypeError, AttributeError, binascii.Error) as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor.') from error
+    return created_at, draft_id
+
+
+def _parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = sorted(set(requested) - set(DRAFT_FIELDS))
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown draft fields: {', '.join(unknown)}")
+    # The cursor needs the sort keys even when the caller does not.
+    return list(dict.fromkeys(['id', 'created_at', *requested]))
+
+
+# The handler returns a prebuilt Response, so the page is described here rather than validated by a response_model.
+@router.get(
+    '',
+    response_model=None,
+    responses={
+        200: {
+            'model': List[DraftResponse],
+            'description': 'Drafts, newest first; only the requested `fields` (plus `id` and `created_at`) when given.',
+            'headers': _PAGE_HEADERS
+        },
+        304: {'description': 'The page still matches `If-None-Match`.', 'headers': _PAGE_HEADERS}
+    }
+)
 async def list_drafts(
-    supabase: Client = Depends(get_supabase_client),
+    request: Request,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description='X-Next-Cursor value from the previous page.'),
+    fields: Optional[str] = Query(None, description='Comma-separated subset of draft fields to return.'),
+    db: Database = Depends(get_supabase_client),
     user: Dict[str, Any] = Depends(get_current_user)
-) -> List[DraftResponse]:
+) -> Response:
+    """Newest-first drafts, one page at a time.
+
+    The next page's cursor is returned in ``X-Next-Cursor`` (absent on the
+    last page). Responses carry an ``ETag``; a matching ``If-None-Match``
+    gets an empty 304.
+    """
     user_id = get_user_id(user)
     if user_id is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Missing user identifier.')
 
-    response = (
-        supabase.table('drafts')
-        .select('*')
-        .eq('user_id', user_id)
-        .order('created_at', desc=True)
-        .execute()
+    columns = _parse_fields(fields)
+    rows = await db.drafts.list_page(
+        user_id,
+        limit=limit + 1,
+        columns=','.join(columns) if columns else '*',
+        before=_decode_cursor(cursor) if cursor else None
     )
-    return [DraftResponse.model_validate(item) for item in response.data or []]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if columns is None:
+        items: List[Any] = [DraftResponse.model_validate(item).model_dump() for item in rows]
+    else:
+        items = [{column: item.get(column) for column in columns} for item in rows]
+
+    body = dumps(items)
+    etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if has_more and rows:
+        headers['X-Next-Cursor'] = _encode_cursor(rows[-1])
+
+    if_none_match = request.headers.get('if-none-match', '')
+    if etag in {tag.strip() for tag in if_none_match.split(',')}:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(content=body, media_type='application/json', headers=headers)
 
 
 @router.post('', response_model=DraftResponse, status_code=status.HTTP_201_CREATED)
 async def create_draft(
     payload: DraftCreateRequest,
-    supabase: Client = Depends(get_supabase_client),
+    db: Database = Depends(get_supabase_client),
     user: Dict[str, Any] = Depends(get_current_user)
 ) -> DraftResponse:
     user_id = get_user_id(user)
@@ -46,9 +130,8 @@ async def create_draft(
         'user_id': user_id
     }
 
-    response = supabase.table('drafts').insert(record).execute()
-    data = response.data or []
-    if not data:
+    saved = await db.drafts.insert(record)
+    if not saved:
         raise HTTPException(status_code=500, detail='Failed to save draft.')
 
-    return DraftResponse.model_validate(data[0])
+    return DraftResponse.model_validate(saved)
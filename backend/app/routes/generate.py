@@ -1,67 +1,137 @@
-from typing import Any, Dict
+import logging
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from supabase import Client
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 
-from ..config import get_settings
-from ..db import get_supabase_client
+from ..db import Database, get_supabase_client
 from ..schemas import GenerateRequest, GenerateResponse
 from ..services.openai_service import openai_service
+from ..services.token_budget import token_ledger
 from ..utils.auth import get_current_user, get_user_id
-from ..utils.usage import get_plan_and_usage, increment_generation
-from ..utils.limiter import limiter
+from ..utils.limiter import rate_limit
+from ..utils.sse import event_stream_response, format_event
+from ..utils.usage import (
+    FREE_GENERATION_LIMIT,
+    GenerationReservation,
+    refund_generation,
+    reserve_generation
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix='/generate', tags=['generate'])
 
 
-@router.post('', response_model=GenerateResponse)
-@limiter.limit(get_settings().rate_limit_generate)
-async def generate_drafts(
-    request: Request,
-    payload: GenerateRequest,
-    supabase: Client = Depends(get_supabase_client),
-    user: Dict[str, Any] = Depends(get_current_user)
-) -> GenerateResponse:
-    request.state.user = {'id': get_user_id(user)}
-
-    note_text = payload.prompt
-    if payload.note_id:
-        note_response = (
-            supabase.table('notes')
-            .select('content')
-            .eq('id', payload.note_id)
-            .limit(1)
-            .execute()
-        )
-        note_records = note_response.data or []
-        if note_records:
-            note_text = note_records[0].get('content')
+def _missing_note() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail='Provide note text via prompt or note_id.'
+    )
 
+
+async def _prepare_generation(
+    db: Database, payload: GenerateRequest, user_id: Optional[str]
+) -> Tuple[str, Optional[GenerationReservation]]:
+    if not payload.prompt and not payload.note_id:
+        raise _missing_note()
+
+    if not user_id:
+        note_text = payload.prompt
+        if payload.note_id:
+            note_text = await db.notes.get_content(payload.note_id) or note_text
+        if not note_text:
+            raise _missing_note()
+        return note_text, None
+
+    # One round trip: note content, plan, usage and an atomically reserved slot.
+    reservation = await reserve_generation(db, user_id, payload.note_id, require_note=not payload.prompt)
+    note_text = reservation.note_text or payload.prompt
     if not note_text:
+        raise _missing_note()
+    if not reservation.reserved:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail='Provide note text via prompt or note_id.'
+            status_code=402,
+            detail=f'Free plan allows up to {FREE_GENERATION_LIMIT} generations per month.'
         )
 
-    # Enforce plan limits
-    user_id = get_user_id(user)
-    if user_id:
-        plan, _uploads, generations = get_plan_and_usage(supabase, user_id)
-        if plan == 'free' and generations >= 25:
-            raise HTTPException(status_code=402, detail='Free plan allows up to 25 generations per month.')
-
-    result = await openai_service.generate_tweets(
-        persona=payload.persona,
-        persona_bio=payload.persona_bio,
-        text=note_text
+    return note_text, reservation
+
+
+def _to_response(result: Dict[str, Any]) -> GenerateResponse:
+    return GenerateResponse(
+        short_tweets=result.get('short_tweets', []),
+        long_tweets=result.get('long_tweets', []),
+        threads=result.get('threads', [])
     )
 
-    short = result.get('short_tweets', [])
-    long = result.get('long_tweets', [])
-    threads = result.get('threads', [])
 
-    # Update usage counter
-    if user_id:
-        increment_generation(supabase, user_id)
+@router.post('', response_model=GenerateResponse, dependencies=[Depends(rate_limit('generate'))])
+async def generate_drafts(
+    payload: GenerateRequest,
+    debug: bool = Query(False, description='Include token accounting in the response.'),
+    db: Database = Depends(get_supabase_client),
+    user: Dict[str, Any] = Depends(get_current_user)
+) -> GenerateResponse:
+    user_id = get_user_id(user)
+    note_text, reservation = await _prepare_generation(db, payload, user_id)
+
+    try:
+        with token_ledger.track() as tokens:
+            result = await openai_service.generate_tweets(
+                persona=payload.persona,
+                persona_bio=payload.persona_bio,
+                text=note_text
+            )
+    except Exception:
+        if reservation is not None:
+            await refund_generation(db, reservation)
+        raise
+
+    response = _to_response(result)
+    if debug:
+        response.debug = {'tokens': tokens}
+    return response
+
+
+@router.post('/stream', dependencies=[Depends(rate_limit('generate'))])
+async def generate_drafts_stream(
+    payload: GenerateRequest,
+    db: Database = Depends(get_supabase_client),
+    user: Dict[str, Any] = Depends(get_current_user)
+):
+    """Server-Sent Events variant of ``/generate``.
+
+    Emits a ``tweet`` event (``kind``, ``index``, optional thread ``position``
+    and ``text``) as soon as each tweet string is complete in the model's
+    token stream, then ``done`` with the full ``GenerateResponse``.
+    """
+    user_id = get_user_id(user)
+    note_text, reservation = await _prepare_generation(db, payload, user_id)
+
+    async def events() -> AsyncIterator[str]:
+        result: Dict[str, Any] = {}
+        completed = False
+        try:
+            async for kind, data in openai_service.stream_tweets(
+                persona=payload.persona,
+                persona_bio=payload.persona_bio,
+                text=note_text
+            ):
+                if kind == 'tweet':
+                    yield format_event('tweet', data)
+                else:
+                    result = data
+            response = _to_response(result)
+            completed = True
+            yield format_event('done', response)
+        except Exception as error:
+            # The service raises RuntimeError with a client-safe message; anything else stays generic.
+            detail = str(error) if isinstance(error, RuntimeError) else 'Generation failed'
+            logger.warning('Streaming generation failed: %s', error)
+            yield format_event('error', {'detail': detail})
+        finally:
+            # Failed, invalid or abandoned (client disconnected) streams give the reserved generation back.
+            if not completed and reservation is not None:
+                await refund_generation(db, reservation)
 
-    return GenerateResponse(short_tweets=short, long_tweets=long, threads=threads)
+    return event_stream_response(events())
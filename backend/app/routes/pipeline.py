@@ -1,62 +1,87 @@
 """Routes implementing the multi-stage Tweetable pipeline defined in the PRD."""
 
+import asyncio
 import logging
 import uuid
-from typing import Any, Dict
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from supabase import Client
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from pydantic import BaseModel
 
-from ..db import get_supabase_client
+from ..db import Database, get_supabase_client
 from ..schemas import (
     IdeasResponse,
     InsightAnglesResponse,
+    PipelineBatchItem,
+    PipelineBatchRequest,
+    PipelineBatchResponse,
     PipelineRunRequest,
     PipelineRunResponse,
+    PipelineSlotRequest,
+    PipelineSlotResponse,
     PipelineStageRequest,
     PipelineStageResponse,
     ShitpostResponse,
+    SlotKindLiteral,
     StageLiteral,
     TweetOutput,
     VoiceProfileResponse
 )
+from ..services.batch_service import batch_worker
+from ..services.note_analyses import load_analysis, save_analysis
 from ..services.pipeline_service import pipeline_llm_service
+from ..services.pipeline_sessions import STAGE_INPUTS, STAGE_TABLES, pipeline_sessions
+from ..services.token_budget import token_ledger
+from ..services.tweet_validator import LONG_COUNT, SHORT_COUNT, THREAD_COUNT
 from ..utils.auth import get_current_user, get_user_id
+from ..utils.limiter import limiter, rate_limit
+from ..utils.serialization import ModelResponse
+from ..utils.sse import event_stream_response, format_event
+from ..utils.tracing import span
 from ..utils.usage import increment_generation
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix='/pipeline', tags=['pipeline'])
 
-STAGE_TABLES = {
-    'voice': 'voice_profiles',
-    'ideas': 'idea_extractions',
-    'angles': 'insight_angles',
-    'tweets': 'tweet_generations',
-    'shitpost': 'shitposts'
-}
 
-
-def _persist_stage(supabase: Client, stage: StageLiteral, session_id: str, user_id: str, data: Dict[str, Any]) -> None:
+async def persist_stage(
+    db: Database,
+    stage: StageLiteral,
+    session_id: str,
+    user_id: str,
+    model: BaseModel,
+    note_text: Optional[str] = None
+) -> None:
+    """Store a stage result; a fresh voice profile for ``note_text`` is also kept for reuse by note hash."""
+    pipeline_sessions.remember(user_id, session_id, stage, model)
+    if stage == 'voice' and note_text is not None:
+        await save_analysis(db, user_id, note_text, 'voice', model)
     table = STAGE_TABLES.get(stage)
     if not table:
         return
     try:
-        supabase.table(table).upsert({
-            'session_id': session_id,
-            'user_id': user_id,
-            'data': data
-        }, on_conflict='session_id').execute()
+        with span(f'persist.{stage}'):
+            await db.stages.upsert(
+                table,
+                session_id,
+                user_id,
+                model.model_dump(),
+                note_text=pipeline_sessions.note_text(user_id, session_id) if stage == 'voice' else None
+            )
     except Exception as exc:  # pragma: no cover - Supabase errors should not crash request
         logger.warning('Failed to persist %s for session %s: %s', stage, session_id, exc)
 
 
-@router.post('/run', response_model=PipelineRunResponse)
-async def run_pipeline(
-    payload: PipelineRunRequest,
-    supabase: Client = Depends(get_supabase_client),
-    user=Depends(get_current_user)
-) -> PipelineRunResponse:
+async def _clear_stage(db: Database, stage: str, session_id: str, user_id: str) -> None:
+    try:
+        await db.stages.delete(STAGE_TABLES[stage], session_id, user_id)
+    except Exception as exc:  # pragma: no cover - Supabase errors should not crash request
+        logger.warning('Failed to clear stale %s for session %s: %s', stage, session_id, exc)
+
+
+def _prepare_run(payload: PipelineRunRequest, user: Any) -> Tuple[str, str, str]:
     note_text = payload.note_text.strip()
     if not note_text:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='note_text is required')
@@ -65,34 +90,190 @@ async def run_pipeline(
     user_id = get_user_id(user)
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Missing user id')
+    pipeline_sessions.remember_note(user_id, session_id, note_text)
+    return note_text, session_id, user_id
 
-    voice = await pipeline_llm_service.run_stage1(note_text)
-    _persist_stage(supabase, 'voice', session_id, user_id, voice.model_dump())
 
-    ideas = await pipeline_llm_service.run_stage2(note_text, voice)
-    _persist_stage(supabase, 'ideas', session_id, user_id, ideas.model_dump())
+@router.post('/run', response_model=PipelineRunResponse, dependencies=[Depends(rate_limit('pipeline_run'))])
+async def run_pipeline(
+    payload: PipelineRunRequest,
+    debug: bool = Query(False, description='Include per-stage token accounting in the response.'),
+    db: Database = Depends(get_supabase_client),
+    user=Depends(get_current_user)
+) -> ModelResponse:
+    note_text, session_id, user_id = _prepare_run(payload, user)
+    stored_voice = await load_analysis(db, user_id, note_text, 'voice', VoiceProfileResponse)
+    fresh_note = note_text if stored_voice is None else None
 
-    angles = await pipeline_llm_service.run_stage3(voice, ideas)
-    _persist_stage(supabase, 'angles', session_id, user_id, angles.model_dump())
+    # Persistence runs alongside the remaining LLM calls rather than between them.
+    persist_tasks: list[asyncio.Task] = []
 
-    tone_for_generation = payload.tone_overrides or voice.tone_scores
-    tweets = await pipeline_llm_service.run_stage4(voice, angles, tone_for_generation)
-    _persist_stage(supabase, 'tweets', session_id, user_id, tweets.model_dump())
+    def _on_stage_complete(stage: StageLiteral, model: Any) -> None:
+        persist_tasks.append(asyncio.create_task(
+            persist_stage(db, stage, session_id, user_id, model, note_text=fresh_note)
+        ))
 
-    shitpost = None
-    if payload.include_shitpost:
-        shitpost = await pipeline_llm_service.run_stage5(voice, angles)
-        _persist_stage(supabase, 'shitpost', session_id, user_id, shitpost.model_dump())
+    try:
+        with token_ledger.track() as tokens:
+            results = await pipeline_llm_service.run_all(
+                note_text,
+                tone_overrides=payload.tone_overrides,
+                include_shitpost=payload.include_shitpost,
+                fast_mode=payload.fast_mode,
+                voice=stored_voice,
+                on_stage_complete=_on_stage_complete
+            )
+    finally:
+        await asyncio.gather(*persist_tasks)
 
-    increment_generation(supabase, user_id)
+    increment_generation(db, user_id)
 
-    return PipelineRunResponse(
+    # The stage models are already validated; serialize them once instead of re-running response_model.
+    return ModelResponse(PipelineRunResponse(
         session_id=session_id,
-        voice_profile=voice,
-        ideas=ideas,
-        angles=angles,
-        tweets=tweets,
-        shitpost=shitpost
+        voice_profile=results['voice'],
+        ideas=results['ideas'],
+        angles=results['angles'],
+        tweets=results['tweets'],
+        shitpost=results.get('shitpost'),
+        debug={'tokens': tokens} if debug else None
+    ))
+
+
+@router.post('/run/stream', dependencies=[Depends(rate_limit('pipeline_run'))])
+async def run_pipeline_stream(
+    payload: PipelineRunRequest,
+    db: Database = Depends(get_supabase_client),
+    user=Depends(get_current_user)
+):
+    """Server-Sent Events variant of ``/pipeline/run``.
+
+    Emits ``session`` first, then one event per stage (``voice``, ``ideas``,
+    ``angles``, ``tweets``, ``shitpost``) carrying the same models as
+    ``PipelineRunResponse`` as soon as that stage resolves, and finally
+    ``done`` (or ``error`` with a ``detail``).
+    """
+    note_text, session_id, user_id = _prepare_run(payload, user)
+    stored_voice = await load_analysis(db, user_id, note_text, 'voice', VoiceProfileResponse)
+    fresh_note = note_text if stored_voice is None else None
+
+    async def events() -> AsyncIterator[str]:
+        completed: asyncio.Queue = asyncio.Queue()
+        persist_tasks: list[asyncio.Task] = []
+
+        def _on_stage_complete(stage: StageLiteral, model: Any) -> None:
+            completed.put_nowait((stage, model))
+            persist_tasks.append(asyncio.create_task(
+                persist_stage(db, stage, session_id, user_id, model, note_text=fresh_note)
+            ))
+
+        run = asyncio.create_task(pipeline_llm_service.run_all(
+            note_text,
+            tone_overrides=payload.tone_overrides,
+            include_shitpost=payload.include_shitpost,
+            fast_mode=payload.fast_mode,
+            voice=stored_voice,
+            on_stage_complete=_on_stage_complete
+        ))
+        run.add_done_callback(lambda _: completed.put_nowait(None))
+
+        try:
+            yield format_event('session', {'session_id': session_id})
+            while (item := await completed.get()) is not None:
+                stage, model = item
+                yield format_event(stage, model)
+
+            await asyncio.gather(*persist_tasks)
+            if run.cancelled() or run.exception() is not None:
+                error = None if run.cancelled() else run.exception()
+                detail = error.detail if isinstance(error, HTTPException) else 'Pipeline failed'
+                logger.warning('Streaming pipeline for session %s failed: %s', session_id, error)
+                yield format_event('error', {'detail': detail})
+                return
+
+            increment_generation(db, user_id)
+            yield format_event('done', {'session_id': session_id})
+        finally:
+            # Client went away mid-stream: stop paying for the remaining stages.
+            if not run.done():
+                run.cancel()
+                await asyncio.gather(run, return_exceptions=True)
+
+    return event_stream_response(events())
+
+
+@router.post('/batch', response_model=PipelineBatchResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_pipeline_batch(
+    request: Request,
+    payload: PipelineBatchRequest,
+    user=Depends(get_current_user)
+) -> PipelineBatchResponse:
+    """Queue many notes for the full pipeline and return a job id to poll right away."""
+    user_id = get_user_id(user)
+    if not user_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Missing user id')
+
+    notes = [note.strip() for note in payload.notes]
+    _require(all(notes), 'notes must not be empty')
+    _require(
+        len(notes) <= batch_worker.max_notes,
+        f'A batch can contain at most {batch_worker.max_notes} notes'
+    )
+    # Every note is charged up front, so a batch can never be larger than the plan's whole bucket.
+    allowed = await limiter.units_allowed(request, user, 'pipeline_batch')
+    if allowed is not None and len(notes) > allowed[1]:
+        plan, max_notes = allowed
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f'A batch can contain at most {max_notes} notes on the {plan} plan'
+        )
+    await limiter.hit(request, user, 'pipeline_batch', units=len(notes))
+
+    job_id = await batch_worker.submit(
+        user_id,
+        notes,
+        include_shitpost=payload.include_shitpost,
+        tone_overrides=payload.tone_overrides,
+        fast_mode=payload.fast_mode
+    )
+    return await get_pipeline_batch(job_id, user)
+
+
+@router.get('/batch/{job_id}', response_model=PipelineBatchResponse)
+async def get_pipeline_batch(job_id: str, user=Depends(get_current_user)) -> PipelineBatchResponse:
+    """Progress of a batch job, with results for every note that has finished so far."""
+    found = await batch_worker.get(job_id)
+    if found is None or found[0]['user_id'] != get_user_id(user):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Batch job not found')
+
+    job, rows = found
+    items = [
+        PipelineBatchItem(
+            index=row['idx'],
+            session_id=row['session_id'],
+            status=row['status'],
+            result=PipelineRunResponse.model_validate_json(row['result']) if row['result'] else None,
+            error=row['error']
+        )
+        for row in rows
+    ]
+    completed = sum(item.status == 'completed' for item in items)
+    failed = sum(item.status == 'failed' for item in items)
+    if completed + failed == len(items):
+        job_status = 'failed' if failed == len(items) else 'completed'
+    elif any(item.status != 'queued' for item in items):
+        job_status = 'running'
+    else:
+        job_status = 'queued'
+
+    return PipelineBatchResponse(
+        job_id=job_id,
+        status=job_status,
+        total=len(items),
+        completed=completed,
+        failed=failed,
+        created_at=datetime.fromtimestamp(job['created_at'], tz=timezone.utc),
+        items=items
     )
 
 
@@ -101,13 +282,21 @@ def _require(condition: bool, message: str) -> None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=message)
 
 
-@router.post('/stage/{stage}', response_model=PipelineStageResponse)
+@router.post('/stage/{stage}', response_model=PipelineStageResponse, dependencies=[Depends(rate_limit('pipeline_stage'))])
 async def regenerate_stage(
     stage: StageLiteral,
     payload: PipelineStageRequest,
-    supabase: Client = Depends(get_supabase_client),
+    debug: bool = Query(False, description='Include per-stage token accounting in the response.'),
+    db: Database = Depends(get_supabase_client),
     user=Depends(get_current_user)
-) -> PipelineStageResponse:
+) -> ModelResponse:
+    """Regenerate one stage.
+
+    Upstream results missing from the body are loaded by ``session_id`` from
+    the session cache (falling back to the stage tables), as is the note text
+    of an earlier ``/pipeline/run``. Stages built on the regenerated one are
+    invalidated.
+    """
     session_id = payload.session_id or str(uuid.uuid4())
     user_id = get_user_id(user)
     if not user_id:
@@ -118,30 +307,43 @@ async def regenerate_stage(
     angles: InsightAnglesResponse | None = payload.angles
     tweets: TweetOutput | None = None
     shitpost: ShitpostResponse | None = None
+    note_text = payload.note_text if payload.note_text and payload.note_text.strip() else None
 
-    if stage == 'voice':
-        _require(payload.note_text is not None and payload.note_text.strip(), 'note_text is required for voice stage')
-        voice = await pipeline_llm_service.run_stage1(payload.note_text)
-    elif stage == 'ideas':
-        _require(payload.note_text is not None and payload.note_text.strip(), 'note_text is required for ideas stage')
-        _require(voice is not None, 'voice_profile is required for ideas stage')
-        ideas = await pipeline_llm_service.run_stage2(payload.note_text, voice)
-    elif stage == 'angles':
-        _require(voice is not None, 'voice_profile is required for angles stage')
-        _require(ideas is not None, 'ideas are required for angles stage')
-        angles = await pipeline_llm_service.run_stage3(voice, ideas)
-    elif stage == 'tweets':
-        _require(voice is not None, 'voice_profile is required for tweets stage')
-        _require(angles is not None, 'angles are required for tweets stage')
-        tone_for_generation = payload.tone_overrides or (voice.tone_scores if voice else None)
-        _require(tone_for_generation is not None, 'tone scores required for tweet stage')
-        tweets = await pipeline_llm_service.run_stage4(voice, angles, tone_for_generation)
-    elif stage == 'shitpost':
-        _require(voice is not None, 'voice_profile is required for shitpost stage')
-        _require(angles is not None, 'angles are required for shitpost stage')
-        shitpost = await pipeline_llm_service.run_stage5(voice, angles)
-    else:  # pragma: no cover - stage literal restricts values
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Unknown stage')
+    if payload.session_id:
+        provided = {'voice': voice, 'ideas': ideas, 'angles': angles}
+        missing = [name for name in STAGE_INPUTS[stage] if provided[name] is None]
+        if missing:
+            stored = await pipeline_sessions.load(db, user_id, session_id, missing)
+            voice = voice or stored.get('voice')
+            ideas = ideas or stored.get('ideas')
+            angles = angles or stored.get('angles')
+        if note_text is None and stage in ('voice', 'ideas'):
+            note_text = await pipeline_sessions.load_note(db, user_id, session_id)
+
+    with token_ledger.track() as tokens:
+        if stage == 'voice':
+            _require(note_text is not None, 'note_text is required for voice stage')
+            voice = await pipeline_llm_service.run_stage1(note_text)
+        elif stage == 'ideas':
+            _require(note_text is not None, 'note_text is required for ideas stage')
+            _require(voice is not None, 'voice_profile is required for ideas stage')
+            ideas = await pipeline_llm_service.run_stage2(note_text, voice)
+        elif stage == 'angles':
+            _require(voice is not None, 'voice_profile is required for angles stage')
+            _require(ideas is not None, 'ideas are required for angles stage')
+            angles = await pipeline_llm_service.run_stage3(voice, ideas)
+        elif stage == 'tweets':
+            _require(voice is not None, 'voice_profile is required for tweets stage')
+            _require(angles is not None, 'angles are required for tweets stage')
+            tone_for_generation = payload.tone_overrides or (voice.tone_scores if voice else None)
+            _require(tone_for_generation is not None, 'tone scores required for tweet stage')
+            tweets = await pipeline_llm_service.run_stage4(voice, angles, tone_for_generation)
+        elif stage == 'shitpost':
+            _require(voice is not None, 'voice_profile is required for shitpost stage')
+            _require(angles is not None, 'angles are required for shitpost stage')
+            shitpost = await pipeline_llm_service.run_stage5(voice, angles)
+        else:  # pragma: no cover - stage literal restricts values
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Unknown stage')
 
     result_map: Dict[str, Any] = {
         'voice': voice,
@@ -155,17 +357,89 @@ async def regenerate_stage(
     if model is None:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail='Stage returned empty result')
 
-    _persist_stage(supabase, stage, session_id, user_id, model.model_dump())
+    if note_text is not None:
+        pipeline_sessions.remember_note(user_id, session_id, note_text)
+    stale = pipeline_sessions.invalidate_downstream(user_id, session_id, stage)
+    await asyncio.gather(
+        persist_stage(db, stage, session_id, user_id, model, note_text=note_text if stage == 'voice' else None),
+        *(_clear_stage(db, name, session_id, user_id) for name in stale)
+    )
 
     if stage == 'tweets':
-        increment_generation(supabase, user_id)
+        increment_generation(db, user_id)
 
-    return PipelineStageResponse(
+    return ModelResponse(PipelineStageResponse(
         stage=stage,
         session_id=session_id,
         voice_profile=voice,
         ideas=ideas,
         angles=angles,
         tweets=tweets,
-        shitpost=shitpost
-    )
+        shitpost=shitpost,
+        debug={'tokens': tokens} if debug else None
+    ))
+
+
+SLOT_COUNTS = {'short_tweets': SHORT_COUNT, 'long_tweets': LONG_COUNT, 'threads': THREAD_COUNT}
+
+
+@router.post(
+    '/tweets/{kind}/{index}',
+    response_model=PipelineSlotResponse,
+    dependencies=[Depends(rate_limit('pipeline_slot'))]
+)
+async def regenerate_slot(
+    kind: SlotKindLiteral,
+    index: int,
+    payload: PipelineSlotRequest,
+    debug: bool = Query(False, description='Include per-stage token accounting in the response.'),
+    db: Database = Depends(get_supabase_client),
+    user=Depends(get_current_user)
+) -> ModelResponse:
+    """Regenerate one tweet (e.g. ``short_tweets/2``) or one whole thread (``threads/1``).
+
+    Voice, angles and tweets missing from the body are loaded by
+    ``session_id`` like ``/pipeline/stage/{stage}``. The other slots are sent
+    to the model as context not to repeat, so the call costs about one tweet's
+    worth of completion instead of a whole batch. The updated batch is stored
+    as the session's tweets, and the call counts as a generation.
+    """
+    _require(0 <= index < SLOT_COUNTS[kind], f'{kind} index must be between 0 and {SLOT_COUNTS[kind] - 1}')
+    session_id = payload.session_id or str(uuid.uuid4())
+    user_id = get_user_id(user)
+    if not user_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Missing user id')
+
+    voice: VoiceProfileResponse | None = payload.voice_profile
+    angles: InsightAnglesResponse | None = payload.angles
+    tweets: TweetOutput | None = payload.tweets
+    if payload.session_id:
+        provided = {'voice': voice, 'angles': angles, 'tweets': tweets}
+        missing = [name for name, value in provided.items() if value is None]
+        if missing:
+            stored = await pipeline_sessions.load(db, user_id, session_id, missing)
+            voice = voice or stored.get('voice')
+            angles = angles or stored.get('angles')
+            tweets = tweets or stored.get('tweets')
+
+    _require(voice is not None, 'voice_profile is required to regenerate a tweet')
+    _require(angles is not None, 'angles are required to regenerate a tweet')
+    tone = payload.tone_overrides or voice.tone_scores
+
+    with token_ledger.track() as tokens:
+        updated = await pipeline_llm_service.run_slot(voice, angles, tone, tweets, kind, index)
+
+    # Tweets have no downstream stages, so nothing else is invalidated.
+    await persist_stage(db, 'tweets', session_id, user_id, updated)
+    increment_generation(db, user_id)
+
+    slot = getattr(updated, kind)[index]
+    return ModelResponse(PipelineSlotResponse(
+        session_id=session_id,
+        kind=kind,
+        index=index,
+        tweet=slot if kind != 'threads' else None,
+        thread=slot if kind == 'threads' else None,
+        tweets=updated,
+        debug={'tokens': tokens} if debug else None
+    ))
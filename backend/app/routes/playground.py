@@ -1,10 +1,12 @@
 """Playground endpoint for shitpost/ragebait separate from main flow."""
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from openai import AsyncOpenAI, OpenAIError
+from openai import OpenAIError
 
-from ..config import get_settings
+from ..services.llm_gateway import LLMResponseError, llm_gateway
+from ..services.token_budget import prompt_budgets
 from ..utils.auth import get_current_user
+from ..utils.limiter import rate_limit
 
 router = APIRouter(prefix='/playground', tags=['playground'])
 
@@ -16,30 +18,19 @@ User text:
 """
 
 
-@router.post('/generate')
+@router.post('/generate', dependencies=[Depends(rate_limit('playground'))])
 async def playground_generate(payload: dict, user=Depends(get_current_user)):
-    settings = get_settings()
-    client = AsyncOpenAI(api_key=settings.openai_api_key or None)
-    if not settings.openai_api_key:
+    if not llm_gateway.has_api_key:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='OPENAI_API_KEY is required')
     mode = payload.get('mode', 'shitpost')
     text = payload.get('text', '')
     if not text:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='text is required')
-    prompt = PLAYGROUND_PROMPT.format(mode=mode, user_text=text)
+    prompt = prompt_budgets.render(PLAYGROUND_PROMPT, 'playground', trim='user_text', mode=mode, user_text=text)
     try:
-        resp = await client.chat.completions.create(
-            model=settings.openai_model,
-            messages=[{'role': 'system', 'content': 'Reply with JSON only.'}, {'role': 'user', 'content': prompt}]
-        )
-        content = resp.choices[0].message.content if resp.choices else None
+        data = await llm_gateway.complete_json(prompt, system='Reply with JSON only.', stage='playground')
     except OpenAIError as exc:  # pragma: no cover
         raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(exc)) from exc
-    if not content:
-        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='Empty response')
-    try:
-        import json
-        data = json.loads(content)
-        return {'text': data.get('text', '')}
-    except Exception as exc:  # pragma: no cover
-        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='Invalid JSON from model') from exc
+    except LLMResponseError as exc:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(exc)) from exc
+    return {'text': data.get('text', '')}
@@ -1,24 +1,70 @@
 """Endpoints for tone analysis and tone-aware tweet generation (PRDDelta)."""
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import AsyncIterator, Optional
 
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from ..config import get_settings
+from ..db import Database, get_optional_supabase_client
 from ..schemas_tone import ToneAnalysisResponse, ToneGenerateRequest, ToneGenerateResponse
+from ..services.note_analyses import load_analysis, save_analysis
 from ..services.tone_service import tone_service
-from ..utils.auth import get_current_user
+from ..utils.auth import get_current_user, get_user_id
+from ..utils.limiter import rate_limit
+from ..utils.sse import event_stream_response, format_event
 
 router = APIRouter(prefix='/tone', tags=['tone'])
 
 
-@router.post('/analyze', response_model=ToneAnalysisResponse)
-async def analyze_tone(payload: dict, user=Depends(get_current_user)):
+@router.post('/analyze', response_model=ToneAnalysisResponse, dependencies=[Depends(rate_limit('tone_analyze'))])
+async def analyze_tone(
+    payload: dict,
+    refine: bool = Query(False, description='Ask the model instead of the local scorer.'),
+    db: Optional[Database] = Depends(get_optional_supabase_client),
+    user=Depends(get_current_user)
+):
+    """Six tone sliders for a note.
+
+    Scored locally from the text unless ``refine`` is set or
+    ``TONE_ANALYZE_MODE=llm``; model scores are stored per note and reused, and
+    the local scores stand in when the model's answer is unusable.
+    """
     note_text = payload.get('note_text', '') if payload else ''
     if not note_text or not str(note_text).strip():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='note_text is required')
-    return await tone_service.analyze(str(note_text))
+    note_text = str(note_text)
+    if not refine and get_settings().tone_analyze_mode != 'llm':
+        return tone_service.score_local(note_text)
+    user_id = get_user_id(user)
+
+    stored = await load_analysis(db, user_id, note_text, 'tone', ToneAnalysisResponse)
+    if stored is not None:
+        return stored
+    result = await tone_service.try_analyze(note_text)
+    if result is None:
+        return tone_service.score_local(note_text)
+    await save_analysis(db, user_id, note_text, 'tone', result)
+    return result
 
 
-@router.post('/generate', response_model=ToneGenerateResponse)
+@router.post('/generate', response_model=ToneGenerateResponse, dependencies=[Depends(rate_limit('tone_generate'))])
 async def generate_tone(payload: ToneGenerateRequest, user=Depends(get_current_user)):
     if not payload.note_text.strip():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='note_text is required')
     return await tone_service.generate(payload)
+
+
+@router.post('/generate/stream', dependencies=[Depends(rate_limit('tone_generate'))])
+async def generate_tone_stream(payload: ToneGenerateRequest, user=Depends(get_current_user)):
+    """Server-Sent Events variant of ``/tone/generate``: ``tweet`` events, then ``done``."""
+    if not payload.note_text.strip():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='note_text is required')
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for kind, data in tone_service.generate_stream(payload):
+                yield format_event(kind, data)
+        except HTTPException as error:
+            yield format_event('error', {'detail': error.detail})
+
+    return event_stream_response(events())
@@ -1,12 +1,14 @@
+import asyncio
 from typing import Any, Dict
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from supabase import Client
 
-from ..db import get_supabase_client
+from ..config import get_settings
+from ..db import Database, get_supabase_client
 from ..schemas import UploadRequest, UploadResponse
+from ..services.note_analyses import note_content_hash
 from ..utils.auth import get_current_user, get_user_id
-from ..utils.usage import get_plan_and_usage, increment_upload
+from ..utils.usage import FREE_UPLOAD_LIMIT, get_plan_and_usage, increment_upload
 
 router = APIRouter(prefix='/upload', tags=['upload'])
 
@@ -14,7 +16,7 @@ router = APIRouter(prefix='/upload', tags=['upload'])
 @router.post('', response_model=UploadResponse)
 async def upload_note(
     payload: UploadRequest,
-    supabase: Client = Depends(get_supabase_client),
+    db: Database = Depends(get_supabase_client),
     user: Dict[str, Any] = Depends(get_current_user)
 ) -> UploadResponse:
     if not payload.note_text:
@@ -24,33 +26,47 @@ async def upload_note(
         )
 
     encoded = payload.note_text.encode('utf-8')
-    if len(encoded) > 50 * 1024:
+    max_bytes = get_settings().note_max_bytes
+    if len(encoded) > max_bytes:
         raise HTTPException(
             status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail='Notes must be 50 KB or smaller.'
+            detail=f'Notes must be {max_bytes // 1024} KB or smaller.'
         )
 
     user_id = get_user_id(user)
+    content_hash = note_content_hash(payload.note_text)
+
+    existing, (plan, uploads, _gens) = await asyncio.gather(
+        db.notes.find_by_hash(user_id, content_hash),
+        get_plan_and_usage(db, user_id)
+    )
+    # Re-uploading the same text returns the existing note and does not count against the quota.
+    if existing:
+        return UploadResponse(note_id=str(existing['id']), size=len(encoded), duplicate=True)
 
     # Usage enforcement for free plan
-    plan, uploads, _gens = get_plan_and_usage(supabase, user_id)
-    if plan == 'free' and uploads >= 3:
-        raise HTTPException(status_code=402, detail='Free plan allows up to 3 uploads per month.')
+    if plan == 'free' and uploads >= FREE_UPLOAD_LIMIT:
+        raise HTTPException(status_code=402, detail=f'Free plan allows up to {FREE_UPLOAD_LIMIT} uploads per month.')
 
     insert_payload = {
         'content': payload.note_text,
         'filename': payload.file_name,
         'user_id': user_id,
-        'size_bytes': len(encoded)
+        'size_bytes': len(encoded),
+        'content_hash': content_hash
     }
 
-    response = supabase.table('notes').insert(insert_payload).execute()
-    data = response.data or []
+    saved = await db.notes.insert_unique(insert_payload)
+    if saved is None:
+        # A concurrent upload of the same text won the unique index.
+        existing = await db.notes.find_by_hash(user_id, content_hash)
+        if existing:
+            return UploadResponse(note_id=str(existing['id']), size=len(encoded), duplicate=True)
 
-    note_id = data[0].get('id') if data else None
+    note_id = saved.get('id') if saved else None
     if note_id is None:
         raise HTTPException(status_code=500, detail='Failed to persist note.')
 
     # Update usage counter
-    increment_upload(supabase, user_id)
+    increment_upload(db, user_id)
     return UploadResponse(note_id=str(note_id), size=len(encoded))
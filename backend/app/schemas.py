@@ -1,8 +1,10 @@
 from datetime import datetime
-from typing import List, Literal, Optional
+from typing import ClassVar, List, Literal, Optional
 
 from pydantic import BaseModel, Field, RootModel
 
+from .utils.serialization import PromptList
+
 
 class UploadRequest(BaseModel):
     note_text: Optional[str] = Field(
@@ -14,6 +16,7 @@ class UploadRequest(BaseModel):
 class UploadResponse(BaseModel):
     note_id: str = Field(description='Supabase identifier for the uploaded note.')
     size: int = Field(description='Payload size in bytes.')
+    duplicate: bool = Field(default=False, description='True when the same text was already uploaded; note_id is the existing note.')
 
 
 class GenerateRequest(BaseModel):
@@ -31,6 +34,9 @@ class GenerateResponse(BaseModel):
     short_tweets: List[str]
     long_tweets: List[str]
     threads: List[List[str]]
+    debug: Optional[dict] = Field(
+        default=None, description='Per-stage token estimates and API usage; only set when requested with ?debug=true.'
+    )
 
 
 class DraftCreateRequest(BaseModel):
@@ -80,7 +86,9 @@ class IdeaItem(BaseModel):
     emotional_punch: int
 
 
-class IdeasResponse(BaseModel):
+class IdeasResponse(PromptList, BaseModel):
+    prompt_field: ClassVar[str] = 'ideas'
+
     ideas: List[IdeaItem]
 
 
@@ -89,7 +97,9 @@ class InsightAngle(BaseModel):
     angle: str
 
 
-class InsightAnglesResponse(BaseModel):
+class InsightAnglesResponse(PromptList, BaseModel):
+    prompt_field: ClassVar[str] = 'angles'
+
     angles: List[InsightAngle]
 
 
@@ -108,6 +118,7 @@ class PipelineRunRequest(BaseModel):
     include_shitpost: bool = True
     session_id: Optional[str] = None
     tone_overrides: Optional[ToneScores] = None
+    fast_mode: bool = Field(default=False, description='Derive voice, ideas and angles from one fused LLM call.')
 
 
 class PipelineRunResponse(BaseModel):
@@ -117,11 +128,45 @@ class PipelineRunResponse(BaseModel):
     angles: InsightAnglesResponse
     tweets: TweetOutput
     shitpost: Optional[ShitpostResponse] = None
+    debug: Optional[dict] = Field(
+        default=None, description='Per-stage token estimates and API usage; only set when requested with ?debug=true.'
+    )
 
 
 StageLiteral = Literal['voice', 'ideas', 'angles', 'tweets', 'shitpost']
 
 
+SlotKindLiteral = Literal['short_tweets', 'long_tweets', 'threads']
+
+
+BatchStatusLiteral = Literal['queued', 'running', 'completed', 'failed']
+
+
+class PipelineBatchRequest(BaseModel):
+    notes: List[str] = Field(min_length=1, description='Raw notes to run through the full pipeline.')
+    include_shitpost: bool = True
+    tone_overrides: Optional[ToneScores] = None
+    fast_mode: bool = False
+
+
+class PipelineBatchItem(BaseModel):
+    index: int
+    session_id: str
+    status: BatchStatusLiteral
+    result: Optional[PipelineRunResponse] = None
+    error: Optional[str] = None
+
+
+class PipelineBatchResponse(BaseModel):
+    job_id: str
+    status: BatchStatusLiteral
+    total: int
+    completed: int
+    failed: int
+    created_at: datetime
+    items: List[PipelineBatchItem] = Field(default_factory=list)
+
+
 class PipelineStageRequest(BaseModel):
     note_text: Optional[str] = None
     voice_profile: Optional[VoiceProfileResponse] = None
@@ -140,3 +185,28 @@ class PipelineStageResponse(BaseModel):
     angles: Optional[InsightAnglesResponse] = None
     tweets: Optional[TweetOutput] = None
     shitpost: Optional[ShitpostResponse] = None
+    debug: Optional[dict] = Field(
+        default=None, description='Per-stage token estimates and API usage; only set when requested with ?debug=true.'
+    )
+
+
+class PipelineSlotRequest(BaseModel):
+    session_id: Optional[str] = None
+    voice_profile: Optional[VoiceProfileResponse] = None
+    angles: Optional[InsightAnglesResponse] = None
+    tweets: Optional[TweetOutput] = Field(
+        default=None, description='The batch as currently shown (including edits); defaults to the session\'s tweets.'
+    )
+    tone_overrides: Optional[ToneScores] = None
+
+
+class PipelineSlotResponse(BaseModel):
+    session_id: str
+    kind: SlotKindLiteral
+    index: int
+    tweet: Optional[str] = Field(default=None, description='The new tweet, for short_tweets and long_tweets.')
+    thread: Optional[List[str]] = Field(default=None, description='The new thread, for threads.')
+    tweets: TweetOutput = Field(description='The batch with the slot replaced.')
+    debug: Optional[dict] = Field(
+        default=None, description='Per-stage token estimates and API usage; only set when requested with ?debug=true.'
+    )
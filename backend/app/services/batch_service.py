@@ -0,0 +1,342 @@
+"""Background execution of ``/pipeline/batch`` jobs.
+
+Jobs and their notes live in a local SQLite queue shared by every worker
+process on the host. Each process leases the notes it runs and renews the
+leases while they run. A clean shutdown puts its notes back in the queue. A
+note whose worker died is taken again once its lease
+(``PIPELINE_BATCH_LEASE_SECONDS``) expires, and rerun under the same session id
+(stage rows are upserted). One worker task per process pulls queued notes in
+submission order and runs at most ``PIPELINE_BATCH_CONCURRENCY`` of them
+through ``PipelineLLMService`` at once. Jobs whose notes have all finished are
+deleted ``PIPELINE_BATCH_RETENTION_SECONDS`` after the last one did.
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from ..config import Settings, get_settings
+from ..db import _init_database
+from ..schemas import PipelineRunResponse, ToneScores, VoiceProfileResponse
+from ..utils.usage import increment_generation
+from .note_analyses import load_analysis
+from .pipeline_service import PipelineLLMService, pipeline_llm_service
+from .pipeline_sessions import pipeline_sessions
+
+logger = logging.getLogger(__name__)
+
+# (db, stage, session_id, user_id, model, note_text=...) -> persisted stage row
+StagePersister = Callable[..., Awaitable[None]]
+
+# Seconds between sweeps for finished jobs past their retention.
+_PRUNE_INTERVAL = 3600.0
+
+
+class _JobStore:
+    """SQLite tables for batch jobs and their per-note items; every method is blocking.
+
+    Several worker processes can share one file. A note is claimed inside a
+    ``BEGIN IMMEDIATE`` transaction, which holds SQLite's write lock from the
+    read to the update, so two processes never claim the same note. Each
+    claim is a lease: the owner renews it while the note runs, and only a note
+    whose lease has expired (its worker died or stalled) is claimed again.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0) -> None:
+        self._lock = threading.Lock()
+        # Autocommit mode: transactions are opened explicitly by ``_transaction``. ``timeout`` is how long a
+        # statement waits on another process's write lock before raising "database is locked".
+        self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute('pragma journal_mode=wal')
+            self._conn.executescript(
+                'create table if not exists batch_jobs ('
+                ' id text primary key, user_id text not null, options text not null,'
+                ' created_at real not null);'
+                'create table if not exists batch_items ('
+                ' job_id text not null references batch_jobs (id), idx integer not null,'
+                ' session_id text not null, note_text text not null,'
+                " status text not null default 'queued', result text, error text,"
+                ' updated_at real not null, primary key (job_id, idx));'
+                'create index if not exists batch_items_status_idx on batch_items (status, job_id, idx);'
+            )
+            columns = {row['name'] for row in self._conn.execute('pragma table_info(batch_items)')}
+            # Queue files created before leases existed.
+            if 'lease_owner' not in columns:
+                self._conn.execute('alter table batch_items add column lease_owner text')
+            if 'lease_expires' not in columns:
+                self._conn.execute('alter table batch_items add column lease_expires real')
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute('begin immediate')
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute('rollback')
+                raise
+            self._conn.execute('commit')
+
+    def create_job(self, user_id: str, notes: List[str], options: Dict[str, Any]) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                'insert into batch_jobs (id, user_id, options, created_at) values (?, ?, ?, ?)',
+                (job_id, user_id, json.dumps(options), now)
+            )
+            conn.executemany(
+                'insert into batch_items (job_id, idx, session_id, note_text, updated_at) values (?, ?, ?, ?, ?)',
+                [(job_id, idx, str(uuid.uuid4()), note, now) for idx, note in enumerate(notes)]
+            )
+        return job_id
+
+    def claim(self, owner: str, limit: int, lease: float) -> List[Dict[str, Any]]:
+        """Lease up to ``limit`` of the oldest queued (or abandoned) notes to ``owner`` and return them."""
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                'select i.job_id, i.idx, i.session_id, i.note_text, j.user_id, j.options'
+                ' from batch_items i join batch_jobs j on j.id = i.job_id'
+                " where i.status = 'queued' or (i.status = 'running' and coalesce(i.lease_expires, 0) < ?)"
+                ' order by j.created_at, i.idx limit ?',
+                (now, limit)
+            ).fetchall()
+            conn.executemany(
+                "update batch_items set status = 'running', lease_owner = ?, lease_expires = ?, updated_at = ?"
+                ' where job_id = ? and idx = ?',
+                [(owner, now + lease, now, row['job_id'], row['idx']) for row in rows]
+            )
+        return [dict(row) for row in rows]
+
+    def renew(self, owner: str, lease: float) -> None:
+        """Extend the leases of every note ``owner`` is running."""
+        with self._transaction() as conn:
+            conn.execute(
+                "update batch_items set lease_expires = ? where status = 'running' and lease_owner = ?",
+                (time.time() + lease, owner)
+            )
+
+    def release(self, owner: str) -> int:
+        """Put ``owner``'s running notes back in the queue (clean shutdown) so another worker can take them now."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "update batch_items set status = 'queued', lease_owner = null, lease_expires = null, updated_at = ?"
+                " where status = 'running' and lease_owner = ?",
+                (time.time(), owner)
+            )
+        return cursor.rowcount
+
+    def finish(
+        self, owner: str, job_id: str, idx: int, *, result: Optional[str] = None, error: Optional[str] = None
+    ) -> bool:
+        """Record a note's outcome; ``False`` if ``owner`` lost its lease and another worker now has the note."""
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'update batch_items set status = ?, result = ?, error = ?, lease_owner = null, lease_expires = null,'
+                " updated_at = ? where job_id = ? and idx = ? and status = 'running' and lease_owner = ?",
+                ('failed' if error is not None else 'completed', result, error, time.time(), job_id, idx, owner)
+            )
+        return cursor.rowcount == 1
+
+    def prune(self, before: float) -> int:
+        """Delete jobs with no queued or running notes whose last note finished before ``before``; returns how many."""
+        with self._transaction() as conn:
+            job_ids = [(row['id'],) for row in conn.execute(
+                'select j.id from batch_jobs j join batch_items i on i.job_id = j.id group by j.id'
+                " having sum(i.status in ('queued', 'running')) = 0 and max(i.updated_at) < ?",
+                (before,)
+            )]
+            conn.executemany('delete from batch_items where job_id = ?', job_ids)
+            conn.executemany('delete from batch_jobs where id = ?', job_ids)
+        return len(job_ids)
+
+    def get_job(self, job_id: str) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        with self._lock:
+            job = self._conn.execute('select * from batch_jobs where id = ?', (job_id,)).fetchone()
+            if job is None:
+                return None
+            items = self._conn.execute(
+                'select idx, session_id, status, result, error from batch_items where job_id = ? order by idx',
+                (job_id,)
+            ).fetchall()
+        return dict(job), [dict(item) for item in items]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class BatchWorker:
+    def __init__(
+        self,
+        settings: Optional[Settings] = None,
+        service: PipelineLLMService = pipeline_llm_service
+    ) -> None:
+        settings = settings or get_settings()
+        self._path = settings.pipeline_batch_path
+        self._concurrency = max(1, settings.pipeline_batch_concurrency)
+        self.max_notes = settings.pipeline_batch_max_notes
+        self._lease = max(1.0, settings.pipeline_batch_lease_seconds)
+        self._busy_timeout = settings.pipeline_batch_busy_timeout
+        self._retention = settings.pipeline_batch_retention_seconds
+        self._next_prune = 0.0
+        self._owner = str(uuid.uuid4())
+        self._service = service
+        self._store: Optional[_JobStore] = None
+        self._persist: Optional[StagePersister] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running: Set[asyncio.Task] = set()
+
+    async def start(self, persist: StagePersister) -> None:
+        """Open the queue and start draining it."""
+        if self._task is not None:
+            return
+        self._persist = persist
+        self._store = await asyncio.to_thread(_JobStore, self._path, self._busy_timeout)
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._task = asyncio.create_task(self._run(), name='pipeline-batch-worker')
+
+    def _require_store(self) -> _JobStore:
+        if self._store is None:
+            raise RuntimeError('Batch worker is not running.')
+        return self._store
+
+    async def submit(
+        self,
+        user_id: str,
+        notes: List[str],
+        *,
+        include_shitpost: bool,
+        tone_overrides: Optional[ToneScores],
+        fast_mode: bool = False
+    ) -> str:
+        options = {
+            'include_shitpost': include_shitpost,
+            'fast_mode': fast_mode,
+            'tone_overrides': tone_overrides.model_dump() if tone_overrides else None
+        }
+        job_id = await asyncio.to_thread(self._require_store().create_job, user_id, notes, options)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        return await asyncio.to_thread(self._require_store().get_job, job_id)
+
+    async def _run(self) -> None:
+        while True:
+            # Also wake up periodically: leases need renewing, and other processes queue notes and abandon leases.
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._lease / 3)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._tick()
+            except Exception:
+                # Typically "database is locked" past the busy timeout; the next tick retries.
+                logger.exception('Batch worker iteration failed')
+
+    async def _tick(self) -> None:
+        if self._running:
+            await asyncio.to_thread(self._store.renew, self._owner, self._lease)
+        if self._retention > 0 and time.monotonic() >= self._next_prune:
+            self._next_prune = time.monotonic() + _PRUNE_INTERVAL
+            pruned = await asyncio.to_thread(self._store.prune, time.time() - self._retention)
+            if pruned:
+                logger.info('Deleted %d finished batch jobs past retention', pruned)
+        free = self._concurrency - len(self._running)
+        if free <= 0:
+            return
+        for item in await asyncio.to_thread(self._store.claim, self._owner, free, self._lease):
+            task = asyncio.create_task(self._process(item), name=f"pipeline-batch-{item['job_id']}-{item['idx']}")
+            self._running.add(task)
+            task.add_done_callback(self._on_item_done)
+
+    def _on_item_done(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        # A slot opened up; look for more queued notes.
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _process(self, item: Dict[str, Any]) -> None:
+        job_id, idx, session_id, user_id = item['job_id'], item['idx'], item['session_id'], item['user_id']
+        options = json.loads(item['options'])
+        tone = options.get('tone_overrides')
+        db = _init_database()
+        persist_tasks: List[asyncio.Task] = []
+        stored_voice = await load_analysis(db, user_id, item['note_text'], 'voice', VoiceProfileResponse)
+        fresh_note = item['note_text'] if stored_voice is None else None
+        # Stored with the voice row, so later /pipeline/stage calls on this session need not resend it.
+        pipeline_sessions.remember_note(user_id, session_id, item['note_text'])
+
+        def on_stage_complete(stage: str, model: Any) -> None:
+            persist_tasks.append(asyncio.create_task(
+                self._persist(db, stage, session_id, user_id, model, note_text=fresh_note)
+            ))
+
+        try:
+            results = await self._service.run_all(
+                item['note_text'],
+                tone_overrides=ToneScores.model_validate(tone) if tone else None,
+                include_shitpost=options.get('include_shitpost', True),
+                fast_mode=options.get('fast_mode', False),
+                voice=stored_voice,
+                on_stage_complete=on_stage_complete if db is not None else None
+            )
+            response = PipelineRunResponse(
+                session_id=session_id,
+                voice_profile=results['voice'],
+                ideas=results['ideas'],
+                angles=results['angles'],
+                tweets=results['tweets'],
+                shitpost=results.get('shitpost')
+            )
+        except asyncio.CancelledError:
+            # Shutdown: ``close`` puts the note back in the queue.
+            raise
+        except Exception as exc:
+            detail = exc.detail if isinstance(exc, HTTPException) else 'Pipeline failed'
+            logger.warning('Batch %s note %d failed: %s', job_id, idx, exc)
+            await asyncio.to_thread(self._store.finish, self._owner, job_id, idx, error=str(detail))
+            return
+        finally:
+            await asyncio.gather(*persist_tasks)
+
+        finished = await asyncio.to_thread(self._store.finish, self._owner, job_id, idx, result=response.model_dump_json())
+        if not finished:
+            # Our lease lapsed and another worker took the note over; it records and charges the result.
+            logger.warning('Batch %s note %d was taken over by another worker', job_id, idx)
+            return
+        if db is not None:
+            increment_generation(db, user_id)
+
+    async def close(self) -> None:
+        tasks = [task for task in (self._task, *self._running) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._running.clear()
+        if self._store is not None:
+            released = self._store.release(self._owner)
+            if released:
+                logger.info('Returned %d unfinished batch notes to the queue', released)
+            self._store.close()
+            self._store = None
+
+
+batch_worker = BatchWorker()
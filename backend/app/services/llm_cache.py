@@ -0,0 +1,106 @@
+"""Content-addressed cache for LLM responses.
+
+Responses are keyed by a hash of (model, system prompt, user prompt, response
+format). A size-bounded in-memory LRU with TTL sits in front of an optional
+SQLite tier so warm entries survive restarts. Stages listed in
+``LLM_CACHE_SKIP_STAGES`` (creative generations that users expect to vary) are
+never served from cache.
+"""
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from ..config import Settings, get_settings
+from ..utils.cache import TTLCache
+
+
+class _DiskTier:
+    def __init__(self, path: str) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute('pragma journal_mode=wal')
+            self._conn.execute(
+                'create table if not exists llm_cache ('
+                'key text primary key, value text not null, expires_at real not null)'
+            )
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                'select value from llm_cache where key = ? and expires_at > ?', (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                'insert or replace into llm_cache (key, value, expires_at) values (?, ?, ?)',
+                (key, value, time.time() + ttl)
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class LLMCache:
+    def __init__(self, settings: Optional[Settings] = None) -> None:
+        settings = settings or get_settings()
+        self.enabled = settings.llm_cache_enabled
+        self._ttl = settings.llm_cache_ttl
+        self._memory: TTLCache[str] = TTLCache(maxsize=settings.llm_cache_size, ttl=settings.llm_cache_ttl)
+        self._disk = _DiskTier(settings.llm_cache_path) if self.enabled and settings.llm_cache_path else None
+        self._skip_stages = {stage.strip() for stage in settings.llm_cache_skip_stages.split(',') if stage.strip()}
+        self._counts: Counter = Counter()
+
+    @staticmethod
+    def make_key(model: str, system: str, prompt: str, response_format: str) -> str:
+        digest = hashlib.sha256()
+        for part in (model, system, prompt, response_format):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+
+    def is_cacheable(self, stage: Optional[str]) -> bool:
+        return self.enabled and stage not in self._skip_stages
+
+    async def get(self, key: str, stage: Optional[str] = None) -> Optional[str]:
+        label = stage or 'default'
+        value = self._memory.get(key)
+        if value is None and self._disk is not None:
+            value = await asyncio.to_thread(self._disk.get, key)
+            if value is not None:
+                self._memory.set(key, value)
+                self._counts[(label, 'disk_hit')] += 1
+                return value
+
+        self._counts[(label, 'hit' if value is not None else 'miss')] += 1
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        self._memory.set(key, value)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk.set, key, value, self._ttl)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss counters per stage, e.g. ``{'voice': {'hit': 3, 'miss': 1}}``."""
+        result: Dict[str, Dict[str, int]] = {}
+        for (stage, outcome), count in self._counts.items():
+            result.setdefault(stage, {})[outcome] = count
+        return result
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+
+llm_cache = LLMCache()
@@ -0,0 +1,368 @@
+"""Shared gateway for every OpenAI call made by the backend.
+
+One long-lived ``AsyncOpenAI`` client (and its HTTP connection pool) serves the
+whole worker. Calls are capped by a global concurrency semaphore, bounded by a
+per-attempt deadline and retried with jittered exponential backoff on 429s,
+5xx responses, timeouts and connection errors. Identical requests in flight at
+the same time (a double-clicked button, a client retrying a slow call) share a
+single upstream call.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple, Type, TypeVar
+
+import httpx
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, OpenAIError, RateLimitError
+from pydantic import BaseModel, ValidationError
+
+from ..config import Settings, get_settings
+from ..utils.metrics import LLM_LATENCY_BUCKETS, registry
+from ..utils.serialization import JSONDecodeError, loads
+from ..utils.singleflight import SingleFlight
+from ..utils.tracing import add_span
+from .llm_cache import LLMCache, llm_cache
+from .token_budget import estimate_chat_tokens, token_ledger
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYSTEM_PROMPT = 'Reply with valid JSON only.'
+
+T = TypeVar('T')
+M = TypeVar('M', bound=BaseModel)
+
+# Which service issues each stage, for the ``service`` metric label.
+STAGE_SERVICES = {
+    'voice': 'pipeline',
+    'ideas': 'pipeline',
+    'angles': 'pipeline',
+    'fused': 'pipeline',
+    'tweets': 'pipeline',
+    'tweets_repair': 'pipeline',
+    'tweet_slot': 'pipeline',
+    'shitpost': 'pipeline',
+    'generate': 'generate',
+    'tone_analyze': 'tone',
+    'tone_generate': 'tone',
+    'tone_generate_repair': 'tone',
+    'playground': 'playground',
+}
+
+LLM_REQUEST_SECONDS = registry.histogram(
+    'tweetable_llm_request_duration_seconds',
+    'OpenAI call latency including retries, by service, stage and outcome.',
+    ('service', 'stage', 'outcome'),
+    buckets=LLM_LATENCY_BUCKETS
+)
+
+
+def _observe_call(stage: Optional[str], started: float, outcome: str) -> None:
+    label = stage or 'default'
+    LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, STAGE_SERVICES.get(label, 'other'), label, outcome)
+    add_span(f'llm.{label}', started, outcome=outcome)
+
+
+class LLMTimeoutError(OpenAIError):
+    """Raised when an LLM call exceeds its deadline on every attempt."""
+
+
+class LLMResponseError(ValueError):
+    """Raised when the model answers with an empty or non-JSON payload."""
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if isinstance(error, RateLimitError):
+        # Exhausted billing quota will not recover by waiting.
+        return getattr(error, 'code', None) != 'insufficient_quota' and 'insufficient_quota' not in str(error)
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500 or error.status_code == 408
+    return isinstance(error, (APIConnectionError, asyncio.TimeoutError))
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, 'response', None)
+    header = response.headers.get('retry-after') if response is not None else None
+    try:
+        return float(header) if header else None
+    except ValueError:
+        return None
+
+
+def _parse_json_object(payload: Optional[str]) -> Dict[str, Any]:
+    if not payload:
+        raise LLMResponseError('OpenAI returned empty response')
+    try:
+        data = loads(payload)
+    except JSONDecodeError as exc:
+        raise LLMResponseError('OpenAI response was not valid JSON') from exc
+    if not isinstance(data, dict):
+        raise LLMResponseError('OpenAI response was not a JSON object')
+    return data
+
+
+def _parse_model(payload: Optional[str], model: Type[M]) -> M:
+    """Validate the raw JSON text straight into ``model``, without an intermediate dict."""
+    if not payload:
+        raise LLMResponseError('OpenAI returned empty response')
+    try:
+        return model.model_validate_json(payload)
+    except ValidationError as exc:
+        errors = exc.errors(include_url=False)
+        if errors and errors[0]['type'] == 'json_invalid':
+            raise LLMResponseError('OpenAI response was not valid JSON') from exc
+        if errors and errors[0]['type'] == 'model_type' and not errors[0]['loc']:
+            raise LLMResponseError('OpenAI response was not a JSON object') from exc
+        raise
+
+
+class LLMGateway:
+    def __init__(self, settings: Optional[Settings] = None, cache: Optional[LLMCache] = llm_cache) -> None:
+        settings = settings or get_settings()
+        self._cache = cache
+        self.model = settings.openai_model
+        self.has_api_key = bool(settings.openai_api_key)
+        self._api_key = settings.openai_api_key
+        self._base_url = settings.openai_base_url or None
+        self._timeout = settings.openai_timeout_seconds
+        self._max_retries = settings.openai_max_retries
+        self._max_concurrency = settings.openai_max_concurrency
+        self._backoff_base = settings.openai_backoff_base_seconds
+        self._backoff_cap = settings.openai_backoff_max_seconds
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._flights: Optional[SingleFlight[Optional[str]]] = SingleFlight() if settings.llm_coalesce_enabled else None
+        self._client: Optional[AsyncOpenAI] = None
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        if self._client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self._max_concurrency,
+                    max_keepalive_connections=self._max_concurrency,
+                    keepalive_expiry=60.0
+                ),
+                timeout=httpx.Timeout(self._timeout, connect=10.0)
+            )
+            # Retries are handled here so they share the concurrency budget.
+            self._client = AsyncOpenAI(
+                api_key=self._api_key or 'unset',
+                base_url=self._base_url,
+                http_client=http_client,
+                max_retries=0
+            )
+        return self._client
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        hinted = _retry_after(error)
+        if hinted is not None:
+            return min(hinted, self._backoff_cap)
+        return random.uniform(0, min(self._backoff_cap, self._backoff_base * (2 ** attempt)))
+
+    def _build_request(self, prompt: str, system: str, json_mode: bool) -> Dict[str, Any]:
+        request: Dict[str, Any] = {
+            'model': self.model,
+            'messages': [
+                {'role': 'system', 'content': system},
+                {'role': 'user', 'content': prompt}
+            ]
+        }
+        if json_mode:
+            request['response_format'] = {'type': 'json_object'}
+        return request
+
+    async def _request(
+        self, prompt: str, system: str, json_mode: bool, timeout: Optional[float], stage: Optional[str]
+    ) -> Optional[str]:
+        deadline = timeout or self._timeout
+        request = self._build_request(prompt, system, json_mode)
+        token_ledger.record_call(stage, estimate_chat_tokens(self.model, system, prompt))
+
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    completion = await asyncio.wait_for(self.client.chat.completions.create(**request), deadline)
+                _observe_call(stage, started, 'ok')
+                token_ledger.record_usage(stage, completion.usage)
+                return completion.choices[0].message.content if completion.choices else None
+            except (OpenAIError, asyncio.TimeoutError) as error:
+                if attempt >= self._max_retries or not _is_retryable(error):
+                    _observe_call(stage, started, 'error')
+                    if isinstance(error, asyncio.TimeoutError):
+                        raise LLMTimeoutError(f'OpenAI call exceeded {deadline:g}s deadline') from error
+                    raise
+                delay = self._backoff(attempt, error)
+                logger.info('Retrying OpenAI call in %.2fs after %s (attempt %d)', delay, type(error).__name__, attempt + 1)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def _shared_request(
+        self, prompt: str, system: str, json_mode: bool, timeout: Optional[float], stage: Optional[str]
+    ) -> Tuple[Optional[str], bool]:
+        """``_request``, joined onto an identical one already in flight; also returns whether this caller made the call."""
+        if self._flights is None:
+            return await self._request(prompt, system, json_mode, timeout, stage), True
+        key = (self.model, system, prompt, json_mode)
+        payload, leader = await self._flights.do(key, lambda: self._request(prompt, system, json_mode, timeout, stage))
+        if not leader:
+            token_ledger.record_coalesced(stage)
+        return payload, leader
+
+    async def _cached(
+        self,
+        prompt: str,
+        system: str,
+        json_mode: bool,
+        timeout: Optional[float],
+        stage: Optional[str],
+        parse: Callable[[Optional[str]], T]
+    ) -> T:
+        key = None
+        if self._cache is not None and self._cache.is_cacheable(stage):
+            key = LLMCache.make_key(self.model, system, prompt, 'json_object' if json_mode else 'text')
+            cached = await self._cache.get(key, stage)
+            if cached is not None:
+                token_ledger.record_cached(stage)
+                return parse(cached)
+
+        payload, leader = await self._shared_request(prompt, system, json_mode, timeout, stage)
+        result = parse(payload)
+        # Only responses that parsed cleanly are worth replaying; joined callers leave the write to the leader.
+        if key is not None and payload and leader:
+            await self._cache.set(key, payload)
+        return result
+
+    async def complete(
+        self,
+        prompt: str,
+        *,
+        system: str = DEFAULT_SYSTEM_PROMPT,
+        json_mode: bool = True,
+        timeout: Optional[float] = None,
+        stage: Optional[str] = None
+    ) -> Optional[str]:
+        """Send one chat completion and return the message text.
+
+        ``stage`` labels the caller for cache opt-outs, hit/miss counters and
+        token accounting.
+        """
+        return await self._cached(prompt, system, json_mode, timeout, stage, lambda payload: payload)
+
+    async def complete_json(
+        self,
+        prompt: str,
+        *,
+        system: str = DEFAULT_SYSTEM_PROMPT,
+        timeout: Optional[float] = None,
+        stage: Optional[str] = None
+    ) -> Dict[str, Any]:
+        return await self._cached(prompt, system, True, timeout, stage, _parse_json_object)
+
+    async def complete_model(
+        self,
+        prompt: str,
+        model: Type[M],
+        *,
+        system: str = DEFAULT_SYSTEM_PROMPT,
+        timeout: Optional[float] = None,
+        stage: Optional[str] = None
+    ) -> M:
+        """``complete_json`` validated into ``model``; a reply that does not fit raises ``ValidationError``."""
+        return await self._cached(prompt, system, True, timeout, stage, lambda payload: _parse_model(payload, model))
+
+    async def complete_validated(
+        self,
+        prompt: str,
+        validate: Callable[[Dict[str, Any]], T],
+        *,
+        system: str = DEFAULT_SYSTEM_PROMPT,
+        timeout: Optional[float] = None,
+        stage: Optional[str] = None
+    ) -> T:
+        """``complete_json`` passed through ``validate``; a reply it rejects (by raising) is never cached."""
+        return await self._cached(prompt, system, True, timeout, stage, lambda payload: validate(_parse_json_object(payload)))
+
+    async def stream(
+        self,
+        prompt: str,
+        *,
+        system: str = DEFAULT_SYSTEM_PROMPT,
+        json_mode: bool = True,
+        timeout: Optional[float] = None,
+        stage: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """Yield completion text deltas as the model produces them.
+
+        Retries only happen before the first delta is yielded; ``timeout``
+        bounds the wait for each chunk rather than the whole stream. A cached
+        response is replayed as a single chunk.
+        """
+        deadline = timeout or self._timeout
+        key = None
+        if self._cache is not None and self._cache.is_cacheable(stage):
+            key = LLMCache.make_key(self.model, system, prompt, 'json_object' if json_mode else 'text')
+            cached = await self._cache.get(key, stage)
+            if cached is not None:
+                token_ledger.record_cached(stage)
+                yield cached
+                return
+
+        request = self._build_request(prompt, system, json_mode)
+        request['stream'] = True
+        # The final chunk then carries the call's token usage.
+        request['stream_options'] = {'include_usage': True}
+        token_ledger.record_call(stage, estimate_chat_tokens(self.model, system, prompt))
+        started = time.perf_counter()
+        parts: list[str] = []
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore:
+                    response = await asyncio.wait_for(self.client.chat.completions.create(**request), deadline)
+                    chunks = response.__aiter__()
+                    try:
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), deadline)
+                            except StopAsyncIteration:
+                                break
+                            if chunk.usage is not None:
+                                token_ledger.record_usage(stage, chunk.usage)
+                            delta = chunk.choices[0].delta.content if chunk.choices else None
+                            if delta:
+                                parts.append(delta)
+                                yield delta
+                    finally:
+                        await response.close()
+                _observe_call(stage, started, 'ok')
+                break
+            except (OpenAIError, asyncio.TimeoutError) as error:
+                if parts or attempt >= self._max_retries or not _is_retryable(error):
+                    _observe_call(stage, started, 'error')
+                    if isinstance(error, asyncio.TimeoutError):
+                        raise LLMTimeoutError(f'OpenAI stream stalled for {deadline:g}s') from error
+                    raise
+                delay = self._backoff(attempt, error)
+                logger.info('Retrying OpenAI stream in %.2fs after %s (attempt %d)', delay, type(error).__name__, attempt + 1)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+        if key is not None and parts:
+            payload = ''.join(parts)
+            if json_mode:
+                try:
+                    _parse_json_object(payload)
+                except LLMResponseError:
+                    return
+            await self._cache.set(key, payload)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+llm_gateway = LLMGateway()
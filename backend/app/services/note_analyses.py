@@ -0,0 +1,65 @@
+"""Reuse of per-note LLM analyses across uploads and pipeline runs.
+
+Notes are identified by a hash of their normalized text, the same hash the
+``notes`` table stores in ``content_hash``. Analyses that depend only on the
+note (the stage 1 voice profile and the tone scores) are stored in
+``note_analyses`` under ``(user_id, content_hash, kind)`` so that re-pasting a
+note reuses them instead of calling the model again. Rows from a different
+model are ignored. Reads and writes are best effort: a Supabase error only
+costs the LLM call the reuse would have saved.
+"""
+
+import hashlib
+import logging
+from typing import Literal, Optional, Type, TypeVar
+
+from pydantic import BaseModel, ValidationError
+
+from ..db import Database
+from .llm_gateway import llm_gateway
+
+logger = logging.getLogger(__name__)
+
+AnalysisKind = Literal['voice', 'tone']
+M = TypeVar('M', bound=BaseModel)
+
+
+def note_content_hash(text: str) -> str:
+    """sha256 of the note with line endings and surrounding whitespace normalized."""
+    normalized = '\n'.join(line.rstrip() for line in text.strip().splitlines())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+async def load_analysis(
+    db: Optional[Database], user_id: Optional[str], note_text: str, kind: AnalysisKind, model: Type[M]
+) -> Optional[M]:
+    if db is None or not user_id:
+        return None
+    try:
+        row = await db.note_analyses.get(user_id, note_content_hash(note_text), kind)
+    except Exception as exc:  # pragma: no cover - fall back to a fresh LLM call
+        logger.warning('Failed to load %s analysis for %s: %s', kind, user_id, exc)
+        return None
+    if not row or row.get('model') != llm_gateway.model:
+        return None
+    try:
+        return model.model_validate(row.get('data'))
+    except ValidationError:
+        return None
+
+
+async def save_analysis(
+    db: Optional[Database], user_id: Optional[str], note_text: str, kind: AnalysisKind, result: BaseModel
+) -> None:
+    if db is None or not user_id:
+        return
+    try:
+        await db.note_analyses.upsert({
+            'user_id': user_id,
+            'content_hash': note_content_hash(note_text),
+            'kind': kind,
+            'model': llm_gateway.model,
+            'data': result.model_dump()
+        })
+    except Exception as exc:  # pragma: no cover - storing is an optimization only
+        logger.warning('Failed to store %s analysis for %s: %s', kind, user_id, exc)
@@ -1,9 +1,13 @@
-import json
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
 
-from openai import AsyncOpenAI, OpenAIError
+from openai import OpenAIError
 
-from ..config import get_settings
+from ..utils.json_stream import IncrementalJSONParser, tweet_events, tweet_slot
+from ..utils.serialization import JSONDecodeError, loads
+from .llm_gateway import LLMGateway, LLMResponseError, llm_gateway
+from .token_budget import PromptBudgets, prompt_budgets
+
+SYSTEM_PROMPT = 'You transform notes into structured tweet batches and reply with JSON only.'
 
 PROMPT_TEMPLATE = """
 You are an assistant that converts user notes into tweetable insights.
@@ -28,11 +32,9 @@ Rules:
 
 
 class OpenAIService:
-    def __init__(self) -> None:
-        settings = get_settings()
-        self.model = settings.openai_model
-        self._has_api_key = bool(settings.openai_api_key)
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key or None)
+    def __init__(self, gateway: LLMGateway = llm_gateway, budgets: PromptBudgets = prompt_budgets) -> None:
+        self._gateway = gateway
+        self._budgets = budgets
 
     def _quota_placeholder(self) -> Dict[str, Any]:
         prefix = 'FYI:'
@@ -56,57 +58,82 @@ class OpenAIService:
             ]
         }
 
-    async def generate_tweets(
-        self, *, persona: str, text: str, persona_bio: Optional[str] = None
-    ) -> Dict[str, Any]:
-        if not self._has_api_key:
-            # Development fallback when the API key is not configured yet.
-            return {
-                'short_tweets': ['Configure OPENAI_API_KEY to enable live generations.'],
-                'long_tweets': [
-                    'This is placeholder copy generated locally. Once the backend is connected to OpenAI the real drafts will appear here.'
-                ],
-                'threads': [['Thread placeholder.']]
-            }
-
-        prompt = PROMPT_TEMPLATE.format(
+    def _unconfigured_placeholder(self) -> Dict[str, Any]:
+        # Development fallback when the API key is not configured yet.
+        return {
+            'short_tweets': ['Configure OPENAI_API_KEY to enable live generations.'],
+            'long_tweets': [
+                'This is placeholder copy generated locally. Once the backend is connected to OpenAI the real drafts will appear here.'
+            ],
+            'threads': [['Thread placeholder.']]
+        }
+
+    def _prompt(self, persona: str, text: str, persona_bio: Optional[str]) -> str:
+        return self._budgets.render(
+            PROMPT_TEMPLATE,
+            'generate',
+            trim='text',
             persona=persona,
             persona_bio=persona_bio or 'N/A',
             text=text
         )
 
+    async def generate_tweets(
+        self, *, persona: str, text: str, persona_bio: Optional[str] = None
+    ) -> Dict[str, Any]:
+        if not self._gateway.has_api_key:
+            return self._unconfigured_placeholder()
+
         try:
-            if hasattr(self.client, 'responses'):
-                response = await self.client.responses.create(
-                    model=self.model,
-                    input=prompt,
-                    response_format={'type': 'json_object'}
-                )
-                message = getattr(response, 'output_text', None)
-            else:
-                completion = await self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {
-                            'role': 'system',
-                            'content': 'You transform notes into structured tweet batches and reply with JSON only.'
-                        },
-                        {'role': 'user', 'content': prompt}
-                    ]
-                )
-                choice = completion.choices[0]
-                message = choice.message.content if choice and choice.message else None
+            return await self._gateway.complete_json(
+                self._prompt(persona, text, persona_bio),
+                system=SYSTEM_PROMPT,
+                stage='generate'
+            )
         except OpenAIError as error:
             if getattr(error, 'code', '') == 'insufficient_quota' or 'insufficient_quota' in str(error):
                 return self._quota_placeholder()
             raise RuntimeError('OpenAI generation failed') from error
+        except LLMResponseError as error:
+            raise RuntimeError(str(error)) from error
+
+    async def stream_tweets(
+        self, *, persona: str, text: str, persona_bio: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Yield ``('tweet', slot)`` as each tweet string closes, then ``('done', result)``."""
+        if not self._gateway.has_api_key:
+            result = self._unconfigured_placeholder()
+            for slot in tweet_events(result):
+                yield 'tweet', slot
+            yield 'done', result
+            return
+
+        parser = IncrementalJSONParser()
+        try:
+            async for delta in self._gateway.stream(
+                self._prompt(persona, text, persona_bio),
+                system=SYSTEM_PROMPT,
+                stage='generate'
+            ):
+                for path, value in parser.feed(delta):
+                    slot = tweet_slot(path)
+                    if slot is not None:
+                        yield 'tweet', {**slot, 'text': value}
+        except OpenAIError as error:
+            quota_error = getattr(error, 'code', '') == 'insufficient_quota' or 'insufficient_quota' in str(error)
+            if quota_error and not parser.text:
+                result = self._quota_placeholder()
+                for slot in tweet_events(result):
+                    yield 'tweet', slot
+                yield 'done', result
+                return
+            raise RuntimeError('OpenAI generation failed') from error
 
-        if not message:
-            raise RuntimeError('OpenAI response did not contain text output')
         try:
-            return json.loads(message)
-        except json.JSONDecodeError as error:
+            result = loads(parser.text)
+        except JSONDecodeError as error:
             raise RuntimeError('OpenAI response was not valid JSON') from error
+        yield 'done', result
 
 
 openai_service = OpenAIService()
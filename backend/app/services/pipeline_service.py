@@ -2,20 +2,27 @@
 
 Each function maps to a stage in the PRD:
 1. Voice extraction
-2. Idea mining
+2. Idea mining (map-reduce over paragraph chunks for long notes)
 3. Insight angle derivation
-4. Tweet/Thread generation
+   (1–3 can also run as one fused call in fast mode; see ``FUSED_PROMPT``)
+4. Tweet/Thread generation (single slots can be regenerated; see ``SLOT_PROMPT``)
 5. Shitpost distillation
 """
 
-import json
-from typing import Any, Dict
+import asyncio
+import logging
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Type, TypeVar
 
 from fastapi import HTTPException, status
-from openai import AsyncOpenAI, OpenAIError
+from openai import OpenAIError
+from pydantic import BaseModel, ValidationError
 
-from ..config import get_settings
+from ..config import Settings, get_settings
 from ..schemas import (
+    IdeaItem,
     IdeasResponse,
     InsightAnglesResponse,
     ShitpostResponse,
@@ -23,7 +30,24 @@ from ..schemas import (
     TweetOutput,
     VoiceProfileResponse
 )
+from ..utils.chunking import split_paragraphs
+from .llm_gateway import LLMGateway, LLMResponseError, llm_gateway
+from .token_budget import PromptBudgets, prompt_budgets
+from .tweet_validator import (
+    LONG_MIN,
+    SHORT_MAX,
+    THREAD_MAX,
+    THREAD_MIN,
+    TWEET_MAX,
+    normalize_batch,
+    repair_tweets,
+    slot_issues
+)
+
+logger = logging.getLogger(__name__)
 
+M = TypeVar('M', bound=BaseModel)
+T = TypeVar('T')
 
 DEFAULT_TONE = {
     'professional_casual': 50,
@@ -149,6 +173,49 @@ Return JSON:
 """
 
 
+SLOT_PROMPT = """You are Tweetable Stage 4: Tweet Generator, rewriting a single slot of an existing batch.
+Voice Profile: {voice_profile}
+Stylistic Quirks: {quirks}
+Persona: {persona}
+Insight Angles:
+{angles}
+
+Tone controls (0-100 scale):
+- Professional ↔ Casual: {professional_casual}
+- Polished ↔ Chaotic: {polished_chaotic}
+- Calm ↔ Enraged: {calm_enraged}
+- Optimistic ↔ Cynical: {optimistic_cynical}
+- Insightful ↔ Entertaining: {insightful_entertaining}
+- Clean ↔ Profane: {clean_profane}
+
+The rest of the batch stays. Avoid duplicating it, its hooks or its angles:
+{others}
+
+Write {target}.
+{retry}
+Rules:
+- Must sound human and match the user's quirks and tone sliders.
+- No corporate tone or fluffy self-help.
+- Build it around one of the provided angles.
+
+Return JSON:
+{shape}
+"""
+
+
+SLOT_TARGETS = {
+    'short_tweets': f'one new short tweet (under {SHORT_MAX + 1} chars)',
+    'long_tweets': f'one new long tweet ({LONG_MIN}-{TWEET_MAX} chars)',
+    'threads': f'one new thread of {THREAD_MIN}-{THREAD_MAX} tweets, each under {TWEET_MAX + 1} chars',
+}
+
+SLOT_SHAPES = {
+    'short_tweets': '{"tweet": ""}',
+    'long_tweets': '{"tweet": ""}',
+    'threads': '{"thread": ["", "", ""]}',
+}
+
+
 STAGE5_PROMPT = """You are Tweetable Stage 5: Shitpost Distiller.
 Voice Profile: {voice_profile}
 Stylistic Quirks: {quirks}
@@ -165,119 +232,421 @@ Return JSON:
 """
 
 
+FUSED_PROMPT = """You are Tweetable Stages 1-3 in one pass: Voice Extractor, Idea Miner and Insight Angle Creator.
+Read the user's raw input text once and produce all three results.
+
+1. Voice & persona:
+   - voice_profile — describe their tone (snarky, blunt, hopeful, sarcastic, introspective, degen, etc.)
+   - stylistic_quirks — 5–10 patterns such as favorite phrases, structure, cadence, or pet peeves.
+   - persona — a short label that captures who the user is.
+   - tone_scores — numeric sliders (0-100) for professional_casual, polished_chaotic, calm_enraged,
+     optimistic_cynical, insightful_entertaining, clean_profane.
+2. Ideas: 5-8 tweet-worthy ideas, each with title (short hook), summary (1 sentence),
+   virality (1-5), relatability (1-5), emotional_punch (1-5).
+3. Angles: for each idea, 1-2 sharper angles written in the voice you extracted that push the thinking further.
+
+Rules:
+- Be precise and evocative.
+- Never invent traits not implied by the text.
+
+Return JSON:
+{{
+  "voice_profile": "",
+  "stylistic_quirks": [""],
+  "persona": "",
+  "tone_scores": {{
+    "professional_casual": 50,
+    "polished_chaotic": 50,
+    "calm_enraged": 50,
+    "optimistic_cynical": 50,
+    "insightful_entertaining": 50,
+    "clean_profane": 50
+  }},
+  "ideas": [
+    {{
+      "title": "",
+      "summary": "",
+      "virality": 1,
+      "relatability": 1,
+      "emotional_punch": 1
+    }}
+  ],
+  "angles": [
+    {{
+      "idea_title": "",
+      "angle": ""
+    }}
+  ]
+}}
+
+Raw Text:
+{raw_text}
+"""
+
+
+@dataclass(frozen=True)
+class StageNode:
+    """One pipeline stage: its name, the stages it consumes, and how to run it."""
+
+    name: str
+    depends_on: Sequence[str]
+    run: Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+StageCallback = Callable[[str, Any], None]
+
+
+async def run_stage_graph(nodes: Iterable[StageNode], on_stage_complete: Optional[StageCallback] = None) -> Dict[str, Any]:
+    """Run stages as a dependency graph, starting each one as soon as its inputs resolve.
+
+    ``on_stage_complete(name, result)`` is invoked synchronously as each stage
+    finishes so callers can schedule side work (persistence, streaming) without
+    holding up dependent stages. If any stage fails, the remaining stages are
+    cancelled and the error propagates.
+    """
+    graph = {node.name: node for node in nodes}
+    tasks: Dict[str, asyncio.Task] = {}
+
+    def schedule(name: str, chain: tuple[str, ...] = ()) -> asyncio.Task:
+        if name in tasks:
+            return tasks[name]
+        if name in chain:
+            raise ValueError(f"Pipeline stage cycle: {' -> '.join(chain + (name,))}")
+        node = graph.get(name)
+        if node is None:
+            raise ValueError(f'Unknown pipeline stage dependency: {name}')
+        upstream = {dep: schedule(dep, chain + (name,)) for dep in node.depends_on}
+
+        async def execute() -> Any:
+            inputs = {dep: await task for dep, task in upstream.items()}
+            result = await node.run(inputs)
+            if on_stage_complete is not None:
+                on_stage_complete(node.name, result)
+            return result
+
+        tasks[name] = asyncio.create_task(execute(), name=f'pipeline-stage-{name}')
+        return tasks[name]
+
+    try:
+        for name in graph:
+            schedule(name)
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+
+    return {name: task.result() for name, task in tasks.items()}
+
+
+def _title_words(title: str) -> set[str]:
+    return set(re.findall(r'[a-z0-9]+', title.lower()))
+
+
+def _idea_score(idea: IdeaItem) -> int:
+    return idea.virality + idea.relatability + idea.emotional_punch
+
+
+def merge_ideas(partials: Sequence[IdeasResponse], limit: int) -> IdeasResponse:
+    """Reduce per-chunk idea lists into one ranked, de-duplicated list.
+
+    Ideas whose titles share most of their words are treated as the same idea;
+    the best-scored one is kept and every extra chunk that surfaced it adds a
+    point to its rank.
+    """
+    groups: List[tuple[set[str], List[IdeaItem]]] = []
+    for partial in partials:
+        for idea in partial.ideas:
+            words = _title_words(idea.title)
+            for group_words, members in groups:
+                if words and len(words & group_words) / len(words | group_words) >= 0.6:
+                    members.append(idea)
+                    break
+            else:
+                groups.append((words, [idea]))
+
+    ranked = [(max(members, key=_idea_score), len(members)) for _, members in groups]
+    ranked.sort(key=lambda entry: _idea_score(entry[0]) + entry[1] - 1, reverse=True)
+    return IdeasResponse(ideas=[idea for idea, _ in ranked[:limit]])
+
+
+@contextmanager
+def _upstream_errors() -> Iterator[None]:
+    try:
+        yield
+    except OpenAIError as exc:  # pragma: no cover - network errors
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f'OpenAI error: {exc}') from exc
+    except LLMResponseError as exc:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(exc)) from exc
+
+
 class PipelineLLMService:
     """Wraps OpenAI client usage for the PRD-defined pipeline stages."""
 
-    def __init__(self) -> None:
-        settings = get_settings()
-        self._model = settings.openai_model
-        self._has_api_key = bool(settings.openai_api_key)
-        self._client = AsyncOpenAI(api_key=settings.openai_api_key or None)
-
-    async def _call(self, prompt: str) -> Dict[str, Any]:
-        if not self._has_api_key:
+    def __init__(
+        self,
+        gateway: LLMGateway = llm_gateway,
+        settings: Optional[Settings] = None,
+        budgets: PromptBudgets = prompt_budgets
+    ) -> None:
+        settings = settings or get_settings()
+        self._gateway = gateway
+        self._budgets = budgets
+        self._chunk_chars = settings.pipeline_chunk_chars
+        self._chunk_concurrency = max(1, settings.pipeline_chunk_concurrency)
+        self._max_ideas = settings.pipeline_max_ideas
+
+    def _require_api_key(self) -> None:
+        if not self._gateway.has_api_key:
             raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='OPENAI_API_KEY is not configured.')
 
-        try:
-            if hasattr(self._client, 'responses'):
-                response = await self._client.responses.create(
-                    model=self._model,
-                    input=prompt,
-                    response_format={'type': 'json_object'}
-                )
-                payload = getattr(response, 'output_text', None)
-            else:
-                completion = await self._client.chat.completions.create(
-                    model=self._model,
-                    messages=[
-                        {'role': 'system', 'content': 'Reply with valid JSON only.'},
-                        {'role': 'user', 'content': prompt}
-                    ]
-                )
-                payload = completion.choices[0].message.content if completion.choices else None
-        except OpenAIError as exc:  # pragma: no cover - network errors
-            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f'OpenAI error: {exc}') from exc
-
-        if not payload:
-            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='OpenAI returned empty response')
+    async def _call(self, prompt: str, stage: str) -> Dict[str, Any]:
+        self._require_api_key()
+        with _upstream_errors():
+            return await self._gateway.complete_json(prompt, stage=stage)
 
-        try:
-            return json.loads(payload)
-        except json.JSONDecodeError as exc:
-            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='OpenAI response was not valid JSON') from exc
+    async def _call_model(self, prompt: str, stage: str, model: Type[M]) -> M:
+        """Like ``_call`` but validates the raw reply straight into ``model``."""
+        self._require_api_key()
+        with _upstream_errors():
+            return await self._gateway.complete_model(prompt, model, stage=stage)
 
-    async def run_stage1(self, note_text: str) -> VoiceProfileResponse:
-        data = await self._call(STAGE1_PROMPT.format(raw_text=note_text))
+    async def _call_validated(self, prompt: str, stage: str, validate: Callable[[Dict[str, Any]], T]) -> T:
+        """Like ``_call`` but only a reply ``validate`` accepts can be cached."""
+        self._require_api_key()
+        with _upstream_errors():
+            return await self._gateway.complete_validated(prompt, validate, stage=stage)
+
+    def _parse_voice(self, data: Dict[str, Any]) -> VoiceProfileResponse:
         data['tone_scores'] = self._sanitize_tone(data.get('tone_scores'))
         return VoiceProfileResponse.model_validate(data)
 
-    async def run_stage2(self, note_text: str, voice: VoiceProfileResponse) -> IdeasResponse:
-        data = await self._call(
-            STAGE2_PROMPT.format(
-                voice_profile=voice.voice_profile,
-                quirks='; '.join(voice.stylistic_quirks),
-                persona=voice.persona,
-                raw_text=note_text
-            )
+    def _parse_fused(self, data: Dict[str, Any]) -> tuple[VoiceProfileResponse, IdeasResponse, InsightAnglesResponse]:
+        return (
+            self._parse_voice(data),
+            IdeasResponse.model_validate({'ideas': data.get('ideas')}),
+            InsightAnglesResponse.model_validate({'angles': data.get('angles')}),
         )
-        return IdeasResponse.model_validate(data)
+
+    def _chunks(self, note_text: str) -> List[str]:
+        return split_paragraphs(note_text, self._chunk_chars) or [note_text]
+
+    async def run_stage1(self, note_text: str) -> VoiceProfileResponse:
+        # The voice shows in any stretch of the note; the first chunk keeps the prompt bounded.
+        prompt = self._budgets.render(STAGE1_PROMPT, 'voice', trim='raw_text', raw_text=self._chunks(note_text)[0])
+        return await self._call_validated(prompt, 'voice', self._parse_voice)
+
+    async def _mine_ideas(self, text: str, voice: VoiceProfileResponse) -> IdeasResponse:
+        prompt = self._budgets.render(
+            STAGE2_PROMPT,
+            'ideas',
+            trim='raw_text',
+            voice_profile=voice.voice_profile,
+            quirks='; '.join(voice.stylistic_quirks),
+            persona=voice.persona,
+            raw_text=text
+        )
+        return await self._call_model(prompt, 'ideas', IdeasResponse)
+
+    async def run_stage2(self, note_text: str, voice: VoiceProfileResponse) -> IdeasResponse:
+        """Mine ideas; long notes are mined chunk by chunk in parallel and the results merged."""
+        chunks = self._chunks(note_text)
+        if len(chunks) == 1:
+            return await self._mine_ideas(chunks[0], voice)
+
+        semaphore = asyncio.Semaphore(self._chunk_concurrency)
+
+        async def mine(chunk: str) -> IdeasResponse:
+            async with semaphore:
+                return await self._mine_ideas(chunk, voice)
+
+        partials = await asyncio.gather(*(mine(chunk) for chunk in chunks), return_exceptions=True)
+        mined = [partial for partial in partials if isinstance(partial, IdeasResponse)]
+        if not mined:
+            raise next(partial for partial in partials if isinstance(partial, BaseException))
+        if len(mined) < len(chunks):
+            logger.warning('Idea mining failed for %d of %d chunks', len(chunks) - len(mined), len(chunks))
+        return merge_ideas(mined, self._max_ideas)
 
     async def run_stage3(self, voice: VoiceProfileResponse, ideas: IdeasResponse) -> InsightAnglesResponse:
-        data = await self._call(
-            STAGE3_PROMPT.format(
-                voice_profile=voice.voice_profile,
-                quirks='; '.join(voice.stylistic_quirks),
-                persona=voice.persona,
-                ideas=json.dumps(ideas.model_dump()['ideas'], indent=2)
-            )
+        prompt = self._budgets.render(
+            STAGE3_PROMPT,
+            'angles',
+            trim='ideas',
+            voice_profile=voice.voice_profile,
+            quirks='; '.join(voice.stylistic_quirks),
+            persona=voice.persona,
+            ideas=ideas
         )
-        return InsightAnglesResponse.model_validate(data)
+        return await self._call_model(prompt, 'angles', InsightAnglesResponse)
+
+    async def run_fused(
+        self, note_text: str
+    ) -> Optional[tuple[VoiceProfileResponse, IdeasResponse, InsightAnglesResponse]]:
+        """Stages 1–3 from a single call, or ``None`` if the model's answer does not validate."""
+        if len(self._chunks(note_text)) > 1:
+            # Too long for one prompt; the staged path chunks stage 2.
+            return None
+        try:
+            prompt = self._budgets.render(FUSED_PROMPT, 'fused', trim='raw_text', raw_text=note_text)
+            # Validated before it can be cached, so a rejected answer is not replayed on the next run.
+            voice, ideas, angles = await self._call_validated(prompt, 'fused', self._parse_fused)
+        except ValidationError as exc:
+            logger.info('Fused stages 1-3 did not validate, falling back to staged calls: %s', exc)
+            return None
+        except HTTPException as exc:
+            if not isinstance(exc.__cause__, LLMResponseError):
+                raise
+            logger.info('Fused stages 1-3 returned malformed JSON, falling back to staged calls: %s', exc.detail)
+            return None
+        return voice, ideas, angles
 
     async def run_stage4(self, voice: VoiceProfileResponse, angles: InsightAnglesResponse, tone: ToneScores) -> TweetOutput:
-        tone_dict = self._sanitize_tone(tone.model_dump())
-        data = await self._call(
-            STAGE4_PROMPT.format(
+        tone_dict = self._sanitize_tone(tone.model_dump()).model_dump()
+        prompt = self._budgets.render(
+            STAGE4_PROMPT,
+            'tweets',
+            trim='angles',
+            voice_profile=voice.voice_profile,
+            quirks='; '.join(voice.stylistic_quirks),
+            persona=voice.persona,
+            angles=angles,
+            **tone_dict
+        )
+        data = await self._call(prompt, 'tweets')
+        batch = normalize_batch(data.get('short_tweets'), data.get('long_tweets'), data.get('threads'))
+        # Empty, overlong or repeated slots are re-requested on their own; the rest are kept.
+        context = '\n'.join([
+            f'Voice Profile: {voice.voice_profile}',
+            f"Stylistic Quirks: {'; '.join(voice.stylistic_quirks)}",
+            f'Persona: {voice.persona}',
+            'Tone (0-100): ' + ', '.join(f'{name}={value}' for name, value in tone_dict.items()),
+        ])
+        batch, _ = await repair_tweets(batch, self._call, stage='tweets_repair', context=context, budgets=self._budgets)
+        return TweetOutput.model_validate(batch)
+
+    async def run_slot(
+        self,
+        voice: VoiceProfileResponse,
+        angles: InsightAnglesResponse,
+        tone: ToneScores,
+        tweets: Optional[TweetOutput],
+        kind: str,
+        index: int
+    ) -> TweetOutput:
+        """Regenerate one tweet (or one whole thread) of ``tweets`` and return the batch with it replaced.
+
+        The other slots go into the prompt as things not to repeat. A reply that
+        fails the local checks is retried once with the problem spelled out.
+        """
+        tone_dict = self._sanitize_tone(tone.model_dump()).model_dump()
+        current = tweets.model_dump() if tweets is not None else {}
+        batch = normalize_batch(current.get('short_tweets'), current.get('long_tweets'), current.get('threads'))
+        others = [
+            f'- {text}'
+            for name in ('short_tweets', 'long_tweets')
+            for position, text in enumerate(batch[name])
+            if text.strip() and (name, position) != (kind, index)
+        ] + [
+            f'- (thread) {" / ".join(post for post in thread if post.strip())}'
+            for position, thread in enumerate(batch['threads'])
+            if any(post.strip() for post in thread) and ('threads', position) != (kind, index)
+        ]
+
+        retry = ''
+        for attempt in range(2):
+            prompt = self._budgets.render(
+                SLOT_PROMPT,
+                'tweet_slot',
+                trim='angles',
                 voice_profile=voice.voice_profile,
                 quirks='; '.join(voice.stylistic_quirks),
                 persona=voice.persona,
-                angles=json.dumps(angles.model_dump()['angles'], indent=2),
+                angles=angles,
+                others='\n'.join(others) or '(none)',
+                target=SLOT_TARGETS[kind],
+                retry=retry,
+                shape=SLOT_SHAPES[kind],
                 **tone_dict
             )
+            data = await self._call(prompt, 'tweet_slot')
+            if kind == 'threads':
+                thread = data.get('thread')
+                batch['threads'][index] = normalize_batch([], [], [thread])['threads'][0]
+            else:
+                text = data.get('tweet')
+                batch[kind][index] = text.strip() if isinstance(text, str) else ''
+            issues = slot_issues(batch, kind, index)
+            if not issues:
+                return TweetOutput.model_validate(batch)
+            problems = '; '.join(f'{issue.slot} {issue.detail}' for issue in issues)
+            logger.info('Regenerated %s[%d] failed local checks (attempt %d): %s', kind, index, attempt + 1, problems)
+            retry = f'Your previous attempt was rejected: {problems}. Fix that this time.\n'
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f'Regenerated {kind}[{index}] did not meet its limits: {problems}'
         )
 
-        def _pad_list(items: Any, target: int) -> list[str]:
-            arr = list(items) if isinstance(items, list) else []
-            while len(arr) < target:
-                arr.append('')
-            return arr[:target]
-
-        short = _pad_list(data.get('short_tweets'), 4)
-        long = _pad_list(data.get('long_tweets'), 4)
-        raw_threads = data.get('threads') if isinstance(data.get('threads'), list) else []
-        threads = []
-        for idx in range(2):
-            base = list(raw_threads[idx]) if idx < len(raw_threads) and isinstance(raw_threads[idx], list) else []
-            while len(base) < 3:
-                base.append('')
-            threads.append(base[:5])
-
-        cleaned = {
-            'short_tweets': short,
-            'long_tweets': long,
-            'threads': threads
-        }
-        return TweetOutput.model_validate(cleaned)
-
     async def run_stage5(self, voice: VoiceProfileResponse, angles: InsightAnglesResponse) -> ShitpostResponse:
-        data = await self._call(
-            STAGE5_PROMPT.format(
-                voice_profile=voice.voice_profile,
-                quirks='; '.join(voice.stylistic_quirks),
-                persona=voice.persona,
-                angles=json.dumps(angles.model_dump()['angles'], indent=2)
-            )
+        prompt = self._budgets.render(
+            STAGE5_PROMPT,
+            'shitpost',
+            trim='angles',
+            voice_profile=voice.voice_profile,
+            quirks='; '.join(voice.stylistic_quirks),
+            persona=voice.persona,
+            angles=angles
         )
-        return ShitpostResponse.model_validate(data)
+        return await self._call_model(prompt, 'shitpost', ShitpostResponse)
+
+    async def run_all(
+        self,
+        note_text: str,
+        *,
+        tone_overrides: Optional[ToneScores] = None,
+        include_shitpost: bool = True,
+        fast_mode: bool = False,
+        voice: Optional[VoiceProfileResponse] = None,
+        on_stage_complete: Optional[StageCallback] = None
+    ) -> Dict[str, Any]:
+        """Run every stage for a note; tweets and shitpost run concurrently once angles exist.
+
+        With ``fast_mode`` stages 1–3 come from one fused call; if its answer does
+        not validate, each of them falls back to its own staged call. A ``voice``
+        already derived from this note (e.g. a stored analysis) skips stage 1.
+        """
+        fused: Dict[str, Any] = {}
+
+        async def voice_stage(_: Dict[str, Any]) -> VoiceProfileResponse:
+            if voice is not None:
+                return voice
+            if fast_mode:
+                result = await self.run_fused(note_text)
+                if result is not None:
+                    fused['voice'], fused['ideas'], fused['angles'] = result
+                    return fused['voice']
+            return await self.run_stage1(note_text)
+
+        async def ideas_stage(r: Dict[str, Any]) -> IdeasResponse:
+            return fused.get('ideas') or await self.run_stage2(note_text, r['voice'])
+
+        async def angles_stage(r: Dict[str, Any]) -> InsightAnglesResponse:
+            return fused.get('angles') or await self.run_stage3(r['voice'], r['ideas'])
+
+        nodes = [
+            StageNode('voice', (), voice_stage),
+            StageNode('ideas', ('voice',), ideas_stage),
+            StageNode('angles', ('voice', 'ideas'), angles_stage),
+            StageNode(
+                'tweets',
+                ('voice', 'angles'),
+                lambda r: self.run_stage4(r['voice'], r['angles'], tone_overrides or r['voice'].tone_scores)
+            ),
+        ]
+        if include_shitpost:
+            nodes.append(StageNode('shitpost', ('voice', 'angles'), lambda r: self.run_stage5(r['voice'], r['angles'])))
+        return await run_stage_graph(nodes, on_stage_complete)
 
     def _sanitize_tone(self, payload: Any) -> ToneScores:
         base = DEFAULT_TONE.copy()
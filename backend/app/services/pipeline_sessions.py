@@ -0,0 +1,154 @@
+"""Server-side state for pipeline sessions.
+
+Every stage result is kept, already validated, in a TTL/LRU cache keyed by
+``(user_id, session_id)`` and is read back from the stage tables on a miss,
+so ``/pipeline/stage/{stage}`` callers only need to send a ``session_id``.
+The session's note text is stored with its voice profile row and read back
+the same way. Regenerating a stage invalidates the stages built on top of it.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Set, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from ..config import Settings, get_settings
+from ..schemas import (
+    IdeasResponse,
+    InsightAnglesResponse,
+    ShitpostResponse,
+    TweetOutput,
+    VoiceProfileResponse
+)
+from ..utils.cache import TTLCache
+
+if TYPE_CHECKING:  # pragma: no cover - db.py pulls in the whole repository layer
+    from ..db import Database
+
+logger = logging.getLogger(__name__)
+
+STAGE_TABLES = {
+    'voice': 'voice_profiles',
+    'ideas': 'idea_extractions',
+    'angles': 'insight_angles',
+    'tweets': 'tweet_generations',
+    'shitpost': 'shitposts'
+}
+
+STAGE_MODELS: Dict[str, Type[BaseModel]] = {
+    'voice': VoiceProfileResponse,
+    'ideas': IdeasResponse,
+    'angles': InsightAnglesResponse,
+    'tweets': TweetOutput,
+    'shitpost': ShitpostResponse
+}
+
+# Upstream stages each stage is generated from.
+STAGE_INPUTS: Dict[str, Tuple[str, ...]] = {
+    'voice': (),
+    'ideas': ('voice',),
+    'angles': ('voice', 'ideas'),
+    'tweets': ('voice', 'angles'),
+    'shitpost': ('voice', 'angles')
+}
+
+
+def downstream_stages(stage: str) -> Tuple[str, ...]:
+    """Every stage that consumes ``stage``, directly or transitively."""
+    found: list[str] = []
+    frontier = [stage]
+    while frontier:
+        current = frontier.pop()
+        for name, inputs in STAGE_INPUTS.items():
+            if current in inputs and name not in found:
+                found.append(name)
+                frontier.append(name)
+    return tuple(name for name in STAGE_INPUTS if name in found)
+
+
+@dataclass
+class PipelineSession:
+    note_text: Optional[str] = None
+    stages: Dict[str, BaseModel] = field(default_factory=dict)
+    # Stages with no usable row: never stored, or invalidated by an upstream regeneration.
+    absent: Set[str] = field(default_factory=set)
+
+
+class PipelineSessionStore:
+    def __init__(self, settings: Optional[Settings] = None) -> None:
+        settings = settings or get_settings()
+        self._sessions: TTLCache[PipelineSession] = TTLCache(
+            maxsize=settings.pipeline_session_cache_size,
+            ttl=settings.pipeline_session_cache_ttl
+        )
+
+    def _session(self, user_id: str, session_id: str) -> PipelineSession:
+        key = (user_id, session_id)
+        session = self._sessions.get(key)
+        if session is None:
+            session = PipelineSession()
+        # Re-set on every touch so active sessions keep sliding their TTL forward.
+        self._sessions.set(key, session)
+        return session
+
+    def remember(self, user_id: str, session_id: str, stage: str, model: BaseModel) -> None:
+        session = self._session(user_id, session_id)
+        session.stages[stage] = model
+        session.absent.discard(stage)
+
+    def remember_note(self, user_id: str, session_id: str, note_text: str) -> None:
+        self._session(user_id, session_id).note_text = note_text
+
+    def note_text(self, user_id: str, session_id: str) -> Optional[str]:
+        return self._session(user_id, session_id).note_text
+
+    async def load_note(self, db: 'Database', user_id: str, session_id: str) -> Optional[str]:
+        """The session's note text, read from its voice profile row on a cache miss."""
+        session = self._session(user_id, session_id)
+        if session.note_text is None:
+            try:
+                session.note_text = await db.stages.get(STAGE_TABLES['voice'], session_id, user_id, column='note_text')
+            except Exception as exc:
+                logger.warning('Failed to load the note for session %s: %s', session_id, exc)
+        return session.note_text
+
+    def invalidate_downstream(self, user_id: str, session_id: str, stage: str) -> Tuple[str, ...]:
+        """Forget the stages derived from ``stage`` and return their names."""
+        session = self._session(user_id, session_id)
+        stale = downstream_stages(stage)
+        for name in stale:
+            session.stages.pop(name, None)
+            session.absent.add(name)
+        return stale
+
+    async def load(
+        self, db: 'Database', user_id: str, session_id: str, stages: Iterable[str]
+    ) -> Dict[str, BaseModel]:
+        """Return whichever of ``stages`` this session has, reading cache misses from the stage tables."""
+        stages = tuple(stages)
+        session = self._session(user_id, session_id)
+        wanted = [stage for stage in stages if stage not in session.stages and stage not in session.absent]
+        if wanted:
+            rows = await asyncio.gather(
+                *(db.stages.get(STAGE_TABLES[stage], session_id, user_id) for stage in wanted),
+                return_exceptions=True
+            )
+            for stage, row in zip(wanted, rows):
+                if isinstance(row, Exception):
+                    # Not cached as absent: the next request retries the table.
+                    logger.warning('Failed to load %s for session %s: %s', stage, session_id, row)
+                    continue
+                if row is None:
+                    session.absent.add(stage)
+                    continue
+                try:
+                    session.stages[stage] = STAGE_MODELS[stage].model_validate(row)
+                except ValidationError as exc:
+                    logger.warning('Stored %s for session %s is invalid: %s', stage, session_id, exc)
+                    session.absent.add(stage)
+        return {stage: session.stages[stage] for stage in stages if stage in session.stages}
+
+
+pipeline_sessions = PipelineSessionStore()
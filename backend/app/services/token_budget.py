@@ -0,0 +1,259 @@
+"""Local prompt-token accounting and per-stage prompt budgets.
+
+Prompts are measured before they are sent: with ``tiktoken`` when it is
+installed, otherwise with a word/punctuation heuristic that errs high.
+``PromptBudgets.render`` formats a prompt template and, if the result is over
+its stage's budget, trims one named input until it fits: text is cut back to a
+paragraph or sentence boundary, lists lose their trailing items.
+
+The gateway reports each call's estimate and the ``usage`` the API returns to
+``token_ledger``, which keeps per-stage totals for the process and, inside
+``token_ledger.track()``, a breakdown for the current request (the ``debug`` field of
+the generation responses).
+"""
+
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+from ..config import Settings, get_settings
+from ..utils.chunking import split_paragraphs
+from ..utils.metrics import registry
+from ..utils.serialization import PromptList, dumps_text
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Defaults sized for the prompts in this backend; LLM_PROMPT_BUDGETS overrides them.
+STAGE_PROMPT_BUDGETS: Dict[str, int] = {
+    'voice': 6000,
+    'ideas': 6000,
+    'fused': 6000,
+    'angles': 3000,
+    'tweets': 3000,
+    'tweets_repair': 2000,
+    'tweet_slot': 3000,
+    'shitpost': 3000,
+    'generate': 6000,
+    'tone_analyze': 4000,
+    'tone_generate': 6000,
+    'tone_generate_repair': 3000,
+    'playground': 2000,
+}
+
+# Per-message framing the chat format adds around each message, plus the reply primer.
+_TOKENS_PER_MESSAGE = 3
+_TOKENS_PER_REPLY = 3
+
+_WORD_OR_SYMBOL = re.compile(r'\w+|[^\w\s]')
+
+LLM_TOKENS = registry.counter(
+    'tweetable_llm_tokens_total',
+    'Prompt tokens estimated locally and prompt/completion tokens billed by the API, per stage.',
+    ('stage', 'type')
+)
+LLM_CACHED = registry.counter('tweetable_llm_cache_hits_total', 'LLM responses served from the cache, per stage.', ('stage',))
+LLM_COALESCED = registry.counter(
+    'tweetable_llm_coalesced_total', 'LLM calls that joined an identical call already in flight, per stage.', ('stage',)
+)
+LLM_TRIMMED = registry.counter('tweetable_llm_prompts_trimmed_total', 'Prompts trimmed to fit their budget, per stage.', ('stage',))
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str) -> Any:
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('o200k_base')
+    except Exception as exc:  # pragma: no cover - e.g. no network to fetch the BPE file
+        logger.warning('tiktoken unavailable for %s, using the heuristic estimate: %s', model, exc)
+        return None
+
+
+def _heuristic_tokens(text: str) -> int:
+    tokens = 0
+    for match in _WORD_OR_SYMBOL.finditer(text):
+        word = match.group()
+        # ASCII words average well over four characters per token; other scripts nearer one.
+        tokens += (len(word) + 5) // 6 if word.isascii() else len(word)
+    return tokens
+
+
+def estimate_tokens(text: str, model: Optional[str] = None) -> int:
+    encoding = _encoding(model or get_settings().openai_model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return _heuristic_tokens(text)
+
+
+def estimate_chat_tokens(model: str, system: str, prompt: str) -> int:
+    """Prompt tokens for a system + user chat request, including message framing."""
+    return (
+        estimate_tokens(system, model) + estimate_tokens(prompt, model)
+        + 2 * _TOKENS_PER_MESSAGE + _TOKENS_PER_REPLY
+    )
+
+
+def parse_budgets(spec: str) -> Dict[str, int]:
+    budgets = dict(STAGE_PROMPT_BUDGETS)
+    for item in spec.split(','):
+        if item.strip():
+            stage, _, tokens = item.partition('=')
+            budgets[stage.strip()] = int(tokens)
+    return budgets
+
+
+class TokenLedger:
+    """Estimated and billed token counters per stage.
+
+    Counters per stage: ``calls`` made to the API, ``cached`` responses served
+    without one, ``coalesced`` calls that shared an identical call in flight,
+    ``trimmed`` prompts, ``estimated_prompt_tokens`` for the calls
+    made, and ``prompt_tokens`` / ``completion_tokens`` as reported by the API.
+    """
+
+    def __init__(self) -> None:
+        self._counts: Counter = Counter()
+        self._request: ContextVar[Optional[Counter]] = ContextVar('token_ledger_request', default=None)
+
+    def _add(self, stage: Optional[str], **amounts: int) -> None:
+        label = stage or 'default'
+        request = self._request.get()
+        for name, amount in amounts.items():
+            self._counts[(label, name)] += amount
+            if request is not None:
+                request[(label, name)] += amount
+
+    def record_call(self, stage: Optional[str], estimated: int) -> None:
+        self._add(stage, calls=1, estimated_prompt_tokens=estimated)
+        LLM_TOKENS.inc(stage or 'default', 'estimated_prompt', amount=estimated)
+
+    def record_cached(self, stage: Optional[str]) -> None:
+        self._add(stage, cached=1)
+        LLM_CACHED.inc(stage or 'default')
+
+    def record_coalesced(self, stage: Optional[str]) -> None:
+        self._add(stage, coalesced=1)
+        LLM_COALESCED.inc(stage or 'default')
+
+    def record_trim(self, stage: Optional[str]) -> None:
+        self._add(stage, trimmed=1)
+        LLM_TRIMMED.inc(stage or 'default')
+
+    def record_usage(self, stage: Optional[str], usage: Any) -> None:
+        """Add an API ``usage`` object; responses without one are skipped."""
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+        self._add(stage, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        LLM_TOKENS.inc(stage or 'default', 'prompt', amount=prompt_tokens)
+        LLM_TOKENS.inc(stage or 'default', 'completion', amount=completion_tokens)
+
+    @staticmethod
+    def _nest(counts: Counter) -> Dict[str, Dict[str, int]]:
+        result: Dict[str, Dict[str, int]] = {}
+        for (stage, name), count in counts.items():
+            result.setdefault(stage, {})[name] = count
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Counters per stage, e.g. ``{'ideas': {'calls': 2, 'prompt_tokens': 5120, ...}}``."""
+        return self._nest(self._counts)
+
+    @contextmanager
+    def track(self) -> Iterator[Dict[str, Dict[str, int]]]:
+        """Collect the counters of calls made inside the block (and tasks it starts).
+
+        The yielded dict is filled in when the block exits.
+        """
+        counts: Counter = Counter()
+        report: Dict[str, Dict[str, int]] = {}
+        token = self._request.set(counts)
+        try:
+            yield report
+        finally:
+            self._request.reset(token)
+            report.update(self._nest(counts))
+
+
+def _render_value(value: Any) -> Any:
+    if isinstance(value, PromptList):
+        return value.prompt_json
+    if isinstance(value, list):
+        return dumps_text(value, indent=True)
+    return value
+
+
+def _render(template: str, values: Dict[str, Any]) -> str:
+    return template.format(**{name: _render_value(value) for name, value in values.items()})
+
+
+def _trim_text(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ''
+    tokens = estimate_tokens(text)
+    while text and tokens > max_tokens:
+        # Scale by the text's own characters-per-token, with a little headroom.
+        max_chars = max(1, int(len(text) * max_tokens / tokens * 0.95))
+        text = (split_paragraphs(text, max_chars) or [''])[0]
+        tokens = estimate_tokens(text)
+    return text
+
+
+def _trim_list(items: List[Any], max_tokens: int) -> List[Any]:
+    items = list(items)
+    while len(items) > 1 and estimate_tokens(dumps_text(items, indent=True)) > max_tokens:
+        items.pop()
+    return items
+
+
+class PromptBudgets:
+    def __init__(self, settings: Optional[Settings] = None) -> None:
+        settings = settings or get_settings()
+        self._default = settings.llm_prompt_budget_default
+        self._budgets = parse_budgets(settings.llm_prompt_budgets)
+
+    def budget(self, stage: str) -> int:
+        return self._budgets.get(stage, self._default)
+
+    def render(self, template: str, stage: str, *, trim: Optional[str] = None, **values: Any) -> str:
+        """``template.format(**values)``, with ``values[trim]`` shortened if the prompt is over budget.
+
+        List values, and ``PromptList`` models (from their cached
+        ``prompt_json``), are rendered as indented JSON. Only the ``trim`` input
+        is ever shortened; a prompt whose fixed part alone exceeds the budget is
+        sent with that input emptied as far as it can be.
+        """
+        prompt = _render(template, values)
+        budget = self.budget(stage)
+        if not budget or trim is None:
+            return prompt
+        tokens = estimate_tokens(prompt)
+        if tokens <= budget:
+            return prompt
+
+        value = values[trim]
+        if isinstance(value, PromptList):
+            value = value.prompt_items
+        fixed = estimate_tokens(_render(template, {**values, trim: [] if isinstance(value, list) else ''}))
+        allowance = max(budget - fixed, 0)
+        values[trim] = _trim_list(value, allowance) if isinstance(value, list) else _trim_text(value, allowance)
+        prompt = _render(template, values)
+        token_ledger.record_trim(stage)
+        logger.info('Trimmed %s prompt from ~%d to ~%d tokens (budget %d)', stage, tokens, estimate_tokens(prompt), budget)
+        return prompt
+
+
+token_ledger = TokenLedger()
+prompt_budgets = PromptBudgets()
@@ -0,0 +1,230 @@
+"""Local tone scoring: the six slider dimensions from lexical and stylometric features.
+
+``/tone/analyze`` used to spend a full LLM round trip on six numbers. The
+scorer here reads them off the text instead: lexicon hit rates (profanity,
+positive/negative sentiment, anger, slang, formal connectives, humour,
+reasoning words), shouting (exclamation marks, ALL-CAPS words, repeated
+punctuation), emoji rate and sentence shape (mean length and its variation).
+Each feature is scaled to 0–1 against a saturation point; a fixed linear map
+turns the feature vector into one logit per dimension, squashed onto 0–100.
+
+With NumPy installed, features for a batch of texts are stacked into a matrix
+and scored with one matrix product; without it the same arithmetic runs in
+pure Python. ``benchmarks/tone_calibration.py`` compares the output with model
+scores on a labelled set and can refit ``WEIGHTS`` from it.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Sequence
+
+from ..schemas_tone import ToneAnalysisResponse
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+DIMENSIONS = tuple(ToneAnalysisResponse.model_fields)
+
+_WORD = re.compile(r"[A-Za-z][A-Za-z']*")
+_SENTENCE = re.compile(r'[^.!?\n]+(?:[.!?]+|\n|$)')
+_EMOJI = re.compile('[\U0001F300-\U0001FAFF\u2600-\u27BF\u2B50\u2B55]')
+_REPEATED_PUNCT = re.compile(r'[!?]{2,}|\.{3,}')
+_DIGITS = re.compile(r'\d')
+
+PROFANITY = frozenset({
+    'ass', 'asshole', 'bastard', 'bitch', 'bullshit', 'crap', 'damn', 'dammit', 'dick', 'fuck', 'fucked',
+    'fucker', 'fucking', 'goddamn', 'hell', 'motherfucker', 'piss', 'pissed', 'shit', 'shitty', 'wtf', 'stfu',
+})
+POSITIVE = frozenset({
+    'amazing', 'awesome', 'beautiful', 'best', 'better', 'brilliant', 'celebrate', 'excited', 'exciting',
+    'fantastic', 'glad', 'good', 'grateful', 'great', 'happy', 'hope', 'hopeful', 'improve', 'improved',
+    'incredible', 'joy', 'love', 'loved', 'lucky', 'nice', 'optimistic', 'progress', 'proud', 'thrilled',
+    'win', 'wins', 'won', 'wonderful', 'works', 'yay',
+})
+NEGATIVE = frozenset({
+    'awful', 'bad', 'broke', 'broken', 'cynical', 'dead', 'disappointed', 'doomed', 'fail', 'failed',
+    'failing', 'fails', 'hate', 'hopeless', 'impossible', 'lost', 'meh', 'miserable', 'never', 'nobody',
+    'pointless', 'problem', 'regret', 'sad', 'scam', 'sucks', 'terrible', 'tired', 'ugh', 'useless',
+    'waste', 'worse', 'worst', 'wrong',
+})
+ANGER = frozenset({
+    'angry', 'annoyed', 'annoying', 'enraged', 'furious', 'hate', 'infuriating', 'livid', 'mad', 'outraged',
+    'rage', 'ridiculous', 'screw', 'sick', 'stupid', 'unacceptable', 'idiot', 'idiots', 'insane', 'absurd',
+})
+SLANG = frozenset({
+    'gonna', 'wanna', 'gotta', 'kinda', 'sorta', 'yeah', 'yep', 'nope', 'dude', 'bro', 'tbh', 'imo', 'imho',
+    'ngl', 'idk', 'omg', 'btw', 'lol', 'lmao', 'vibe', 'vibes', 'literally', 'super', 'stuff', 'cool',
+    'ok', 'okay', 'hey', 'y\'all', 'ain\'t', 'lowkey', 'highkey', 'legit', 'fr',
+})
+FORMAL = frozenset({
+    'accordingly', 'additionally', 'consequently', 'furthermore', 'hence', 'however', 'moreover',
+    'nevertheless', 'therefore', 'thus', 'whereas', 'regarding', 'respectively', 'subsequently',
+    'objective', 'stakeholders', 'strategy', 'strategic', 'framework', 'implementation', 'analysis',
+    'significant', 'significantly', 'approximately', 'ensure', 'facilitate', 'leverage',
+})
+HUMOR = frozenset({
+    'lol', 'lmao', 'lmfao', 'rofl', 'haha', 'hahaha', 'hehe', 'joke', 'jokes', 'kidding', 'funny',
+    'hilarious', 'meme', 'memes', 'lolol',
+})
+INSIGHT = frozenset({
+    'because', 'learned', 'lesson', 'lessons', 'insight', 'means', 'reason', 'why', 'data', 'evidence',
+    'pattern', 'principle', 'framework', 'tradeoff', 'tradeoffs', 'result', 'results', 'measure',
+    'measured', 'metric', 'metrics', 'realized', 'understand', 'explains', 'cause', 'therefore',
+})
+FIRST_PERSON = frozenset({'i', "i'm", "i've", "i'd", "i'll", 'me', 'my', 'mine', 'myself'})
+# A positive word within two words after one of these counts as negative ("never gets better").
+NEGATORS = frozenset({'not', 'no', 'never', "don't", "doesn't", "didn't", "isn't", "wasn't", "won't", "can't", 'hardly'})
+
+# Feature name -> value at which it saturates to 1.0. Rates are per word unless noted.
+FEATURES: Dict[str, float] = {
+    'profanity': 0.04,
+    'positive': 0.06,
+    'negative': 0.06,
+    'anger': 0.03,
+    'slang': 0.05,
+    'formal': 0.03,
+    'humor': 0.03,
+    'insight': 0.04,
+    'first_person': 0.08,
+    'caps': 0.08,              # ALL-CAPS words of 2+ letters
+    'exclaim': 1.0,            # '!' per sentence
+    'question': 1.0,           # '?' per sentence
+    'repeated_punct': 0.5,     # '!!', '?!', '...' per sentence
+    'emoji': 0.05,
+    'lower_start': 1.0,        # share of sentences starting lowercase
+    'sentence_len': 30.0,      # mean words per sentence
+    'sentence_cv': 1.0,        # std / mean of words per sentence
+    'word_len': 7.0,           # mean letters per word
+    'digits': 0.05,            # digit characters per word
+}
+FEATURE_NAMES = tuple(FEATURES)
+
+# Dimension -> (bias, {feature: weight}); a positive weight pushes toward the right-hand pole.
+WEIGHTS: Dict[str, tuple[float, Dict[str, float]]] = {
+    'professional_casual': (1.1, {
+        'slang': 2.0, 'emoji': 1.2, 'lower_start': 1.2, 'first_person': 0.8, 'exclaim': 0.6, 'humor': 1.0,
+        'profanity': 0.8, 'formal': -2.5, 'word_len': -1.6, 'sentence_len': -0.8, 'digits': -0.3,
+    }),
+    'polished_chaotic': (-1.3, {
+        'caps': 1.8, 'repeated_punct': 1.6, 'lower_start': 1.4, 'sentence_cv': 1.0, 'emoji': 0.8,
+        'exclaim': 0.8, 'profanity': 0.6, 'slang': 0.6, 'formal': -1.5,
+    }),
+    'calm_enraged': (-1.6, {
+        'anger': 2.4, 'profanity': 1.6, 'caps': 1.6, 'exclaim': 1.0, 'repeated_punct': 1.0,
+        'negative': 0.8, 'positive': -0.6,
+    }),
+    'optimistic_cynical': (0.0, {
+        'negative': 2.2, 'anger': 0.8, 'profanity': 0.4, 'positive': -2.4, 'question': 0.3,
+    }),
+    'insightful_entertaining': (0.6, {
+        'humor': 2.0, 'emoji': 1.0, 'exclaim': 0.6, 'slang': 0.8, 'profanity': 0.5, 'caps': 0.5,
+        'insight': -2.0, 'formal': -0.8, 'word_len': -0.8, 'digits': -0.6, 'sentence_len': -0.4,
+    }),
+    'clean_profane': (-3.5, {
+        'profanity': 5.0, 'anger': 0.4,
+    }),
+}
+
+
+def _rate(counts: Counter, lexicon: frozenset, words: int) -> float:
+    return sum(counts[word] for word in lexicon.intersection(counts)) / words
+
+
+def _sentiment_rates(lowered: List[str], counts: Counter, words: int) -> tuple[float, float]:
+    flipped = sum(
+        1 for index, token in enumerate(lowered)
+        if token in POSITIVE and NEGATORS.intersection(lowered[max(index - 2, 0):index])
+    )
+    positive = sum(counts[word] for word in POSITIVE.intersection(counts)) - flipped
+    negative = sum(counts[word] for word in NEGATIVE.intersection(counts)) + flipped
+    return positive / words, negative / words
+
+
+def _sentence_stats(lengths: List[int]) -> tuple[float, float]:
+    if np is not None:
+        array = np.asarray(lengths, dtype=float)
+        mean = float(array.mean())
+        return mean, float(array.std()) / mean if mean else 0.0
+    mean = sum(lengths) / len(lengths)
+    variance = sum((length - mean) ** 2 for length in lengths) / len(lengths)
+    return mean, math.sqrt(variance) / mean if mean else 0.0
+
+
+def extract_features(text: str) -> List[float]:
+    """Raw (unscaled) feature values for ``text``, in ``FEATURE_NAMES`` order."""
+    tokens = _WORD.findall(text)
+    words = max(len(tokens), 1)
+    lowered = [token.lower() for token in tokens]
+    counts = Counter(lowered)
+    positive, negative = _sentiment_rates(lowered, counts, words)
+    sentences = [sentence.strip() for sentence in _SENTENCE.findall(text) if sentence.strip()] or [text]
+    lengths = [max(len(sentence.split()), 1) for sentence in sentences]
+    sentence_len, sentence_cv = _sentence_stats(lengths)
+    starts = [sentence.lstrip('"\'(*-• ')[:1] for sentence in sentences]
+
+    values = {
+        'profanity': _rate(counts, PROFANITY, words),
+        'positive': positive,
+        'negative': negative,
+        'anger': _rate(counts, ANGER, words),
+        'slang': _rate(counts, SLANG, words),
+        'formal': _rate(counts, FORMAL, words),
+        'humor': _rate(counts, HUMOR, words) + text.count('😂') / words,
+        'insight': _rate(counts, INSIGHT, words),
+        'first_person': _rate(counts, FIRST_PERSON, words),
+        'caps': sum(1 for token in tokens if len(token) > 1 and token.isupper() and token != 'I') / words,
+        'exclaim': text.count('!') / len(sentences),
+        'question': text.count('?') / len(sentences),
+        'repeated_punct': len(_REPEATED_PUNCT.findall(text)) / len(sentences),
+        'emoji': len(_EMOJI.findall(text)) / words,
+        'lower_start': sum(1 for start in starts if start.islower()) / len(sentences),
+        'sentence_len': sentence_len,
+        'sentence_cv': sentence_cv,
+        'word_len': sum(len(token) for token in tokens) / words,
+        'digits': len(_DIGITS.findall(text)) / words,
+    }
+    return [values[name] for name in FEATURE_NAMES]
+
+
+class LocalToneScorer:
+    """Scores tone without a model call, in about a millisecond for a few kilobytes of text."""
+
+    def __init__(self, weights: Dict[str, tuple[float, Dict[str, float]]] = WEIGHTS) -> None:
+        self._saturation = [FEATURES[name] for name in FEATURE_NAMES]
+        self._bias = [weights[dimension][0] for dimension in DIMENSIONS]
+        self._weights = [
+            [weights[dimension][1].get(name, 0.0) for name in FEATURE_NAMES]
+            for dimension in DIMENSIONS
+        ]
+        if np is not None:
+            self._saturation_array = np.asarray(self._saturation)
+            self._bias_array = np.asarray(self._bias)
+            self._weight_matrix = np.asarray(self._weights)
+
+    def _scaled(self, raw: Sequence[float]) -> List[float]:
+        return [min(value / saturation, 1.0) for value, saturation in zip(raw, self._saturation)]
+
+    def score_many(self, texts: Sequence[str]) -> List[ToneAnalysisResponse]:
+        raw = [extract_features(text) for text in texts]
+        if not raw:
+            return []
+        if np is not None:
+            features = np.minimum(np.asarray(raw) / self._saturation_array, 1.0)
+            logits = features @ self._weight_matrix.T + self._bias_array
+            scores = np.rint(100.0 / (1.0 + np.exp(-logits))).astype(int).tolist()
+        else:
+            scores = []
+            for row in raw:
+                scaled = self._scaled(row)
+                logits = [bias + sum(w * x for w, x in zip(weights, scaled)) for bias, weights in zip(self._bias, self._weights)]
+                scores.append([round(100.0 / (1.0 + math.exp(-logit))) for logit in logits])
+        return [ToneAnalysisResponse(**dict(zip(DIMENSIONS, row))) for row in scores]
+
+    def score(self, text: str) -> ToneAnalysisResponse:
+        return self.score_many([text])[0]
+
+
+local_tone_scorer = LocalToneScorer()
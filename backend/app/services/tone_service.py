@@ -1,13 +1,20 @@
 """Tone analysis and tone-aware generation prompts per PRDDelta."""
 
-import json
-from typing import Any, Dict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type, TypeVar
 
 from fastapi import HTTPException, status
-from openai import AsyncOpenAI, OpenAIError
+from openai import OpenAIError
+from pydantic import BaseModel, ValidationError
 
-from ..config import get_settings
 from ..schemas_tone import ToneAnalysisResponse, ToneGenerateRequest, ToneGenerateResponse
+from ..utils.json_stream import IncrementalJSONParser, tweet_slot
+from ..utils.serialization import loads
+from .llm_gateway import LLMGateway, LLMResponseError, llm_gateway
+from .token_budget import PromptBudgets, prompt_budgets
+from .tone_scorer import LocalToneScorer, local_tone_scorer
+from .tweet_validator import normalize_batch, repair_tweets
+
+M = TypeVar('M', bound=BaseModel)
 
 
 VOICE_ANALYSIS_PROMPT = """Analyze the following user text for writing style. For each dimension, return a score from 0–100.
@@ -21,14 +28,14 @@ Dimensions:
 6. Clean ↔ Profane
 
 Return ONLY JSON with numeric values for each dimension:
-{
+{{
   "professional_casual": NUMBER,
   "polished_chaotic": NUMBER,
   "calm_enraged": NUMBER,
   "optimistic_cynical": NUMBER,
   "insightful_entertaining": NUMBER,
   "clean_profane": NUMBER
-}
+}}
 
 User text:
 {user_text}
@@ -76,69 +83,65 @@ Return JSON:
 """
 
 
-def _default_tone_payload() -> Dict[str, int]:
-    # Balanced defaults so the UI can still proceed if analysis fails.
-    return {
-        'professional_casual': 50,
-        'polished_chaotic': 50,
-        'calm_enraged': 50,
-        'optimistic_cynical': 50,
-        'insightful_entertaining': 50,
-        'clean_profane': 50,
-    }
-
-
 class ToneService:
-    def __init__(self) -> None:
-        settings = get_settings()
-        self._client = AsyncOpenAI(api_key=settings.openai_api_key or None)
-        self._model = settings.openai_model
-        self._has_key = bool(settings.openai_api_key)
-
-    async def _call_json(self, prompt: str) -> Dict[str, Any]:
-        if not self._has_key:
+    def __init__(
+        self,
+        gateway: LLMGateway = llm_gateway,
+        budgets: PromptBudgets = prompt_budgets,
+        scorer: LocalToneScorer = local_tone_scorer
+    ) -> None:
+        self._gateway = gateway
+        self._budgets = budgets
+        self._scorer = scorer
+
+    async def _call_json(self, prompt: str, stage: str) -> Dict[str, Any]:
+        if not self._gateway.has_api_key:
             raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='OPENAI_API_KEY is not configured.')
         try:
-            if hasattr(self._client, 'responses'):
-                resp = await self._client.responses.create(
-                    model=self._model,
-                    input=prompt,
-                    response_format={'type': 'json_object'}
-                )
-                payload = getattr(resp, 'output_text', None)
-            else:
-                completion = await self._client.chat.completions.create(
-                    model=self._model,
-                    messages=[
-                        {'role': 'system', 'content': 'Reply with valid JSON only.'},
-                        {'role': 'user', 'content': prompt}
-                    ]
-                )
-                payload = completion.choices[0].message.content if completion.choices else None
+            return await self._gateway.complete_json(prompt, stage=stage)
         except OpenAIError as exc:  # pragma: no cover
             raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f'OpenAI error: {exc}') from exc
+        except LLMResponseError as exc:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(exc)) from exc
 
-        if not payload:
-            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='OpenAI returned empty response')
+    async def _call_model(self, prompt: str, stage: str, model: Type[M]) -> M:
+        """Like ``_call_json`` but validated into ``model`` before the reply can be cached."""
+        if not self._gateway.has_api_key:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='OPENAI_API_KEY is not configured.')
         try:
-            return json.loads(payload)
-        except json.JSONDecodeError as exc:
-            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='OpenAI response was not valid JSON') from exc
+            return await self._gateway.complete_model(prompt, model, stage=stage)
+        except OpenAIError as exc:  # pragma: no cover
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f'OpenAI error: {exc}') from exc
+        except LLMResponseError as exc:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(exc)) from exc
 
-    async def analyze(self, text: str) -> ToneAnalysisResponse:
+    async def try_analyze(self, text: str) -> Optional[ToneAnalysisResponse]:
+        """Tone scores from the model, or ``None`` if its answer was unusable."""
+        prompt = self._budgets.render(VOICE_ANALYSIS_PROMPT, 'tone_analyze', trim='user_text', user_text=text)
         try:
-            data = await self._call_json(VOICE_ANALYSIS_PROMPT.format(user_text=text))
-            return ToneAnalysisResponse.model_validate(data)
-        except HTTPException:
-            # Bubble up meaningful HTTP errors.
+            return await self._call_model(prompt, 'tone_analyze', ToneAnalysisResponse)
+        except ValidationError:
+            return None
+        except HTTPException as exc:
+            # Failed or malformed model answers fall back; anything else (e.g. no API key) surfaces.
+            if isinstance(exc.__cause__, (OpenAIError, LLMResponseError)):
+                return None
             raise
-        except Exception:
-            # Graceful fallback to keep UX moving if analysis fails.
-            return ToneAnalysisResponse.model_validate(_default_tone_payload())
 
-    async def generate(self, payload: ToneGenerateRequest) -> ToneGenerateResponse:
+    async def analyze(self, text: str) -> ToneAnalysisResponse:
+        # Graceful fallback to keep UX moving if analysis fails.
+        return await self.try_analyze(text) or self.score_local(text)
+
+    def score_local(self, text: str) -> ToneAnalysisResponse:
+        """Tone scores from ``LocalToneScorer``: no model call, about a millisecond."""
+        return self._scorer.score(text)
+
+    def _generation_prompt(self, payload: ToneGenerateRequest) -> str:
         tone = payload.tone
-        prompt = GENERATION_PROMPT.format(
+        return self._budgets.render(
+            GENERATION_PROMPT,
+            'tone_generate',
+            trim='user_text',
             user_text=payload.note_text,
             professional_casual=tone.professional_casual,
             polished_chaotic=tone.polished_chaotic,
@@ -147,33 +150,44 @@ class ToneService:
             insightful_entertaining=tone.insightful_entertaining,
             clean_profane=tone.clean_profane
         )
+
+    def _normalize_generation(self, raw: Dict[str, Any]) -> Dict[str, Any]:
+        return normalize_batch(
+            raw.get('short_tweets') or raw.get('shortTweets'),
+            raw.get('long_tweets') or raw.get('longTweets'),
+            raw.get('threads') or raw.get('Threads')
+        )
+
+    async def _repair(self, batch: Dict[str, Any], payload: ToneGenerateRequest) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        sliders = ', '.join(f'{name}={value}' for name, value in payload.tone.model_dump().items())
+        context = f'Tone sliders (0-100): {sliders}\n\nOriginal text:\n{payload.note_text}'
+        return await repair_tweets(batch, self._call_json, stage='tone_generate_repair', context=context, budgets=self._budgets)
+
+    async def generate(self, payload: ToneGenerateRequest) -> ToneGenerateResponse:
+        try:
+            raw = await self._call_json(self._generation_prompt(payload), 'tone_generate')
+            batch, _ = await self._repair(self._normalize_generation(raw), payload)
+            return ToneGenerateResponse.model_validate(batch)
+        except Exception as exc:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f'Generation failed: {exc}') from exc
+
+    async def generate_stream(self, payload: ToneGenerateRequest) -> AsyncIterator[Tuple[str, Any]]:
+        """Yield ``('tweet', slot)`` as each tweet string closes, then ``('done', response)``."""
+        if not self._gateway.has_api_key:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='OPENAI_API_KEY is not configured.')
+
+        parser = IncrementalJSONParser()
         try:
-            raw = await self._call_json(prompt)
-
-            def _pad_list(items: Any, target: int) -> list[str]:
-                arr = list(items) if isinstance(items, list) else []
-                while len(arr) < target:
-                    arr.append('')
-                return arr[:target]
-
-            short_source = raw.get('short_tweets') or raw.get('shortTweets')
-            long_source = raw.get('long_tweets') or raw.get('longTweets')
-            thread_source = raw.get('threads') or raw.get('Threads')
-
-            short = _pad_list(short_source, 4)
-            long = _pad_list(long_source, 4)
-            threads_raw = thread_source if isinstance(thread_source, list) else []
-            threads: list[list[str]] = []
-            for t in threads_raw[:2]:
-                t_arr = list(t) if isinstance(t, list) else []
-                while len(t_arr) < 3:
-                    t_arr.append('')
-                threads.append(t_arr[:5])
-            while len(threads) < 2:
-                threads.append(['', '', ''])
-
-            merged = {'short_tweets': short, 'long_tweets': long, 'threads': threads}
-            return ToneGenerateResponse.model_validate(merged)
+            async for delta in self._gateway.stream(self._generation_prompt(payload), stage='tone_generate'):
+                for path, value in parser.feed(delta):
+                    slot = tweet_slot(path)
+                    if slot is not None:
+                        yield 'tweet', {**slot, 'text': value}
+            batch, repaired = await self._repair(self._normalize_generation(loads(parser.text)), payload)
+            # Slots the repair call replaced are re-sent so the client can overwrite what it streamed.
+            for slot in repaired:
+                yield 'tweet', slot
+            yield 'done', ToneGenerateResponse.model_validate(batch)
         except Exception as exc:
             raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f'Generation failed: {exc}') from exc
 
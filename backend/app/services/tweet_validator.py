@@ -0,0 +1,264 @@
+"""Local checks on generated tweet batches, and repair of just the slots that fail.
+
+The generation prompts promise four short tweets (under 100 characters), four
+long ones (100–280) and two threads of 3–5 posts, but models miss: slots come
+back empty, too long, too short or repeated. ``find_issues`` checks every slot
+locally, counting length the way Twitter does (links count 23, emoji and
+characters outside the Latin/common-punctuation ranges count 2), and flags
+empty, overlong, too-short and duplicate items.
+
+``repair_tweets`` then asks the model for only the failing slots in one small
+follow-up call, with the passing tweets listed so they are not repeated. A
+replacement is kept only if it passes the same checks; otherwise the original
+slot stays. Repair is best effort: if the call fails, the batch is returned as
+it was.
+"""
+
+import logging
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..utils.metrics import registry
+from .token_budget import PromptBudgets, prompt_budgets
+
+logger = logging.getLogger(__name__)
+
+SHORT_COUNT = 4
+LONG_COUNT = 4
+THREAD_COUNT = 2
+SHORT_MAX = 99
+LONG_MIN = 100
+TWEET_MAX = 280
+THREAD_MIN = 3
+THREAD_MAX = 5
+URL_WEIGHT = 23
+EMOJI_WEIGHT = 2
+
+# twitter-text v3: code points in these ranges weigh 1, everything else 2.
+_LIGHT_RANGES = ((0x0000, 0x10FF), (0x2000, 0x200D), (0x2010, 0x201F), (0x2032, 0x2037))
+
+_URL = r'(?:https?://|www\.)[^\s<>"]+|\b[a-z0-9-]+(?:\.[a-z0-9-]+)*\.(?:com|org|net|io|dev|ai|co|app|me)(?:/[^\s<>"]*)?'
+_EMOJI_BASE = '[\U0001F300-\U0001F3FA\U0001F400-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF]'
+_EMOJI_MODIFIERS = '\uFE0F?[\U0001F3FB-\U0001F3FF]?'
+_EMOJI = (
+    f'[\U0001F1E6-\U0001F1FF]{{2}}'
+    f'|{_EMOJI_BASE}{_EMOJI_MODIFIERS}(?:\u200D{_EMOJI_BASE}{_EMOJI_MODIFIERS})*'
+)
+_SPECIAL = re.compile(f'(?P<url>{_URL})|(?P<emoji>{_EMOJI})', re.IGNORECASE)
+_NOT_WORD = re.compile(r'[\W_]+')
+
+TWEET_SLOT_REPAIRS = registry.counter(
+    'tweetable_tweet_slot_repairs_total',
+    'Generated tweet slots that failed local checks, by stage, problem and whether the follow-up call fixed them.',
+    ('stage', 'problem', 'outcome')
+)
+
+REPAIR_PROMPT = """You are fixing a batch of generated tweets. Most of them are fine and stay as they are.
+Rewrite ONLY the slots listed below, in the same voice, so each one meets its limit.
+
+{context}
+
+Tweets that stay (do not repeat or paraphrase them):
+{kept}
+
+Slots to rewrite:
+{slots}
+
+Lengths are counted like Twitter: every link counts as 23 characters, emoji and CJK characters as 2.
+Return JSON with exactly the listed slots:
+{{"slots": {{"<slot>": "<new tweet>"}}}}
+"""
+
+
+def _char_weight(char: str) -> int:
+    code = ord(char)
+    return 1 if any(start <= code <= end for start, end in _LIGHT_RANGES) else 2
+
+
+def weighted_length(text: str) -> int:
+    """Length of ``text`` as Twitter counts it against the 280 limit."""
+    text = unicodedata.normalize('NFC', text)
+    length = 0
+    position = 0
+    for match in _SPECIAL.finditer(text):
+        length += sum(_char_weight(char) for char in text[position:match.start()])
+        length += URL_WEIGHT if match.group('url') else EMOJI_WEIGHT
+        position = match.end()
+    return length + sum(_char_weight(char) for char in text[position:])
+
+
+@dataclass(frozen=True)
+class SlotIssue:
+    kind: str
+    index: int
+    position: Optional[int]
+    problem: str
+    detail: str
+
+    @property
+    def slot(self) -> str:
+        return _label(self.kind, self.index, self.position)
+
+
+def _label(kind: str, index: int, position: Optional[int]) -> str:
+    suffix = f'[{position}]' if position is not None else ''
+    return f'{kind}[{index}]{suffix}'
+
+
+def normalize_batch(short: Any, long: Any, threads: Any) -> Dict[str, Any]:
+    """Coerce raw model output to the fixed batch shape, padding missing slots with ``''`` for ``find_issues`` to flag."""
+    def _pad(items: Any, target: int) -> List[str]:
+        texts = [item if isinstance(item, str) else '' for item in items] if isinstance(items, list) else []
+        return (texts + [''] * target)[:target]
+
+    raw_threads = threads if isinstance(threads, list) else []
+    return {
+        'short_tweets': _pad(short, SHORT_COUNT),
+        'long_tweets': _pad(long, LONG_COUNT),
+        'threads': [
+            _pad(thread, max(THREAD_MIN, min(len(thread) if isinstance(thread, list) else 0, THREAD_MAX)))
+            for thread in (raw_threads + [[]] * THREAD_COUNT)[:THREAD_COUNT]
+        ],
+    }
+
+
+def _slots(result: Dict[str, Any]) -> List[Tuple[str, int, Optional[int], str]]:
+    slots: List[Tuple[str, int, Optional[int], str]] = []
+    for kind in ('short_tweets', 'long_tweets'):
+        slots.extend((kind, index, None, text) for index, text in enumerate(result.get(kind) or []))
+    for index, thread in enumerate(result.get('threads') or []):
+        slots.extend(('threads', index, position, text) for position, text in enumerate(thread or []))
+    return slots
+
+
+def _limit(kind: str) -> Tuple[int, int]:
+    if kind == 'short_tweets':
+        return 1, SHORT_MAX
+    if kind == 'long_tweets':
+        return LONG_MIN, TWEET_MAX
+    return 1, TWEET_MAX
+
+
+def _describe_limit(kind: str) -> str:
+    if kind == 'short_tweets':
+        return f'a short tweet under {SHORT_MAX + 1} characters'
+    if kind == 'long_tweets':
+        return f'a long tweet of {LONG_MIN}-{TWEET_MAX} characters'
+    return f'a thread post under {TWEET_MAX + 1} characters that continues its thread'
+
+
+def find_issues(result: Dict[str, Any]) -> List[SlotIssue]:
+    """Every slot of a normalized batch that is empty, outside its length limit, or a repeat of an earlier slot."""
+    issues: List[SlotIssue] = []
+    seen: Dict[str, str] = {}
+    for kind, index, position, text in _slots(result):
+        text = text if isinstance(text, str) else ''
+        issue = None
+        if not text.strip():
+            issue = ('empty', 'was empty')
+        else:
+            low, high = _limit(kind)
+            length = weighted_length(text)
+            if length > high:
+                issue = ('too_long', f'was {length} characters')
+            elif length < low:
+                issue = ('too_short', f'was {length} characters')
+            else:
+                key = _NOT_WORD.sub(' ', text.lower()).strip()
+                if key and key in seen:
+                    issue = ('duplicate', f'repeated {seen[key]}')
+                else:
+                    seen[key] = _label(kind, index, position)
+        if issue is not None:
+            issues.append(SlotIssue(kind, index, position, *issue))
+    return issues
+
+
+def slot_issues(result: Dict[str, Any], kind: str, index: int) -> List[SlotIssue]:
+    """The issues of one slot (every post of a thread), plus any slot that repeats it."""
+    prefix = f'{kind}[{index}]'
+    return [
+        issue for issue in find_issues(result)
+        if (issue.kind, issue.index) == (kind, index) or issue.detail.startswith(f'repeated {prefix}')
+    ]
+
+
+def _set_slot(result: Dict[str, Any], issue: SlotIssue, text: str) -> None:
+    if issue.position is None:
+        result[issue.kind][issue.index] = text
+    else:
+        result[issue.kind][issue.index][issue.position] = text
+
+
+def _get_slot(result: Dict[str, Any], issue: SlotIssue) -> str:
+    if issue.position is None:
+        return result[issue.kind][issue.index]
+    return result[issue.kind][issue.index][issue.position]
+
+
+async def repair_tweets(
+    result: Dict[str, Any],
+    call: Callable[[str, str], Awaitable[Dict[str, Any]]],
+    *,
+    stage: str,
+    context: str,
+    budgets: PromptBudgets = prompt_budgets
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Re-request the failing slots of ``result`` with one ``call(prompt, stage)``.
+
+    Returns the batch (a copy when anything changed) and the slot events
+    (``{'kind', 'index', 'position'?, 'text'}``) of the slots that were replaced.
+    """
+    issues = find_issues(result)
+    if not issues:
+        return result, []
+
+    failing = {issue.slot for issue in issues}
+    kept = [
+        f'- {_label(kind, index, position)}: {text}'
+        for kind, index, position, text in _slots(result)
+        if _label(kind, index, position) not in failing
+    ]
+    slots = [f'- {issue.slot}: {_describe_limit(issue.kind)} ({issue.detail})' for issue in issues]
+    prompt = budgets.render(
+        REPAIR_PROMPT,
+        stage,
+        trim='context',
+        context=context,
+        kept='\n'.join(kept) or '(none)',
+        slots='\n'.join(slots)
+    )
+    try:
+        data = await call(prompt, stage)
+    except Exception as exc:
+        logger.warning('Tweet repair call failed, keeping %d failing slots: %s', len(issues), exc)
+        for issue in issues:
+            TWEET_SLOT_REPAIRS.inc(stage, issue.problem, 'error')
+        return result, []
+
+    replacements = data.get('slots') if isinstance(data.get('slots'), dict) else {}
+    repaired = {
+        'short_tweets': list(result['short_tweets']),
+        'long_tweets': list(result['long_tweets']),
+        'threads': [list(thread) for thread in result['threads']],
+    }
+    candidates = [issue for issue in issues if isinstance(replacements.get(issue.slot), str)]
+    for issue in candidates:
+        _set_slot(repaired, issue, replacements[issue.slot].strip())
+    # A replacement that still fails (or now clashes with another) is rolled back.
+    still_failing = {issue.slot for issue in find_issues(repaired)}
+    events: List[Dict[str, Any]] = []
+    for issue in issues:
+        fixed = issue in candidates and issue.slot not in still_failing
+        if issue in candidates and not fixed:
+            _set_slot(repaired, issue, _get_slot(result, issue))
+        if fixed:
+            event = {'kind': issue.kind, 'index': issue.index, 'text': _get_slot(repaired, issue)}
+            if issue.position is not None:
+                event['position'] = issue.position
+            events.append(event)
+        TWEET_SLOT_REPAIRS.inc(stage, issue.problem, 'fixed' if fixed else 'kept')
+    logger.info('Repaired %d of %d failing tweet slots (%s)', len(events), len(issues), stage)
+    return repaired, events
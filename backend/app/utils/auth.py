@@ -1,28 +1,167 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Any, Dict
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from supabase import Client
 
-from ..db import get_supabase_client
+from ..config import get_settings
+from ..db import _init_database
+from .cache import TTLCache
+from .tracing import span
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
+_HMAC_ALGORITHMS = {
+    'HS256': hashlib.sha256,
+    'HS384': hashlib.sha384,
+    'HS512': hashlib.sha512,
+}
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    supabase: Client = Depends(get_supabase_client)
-):
-    if credentials is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Missing bearer token')
+# Leeway for clock skew between GoTrue and this worker.
+_CLOCK_SKEW_SECONDS = 30
+
+
+class TokenVerificationError(Exception):
+    """Raised when a bearer token fails local verification."""
+
+
+class UnverifiableTokenError(TokenVerificationError):
+    """Raised when a token cannot be checked locally (no secret or unsupported algorithm)."""
+
+
+def _b64url_decode(segment: str) -> bytes:
+    padding = '=' * (-len(segment) % 4)
+    return base64.urlsafe_b64decode(segment + padding)
+
+
+def verify_access_token(token: str, secret: str, audience: str | None = None) -> Dict[str, Any]:
+    """Verify a Supabase access token's signature, expiry and audience and return its claims."""
+    try:
+        header_segment, payload_segment, signature_segment = token.split('.')
+        header = json.loads(_b64url_decode(header_segment))
+        claims = json.loads(_b64url_decode(payload_segment))
+        signature = _b64url_decode(signature_segment)
+    except (ValueError, TypeError) as error:
+        raise TokenVerificationError('Malformed token') from error
+
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise TokenVerificationError('Malformed token')
+
+    alg = header.get('alg')
+    if not isinstance(alg, str):
+        raise TokenVerificationError('Malformed token')
+    digest = _HMAC_ALGORITHMS.get(alg)
+    if digest is None or not secret:
+        raise UnverifiableTokenError(f'Cannot verify {alg} tokens locally')
+
+    signing_input = f'{header_segment}.{payload_segment}'.encode('ascii')
+    expected = hmac.new(secret.encode('utf-8'), signing_input, digest).digest()
+    if not hmac.compare_digest(expected, signature):
+        raise TokenVerificationError('Invalid signature')
+
+    now = time.time()
+    exp = claims.get('exp')
+    if not isinstance(exp, (int, float)) or exp + _CLOCK_SKEW_SECONDS < now:
+        raise TokenVerificationError('Token expired')
+    nbf = claims.get('nbf')
+    if isinstance(nbf, (int, float)) and nbf - _CLOCK_SKEW_SECONDS > now:
+        raise TokenVerificationError('Token not yet valid')
+
+    if audience:
+        aud = claims.get('aud')
+        audiences = aud if isinstance(aud, list) else [aud]
+        if audience not in audiences:
+            raise TokenVerificationError('Invalid audience')
+
+    if not claims.get('sub'):
+        raise TokenVerificationError('Token has no subject')
+
+    return claims
 
+
+def _unverified_expiry(token: str) -> float | None:
+    """The ``exp`` claim of a token without checking its signature, or ``None`` if it has none."""
+    try:
+        claims = json.loads(_b64url_decode(token.split('.')[1]))
+    except (ValueError, TypeError, IndexError):
+        return None
+    exp = claims.get('exp') if isinstance(claims, dict) else None
+    return exp if isinstance(exp, (int, float)) else None
+
+
+def _user_from_claims(claims: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'id': claims.get('sub'),
+        'email': claims.get('email'),
+        'phone': claims.get('phone'),
+        'role': claims.get('role'),
+        'aud': claims.get('aud'),
+        'app_metadata': claims.get('app_metadata') or {},
+        'user_metadata': claims.get('user_metadata') or {},
+    }
+
+
+_settings = get_settings()
+_verified_tokens: TTLCache[Dict[str, Any]] = TTLCache(
+    maxsize=_settings.auth_token_cache_size,
+    ttl=_settings.auth_token_cache_ttl
+)
+
+
+async def _fetch_remote_user(token: str) -> Dict[str, Any]:
+    database = _init_database()
+    if database is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='Supabase client is not configured. Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY.'
+        )
     try:
-        response = supabase.auth.get_user(credentials.credentials)
+        user = await database.get_auth_user(token)
     except Exception as error:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid access token') from error
 
-    user = getattr(response, 'user', None)
-    if user is None:
+    if not user or not user.get('id'):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='User not found')
+    return user
+
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+    with span('auth'):
+        return await _authenticate(credentials)
+
+
+async def _authenticate(credentials: HTTPAuthorizationCredentials | None) -> Dict[str, Any]:
+    if credentials is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Missing bearer token')
+
+    token = credentials.credentials
+    cached = _verified_tokens.get(token)
+    if cached is not None:
+        return cached
+
+    settings = get_settings()
+    try:
+        claims = verify_access_token(token, settings.supabase_jwt_secret, settings.supabase_jwt_audience)
+    except UnverifiableTokenError as error:
+        if not settings.auth_remote_fallback:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail='Token verification is not configured. Set SUPABASE_JWT_SECRET or AUTH_REMOTE_FALLBACK.'
+            ) from error
+        user = await _fetch_remote_user(token)
+        # GoTrue vouched for the token now; it must not outlive its own expiry in the cache.
+        exp = _unverified_expiry(token)
+        _verified_tokens.set(token, user, ttl=exp - time.time() if exp is not None else None)
+        return user
+    except TokenVerificationError as error:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid access token') from error
 
+    user = _user_from_claims(claims)
+    _verified_tokens.set(token, user, ttl=claims['exp'] - time.time())
     return user
 
 
@@ -0,0 +1,45 @@
+"""Split long notes into prompt-sized chunks on paragraph boundaries."""
+
+import re
+from typing import List
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def _pieces(paragraph: str, max_chars: int) -> List[str]:
+    """Break one oversized paragraph on lines, then sentences, then hard cuts."""
+    if len(paragraph) <= max_chars:
+        return [paragraph]
+    for pattern in (re.compile(r'\n'), _SENTENCE_END):
+        parts = [part for part in pattern.split(paragraph) if part.strip()]
+        if len(parts) > 1:
+            return [piece for part in parts for piece in _pieces(part, max_chars)]
+    return [paragraph[start:start + max_chars] for start in range(0, len(paragraph), max_chars)]
+
+
+def split_paragraphs(text: str, max_chars: int) -> List[str]:
+    """Greedily pack whole paragraphs into chunks of at most ``max_chars`` characters.
+
+    Paragraphs are never split unless one alone exceeds ``max_chars``. Text that
+    already fits is returned as a single chunk, unchanged.
+    """
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        for piece in _pieces(paragraph, max_chars) if paragraph else ():
+            # +2 for the blank line that rejoins paragraphs.
+            if current and size + 2 + len(piece) > max_chars:
+                chunks.append('\n\n'.join(current))
+                current, size = [], 0
+            size += len(piece) + (2 if current else 0)
+            current.append(piece)
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
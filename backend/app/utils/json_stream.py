@@ -0,0 +1,117 @@
+"""Incremental JSON scanning for streamed LLM output.
+
+The parser is fed raw text chunks as they arrive from the model and reports
+every string *value* the moment its closing quote is seen, together with its
+path in the document (e.g. ``('threads', 1, 0)``). Numbers, booleans and
+nulls are skipped; the full text is kept so the caller can still parse and
+validate the complete payload at the end.
+"""
+
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+PathItem = Union[str, int]
+StringEvent = Tuple[Tuple[PathItem, ...], str]
+
+
+class IncrementalJSONParser:
+    def __init__(self) -> None:
+        self._chunks: List[str] = []
+        # One frame per open container: [is_object, key_or_index, expecting_key]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._escaped = False
+        self._buffer: List[str] = []
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._chunks)
+
+    def _path(self) -> Tuple[PathItem, ...]:
+        return tuple(frame[1] for frame in self._stack)
+
+    def feed(self, chunk: str) -> List[StringEvent]:
+        self._chunks.append(chunk)
+        events: List[StringEvent] = []
+        for char in chunk:
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    self._buffer.append(char)
+                elif char == '\\':
+                    self._escaped = True
+                    self._buffer.append(char)
+                elif char == '"':
+                    self._in_string = False
+                    self._close_string(events)
+                else:
+                    self._buffer.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._buffer = []
+            elif char == '{':
+                self._stack.append([True, None, True])
+            elif char == '[':
+                self._stack.append([False, 0, False])
+            elif char in '}]':
+                if self._stack:
+                    self._stack.pop()
+            elif char == ',':
+                if self._stack:
+                    frame = self._stack[-1]
+                    if frame[0]:
+                        frame[2] = True
+                    else:
+                        frame[1] += 1
+            elif char == ':':
+                if self._stack and self._stack[-1][0]:
+                    self._stack[-1][2] = False
+        return events
+
+    def _close_string(self, events: List[StringEvent]) -> None:
+        raw = ''.join(self._buffer)
+        try:
+            value = json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            value = raw
+
+        if self._stack and self._stack[-1][0] and self._stack[-1][2]:
+            self._stack[-1][1] = value
+            return
+        events.append((self._path(), value))
+
+
+_TWEET_KEYS = {
+    'short_tweets': 'short_tweets',
+    'shortTweets': 'short_tweets',
+    'long_tweets': 'long_tweets',
+    'longTweets': 'long_tweets',
+    'threads': 'threads',
+    'Threads': 'threads',
+}
+
+
+def tweet_slot(path: Tuple[PathItem, ...]) -> Optional[Dict[str, Any]]:
+    """Map a string's JSON path to a tweet slot, e.g. ``('threads', 1, 0)`` -> threads[1][0]."""
+    if not path or not isinstance(path[0], str):
+        return None
+    kind = _TWEET_KEYS.get(path[0])
+    if kind is None or not all(isinstance(part, int) for part in path[1:]):
+        return None
+    if kind == 'threads' and len(path) == 3:
+        return {'kind': kind, 'index': path[1], 'position': path[2]}
+    if kind != 'threads' and len(path) == 2:
+        return {'kind': kind, 'index': path[1]}
+    return None
+
+
+def tweet_events(result: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yield slot events for an already complete generation payload."""
+    for kind in ('short_tweets', 'long_tweets'):
+        for index, text in enumerate(result.get(kind) or []):
+            yield {'kind': kind, 'index': index, 'text': text}
+    for index, thread in enumerate(result.get('threads') or []):
+        for position, text in enumerate(thread or []):
+            yield {'kind': 'threads', 'index': index, 'position': position, 'text': text}
@@ -1,10 +1,461 @@
-from fastapi import FastAPI, Request
+"""Per-user token-bucket rate limiting.
+
+Every limited route spends a number of units (``ROUTE_COSTS``, overridable via
+``RATE_LIMIT_COSTS``) from a bucket keyed by the authenticated user id, or by
+client IP when there is none. Bucket size and refill rate come from the user's
+plan (``RATE_LIMIT_PLANS``, e.g. ``free=30/60`` is 30 units refilled over 60
+seconds). Buckets live in one of three interchangeable stores selected by
+``RATE_LIMIT_BACKEND``:
+
+- ``memory``: per-process, for a single worker or local development.
+- ``shared``: a memory-mapped file guarded by ``flock``, shared by every
+  worker on the host.
+- ``redis``: any server speaking the Redis protocol, shared across hosts. The
+  bucket update is one atomic Lua script (``TOKEN_BUCKET_SCRIPT``).
+
+A failing store lets requests through rather than taking the API down.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from fastapi import Depends, FastAPI, HTTPException, Request, Response, status
 from fastapi.responses import JSONResponse
-from slowapi import Limiter
-from slowapi.errors import RateLimitExceeded
-from slowapi.util import get_remote_address
 
-limiter = Limiter(key_func=get_remote_address)
+from ..config import Settings, get_settings
+from ..db import _init_database
+from .auth import get_current_user, get_user_id
+from .cache import TTLCache
+from .metrics import registry
+
+try:  # pragma: no cover - not available on Windows
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ROUTE_COSTS: Dict[str, int] = {
+    'generate': 1,
+    'tone_analyze': 1,
+    'tone_generate': 2,
+    'playground': 1,
+    'pipeline_stage': 2,
+    'pipeline_slot': 1,
+    'pipeline_run': 5,
+    # Charged once per note in the batch.
+    'pipeline_batch': 5,
+}
+
+ANONYMOUS_PLAN = 'anonymous'
+PLAN_CACHE_TTL = 60
+
+RATE_LIMIT_REJECTIONS = registry.counter(
+    'tweetable_rate_limit_rejections_total', 'Requests refused with 429, by limited route and plan.', ('route', 'plan')
+)
+
+
+@dataclass(frozen=True)
+class BucketPolicy:
+    capacity: float
+    refill_per_second: float
+
+
+@dataclass(frozen=True)
+class BucketResult:
+    allowed: bool
+    remaining: float
+    retry_after: float
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, limit: str, retry_after: float) -> None:
+        super().__init__(limit)
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+def parse_plans(spec: str) -> Dict[str, BucketPolicy]:
+    """``'free=30/60,pro=120/60'`` -> ``{'free': BucketPolicy(30, 0.5), ...}``."""
+    plans: Dict[str, BucketPolicy] = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition('=')
+        units, _, seconds = rate.partition('/')
+        capacity = float(units)
+        plans[name.strip()] = BucketPolicy(capacity=capacity, refill_per_second=capacity / float(seconds or 1))
+    return plans
+
+
+def parse_costs(spec: str) -> Dict[str, int]:
+    costs = dict(ROUTE_COSTS)
+    for item in spec.split(','):
+        if item.strip():
+            route, _, cost = item.partition('=')
+            costs[route.strip()] = int(cost)
+    return costs
+
+
+def _refill(tokens: float, updated_at: float, now: float, policy: BucketPolicy) -> float:
+    return min(policy.capacity, tokens + max(0.0, now - updated_at) * policy.refill_per_second)
+
+
+def _spend(tokens: float, cost: float, policy: BucketPolicy) -> Tuple[float, BucketResult]:
+    if tokens >= cost:
+        return tokens - cost, BucketResult(True, tokens - cost, 0.0)
+    return tokens, BucketResult(False, tokens, (cost - tokens) / policy.refill_per_second)
+
+
+class MemoryBucketStore:
+    """Buckets in a per-process LRU; idle buckets expire once they would be full again."""
+
+    def __init__(self, maxsize: int = 65536) -> None:
+        self._buckets: TTLCache[Tuple[float, float]] = TTLCache(maxsize=maxsize, ttl=86400)
+
+    async def take(self, key: str, cost: float, policy: BucketPolicy) -> BucketResult:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key) or (policy.capacity, now)
+        tokens, result = _spend(_refill(tokens, updated_at, now, policy), cost, policy)
+        self._buckets.set(key, (tokens, now), ttl=policy.capacity / policy.refill_per_second)
+        return result
+
+    async def aclose(self) -> None:
+        self._buckets.clear()
+
+
+class SharedMemoryBucketStore:
+    """Buckets in a memory-mapped file so every worker process on the host shares them.
+
+    The file is a fixed open-addressing table of ``slots`` records of
+    ``(key hash, tokens, updated_at)``. Each update holds an exclusive
+    ``flock`` on the file for the few microseconds it takes. When every probed
+    slot is taken, the least recently updated one is recycled, which can only
+    hand an idle key a fresh bucket early.
+    """
+
+    _RECORD = struct.Struct('<Qdd')
+    _PROBES = 8
+
+    def __init__(self, path: str, slots: int = 16384) -> None:
+        if fcntl is None:
+            raise RuntimeError('The shared rate-limit backend needs fcntl (POSIX only).')
+        self._slots = max(self._PROBES, slots)
+        size = self._slots * self._RECORD.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != size:
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # Zero marks an empty slot.
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little') or 1
+
+    def _take(self, key: str, cost: float, policy: BucketPolicy) -> BucketResult:
+        key_hash = self._hash(key)
+        record = self._RECORD
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            # Read the clock under the lock so timestamps never move backwards.
+            now = time.time()
+            chosen: Optional[int] = None
+            oldest: Tuple[float, int] = (math.inf, 0)
+            for probe in range(self._PROBES):
+                offset = ((key_hash + probe) % self._slots) * record.size
+                slot_hash, tokens, updated_at = record.unpack_from(self._map, offset)
+                if slot_hash == key_hash:
+                    chosen = offset
+                    break
+                if slot_hash == 0 or now - updated_at >= policy.capacity / policy.refill_per_second:
+                    # Empty, or idle long enough that its bucket would be full anyway.
+                    chosen, tokens, updated_at = offset, policy.capacity, now
+                    break
+                oldest = min(oldest, (updated_at, offset))
+            else:
+                chosen, tokens, updated_at = oldest[1], policy.capacity, now
+
+            tokens, result = _spend(_refill(tokens, updated_at, now, policy), cost, policy)
+            record.pack_into(self._map, chosen, key_hash, tokens, now)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return result
+
+    async def take(self, key: str, cost: float, policy: BucketPolicy) -> BucketResult:
+        # Lock plus a few struct reads: cheaper inline than a thread hop.
+        return self._take(key, cost, policy)
+
+    async def aclose(self) -> None:
+        if not self._map.closed:
+            self._map.close()
+            os.close(self._fd)
+
+
+# KEYS[1] = bucket key; ARGV = capacity, refill per second, cost.
+# Replies {allowed, remaining, retry_after} with the floats as strings
+# (Lua numbers are truncated to integers in replies).
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
+
+
+class RedisError(Exception):
+    pass
+
+
+class _RedisConnection:
+    """One RESP2 connection; enough protocol for the rate limiter, nothing more."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._reader = reader
+        self._writer = writer
+
+    @classmethod
+    async def open(cls, url: str, timeout: float) -> '_RedisConnection':
+        parsed = urlparse(url)
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parsed.hostname or 'localhost', parsed.port or 6379), timeout
+        )
+        connection = cls(reader, writer)
+        if parsed.password:
+            auth = [unquote(parsed.username), unquote(parsed.password)] if parsed.username else [unquote(parsed.password)]
+            await connection.execute('AUTH', *auth)
+        database = (parsed.path or '/').lstrip('/')
+        if database and database != '0':
+            await connection.execute('SELECT', database)
+        return connection
+
+    @staticmethod
+    def _encode(args: Tuple[Any, ...]) -> bytes:
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(parts)
+
+    async def _read(self) -> Any:
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError('Redis connection closed')
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode('utf-8')
+        if kind == b'-':
+            raise RedisError(body.decode('utf-8'))
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode('utf-8')
+        if kind == b'*':
+            length = int(body)
+            if length < 0:
+                return None
+            return [await self._read() for _ in range(length)]
+        raise RedisError(f'Unexpected reply: {line!r}')
+
+    async def execute(self, *args: Any) -> Any:
+        self._writer.write(self._encode(args))
+        await self._writer.drain()
+        return await self._read()
+
+    async def close(self) -> None:
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except (ConnectionError, OSError):  # pragma: no cover - already gone
+            pass
+
+
+class RedisBucketStore:
+    """Buckets in Redis (or anything that speaks its protocol), updated by one EVALSHA per request."""
+
+    def __init__(self, url: str, pool_size: int = 8, timeout: float = 1.0, prefix: str = 'ratelimit:') -> None:
+        self._url = url
+        self._timeout = timeout
+        self._prefix = prefix
+        self._idle: List[_RedisConnection] = []
+        self._slots = asyncio.Semaphore(pool_size)
+        self._sha = hashlib.sha1(TOKEN_BUCKET_SCRIPT.encode('utf-8')).hexdigest()
+
+    async def _evaluate(self, connection: _RedisConnection, key: str, args: Tuple[Any, ...]) -> Any:
+        try:
+            return await connection.execute('EVALSHA', self._sha, 1, key, *args)
+        except RedisError as error:
+            if not str(error).startswith('NOSCRIPT'):
+                raise
+            return await connection.execute('EVAL', TOKEN_BUCKET_SCRIPT, 1, key, *args)
+
+    async def take(self, key: str, cost: float, policy: BucketPolicy) -> BucketResult:
+        args = (repr(policy.capacity), repr(policy.refill_per_second), repr(float(cost)))
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else await _RedisConnection.open(self._url, self._timeout)
+            try:
+                allowed, remaining, retry_after = await asyncio.wait_for(
+                    self._evaluate(connection, self._prefix + key, args), self._timeout
+                )
+            except BaseException:
+                # The reply stream may be out of sync now; never reuse this connection.
+                await connection.close()
+                raise
+            self._idle.append(connection)
+        return BucketResult(bool(allowed), float(remaining), float(retry_after))
+
+    async def aclose(self) -> None:
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(connection.close() for connection in idle))
+
+
+def create_store(settings: Settings):
+    backend = settings.rate_limit_backend.lower()
+    if backend == 'memory':
+        return MemoryBucketStore()
+    if backend == 'shared':
+        return SharedMemoryBucketStore(settings.rate_limit_shm_path, settings.rate_limit_shm_slots)
+    if backend == 'redis':
+        return RedisBucketStore(settings.rate_limit_redis_url)
+    raise ValueError(f'Unknown RATE_LIMIT_BACKEND: {settings.rate_limit_backend}')
+
+
+class RateLimiter:
+    def __init__(self, settings: Optional[Settings] = None, store=None) -> None:
+        settings = settings or get_settings()
+        self.enabled = settings.rate_limit_enabled
+        self.plans = parse_plans(settings.rate_limit_plans)
+        self.costs = parse_costs(settings.rate_limit_costs)
+        self._settings = settings
+        self._store = store
+        self._plans_by_user: TTLCache[str] = TTLCache(maxsize=16384, ttl=PLAN_CACHE_TTL)
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = create_store(self._settings)
+        return self._store
+
+    def _policy(self, plan: str) -> BucketPolicy:
+        return self.plans.get(plan) or self.plans.get('free') or next(iter(self.plans.values()))
+
+    async def _plan(self, user_id: str) -> str:
+        plan = self._plans_by_user.get(user_id)
+        if plan is not None:
+            return plan
+        database = _init_database()
+        if database is None:
+            return 'free'
+        try:
+            plan = await database.users.get_plan(user_id)
+        except Exception as exc:  # pragma: no cover - fall back to the default bucket for a while
+            logger.warning('Failed to load plan for rate limiting %s: %s', user_id, exc)
+            plan = 'free'
+        self._plans_by_user.set(user_id, plan)
+        return plan
+
+    def forget_plan(self, user_id: str) -> None:
+        self._plans_by_user.pop(user_id)
+
+    async def _bucket(self, request: Request, user: Any) -> Tuple[str, str]:
+        """The caller's bucket key and plan."""
+        user_id = get_user_id(user)
+        if user_id:
+            return f'user:{user_id}', await self._plan(user_id)
+        return f"ip:{request.client.host if request.client else 'unknown'}", ANONYMOUS_PLAN
+
+    async def units_allowed(self, request: Request, user: Any, route: str) -> Optional[Tuple[str, int]]:
+        """The caller's plan and how many ``units`` of ``route`` its whole bucket holds; ``None`` if unlimited."""
+        if not self.enabled:
+            return None
+        _, plan = await self._bucket(request, user)
+        cost = self.costs.get(route, 1)
+        if cost <= 0:
+            return None
+        return plan, int(self._policy(plan).capacity // cost)
+
+    async def hit(self, request: Request, user: Any, route: str, units: int = 1) -> Optional[BucketResult]:
+        """Charge ``route``'s cost times ``units``; raises ``RateLimitExceeded`` when the bucket is empty.
+
+        A charge larger than the plan's whole bucket is refused with 413.
+        """
+        if not self.enabled:
+            return None
+
+        key, plan = await self._bucket(request, user)
+        policy = self._policy(plan)
+        cost = self.costs.get(route, 1) * units
+        if cost > policy.capacity:
+            # Waiting would never help: the whole bucket is smaller than this one request.
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f'This request costs {cost} rate-limit units; the {plan} plan allows at most {policy.capacity:g} at once'
+            )
+
+        try:
+            result = await self.store.take(key, cost, policy)
+        except Exception as exc:
+            logger.warning('Rate limit store failed, allowing request: %s', exc)
+            return None
+
+        if not result.allowed:
+            RATE_LIMIT_REJECTIONS.inc(route, plan)
+            raise RateLimitExceeded(
+                f'{policy.capacity:g} units per {policy.capacity / policy.refill_per_second:g} seconds',
+                result.retry_after
+            )
+        return result
+
+    async def aclose(self) -> None:
+        if self._store is not None:
+            await self._store.aclose()
+            self._store = None
+
+
+limiter = RateLimiter()
+
+
+def rate_limit(route: str):
+    """Route dependency charging ``ROUTE_COSTS[route]`` units to the caller's bucket."""
+
+    async def dependency(request: Request, response: Response, user=Depends(get_current_user)) -> None:
+        result = await limiter.hit(request, user, route)
+        if result is not None:
+            response.headers['X-RateLimit-Remaining'] = str(int(result.remaining))
+
+    return dependency
 
 
 def register_limiter(app: FastAPI) -> None:
@@ -14,5 +465,6 @@ def register_limiter(app: FastAPI) -> None:
     async def rate_limit_handler(_: Request, exc: RateLimitExceeded) -> JSONResponse:
         return JSONResponse(
             status_code=429,
-            content={'detail': 'Rate limit exceeded', 'limit': exc.detail}
+            content={'detail': 'Rate limit exceeded', 'limit': exc.limit},
+            headers={'Retry-After': str(max(1, math.ceil(exc.retry_after)))}
         )
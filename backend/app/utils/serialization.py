@@ -0,0 +1,65 @@
+"""orjson-backed JSON for responses, LLM payloads and prompt fragments.
+
+``dumps``/``loads`` replace the stdlib ``json`` calls on hot paths; pydantic
+models inside a value are serialized through the ``default`` hook.
+``ModelResponse`` writes a model straight from ``model_dump_json``, skipping
+FastAPI's dump, re-validate and serialize of ``response_model``.
+``PromptList`` gives list-wrapping stage models a ``prompt_json`` that is
+serialized once and shared by every prompt that embeds it.
+"""
+
+from functools import cached_property
+from typing import Any, ClassVar, List
+
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+JSONDecodeError = orjson.JSONDecodeError
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode='json')
+    raise TypeError(f'Type is not JSON serializable: {type(value).__name__}')
+
+
+def dumps(value: Any, *, indent: bool = False) -> bytes:
+    """Compact UTF-8 JSON; ``indent`` matches ``json.dumps(..., indent=2)`` apart from unescaped non-ASCII."""
+    return orjson.dumps(value, default=_default, option=orjson.OPT_INDENT_2 if indent else 0)
+
+
+def dumps_text(value: Any, *, indent: bool = False) -> str:
+    return dumps(value, indent=indent).decode('utf-8')
+
+
+loads = orjson.loads
+
+
+class ModelResponse(ORJSONResponse):
+    """JSON response whose pydantic ``content`` is serialized once, by pydantic itself.
+
+    Returning a ``Response`` bypasses ``response_model`` processing, so keep
+    ``response_model`` on the route for the OpenAPI schema and return the
+    model already validated.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.model_dump_json().encode('utf-8')
+        return dumps(content)
+
+
+class PromptList:
+    """Mixin for models wrapping one list field that prompts embed as indented JSON."""
+
+    prompt_field: ClassVar[str]
+
+    @property
+    def prompt_items(self) -> List[Any]:
+        return list(getattr(self, self.prompt_field))
+
+    @cached_property
+    def prompt_json(self) -> str:
+        return dumps_text(getattr(self, self.prompt_field), indent=True)
+
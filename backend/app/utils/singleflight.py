@@ -0,0 +1,61 @@
+"""Coalescing of identical concurrent calls onto one shared execution."""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Tuple, TypeVar
+
+V = TypeVar('V')
+
+
+class _Flight(Generic[V]):
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: 'asyncio.Task[V]') -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[V]):
+    """Run at most one ``factory()`` per key at a time; concurrent callers with that key share its result.
+
+    Each caller awaits the shared task through ``asyncio.shield``, so a caller
+    that is cancelled (e.g. its client disconnected) leaves the work running
+    for the others. Once the last waiter has gone, the shared task is
+    cancelled as well. Like ``TTLCache``, it is meant to be used from the
+    event loop thread and does no locking of its own.
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[Hashable, _Flight[V]] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def _forget(self, key: Hashable, flight: _Flight[V]) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[V]]) -> Tuple[V, bool]:
+        """Return ``factory()``'s result and whether this caller started it (``False`` when it joined one in flight)."""
+        flight = self._flights.get(key)
+        leader = flight is None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+
+            def _done(task: 'asyncio.Task[V]', flight: _Flight[V] = flight) -> None:
+                self._forget(key, flight)
+                if not task.cancelled():
+                    # Every waiter may have left just as it failed; do not log it as unretrieved.
+                    task.exception()
+
+            flight.task.add_done_callback(_done)
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task), leader
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody is left to use the result; later callers start afresh.
+                self._forget(key, flight)
+                flight.task.cancel()
@@ -0,0 +1,27 @@
+"""Helpers for Server-Sent Events responses."""
+
+from typing import Any, AsyncIterator
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from .serialization import dumps_text
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    # Stop nginx-style proxies from buffering the stream.
+    'X-Accel-Buffering': 'no',
+}
+
+
+def format_event(event: str, data: Any) -> str:
+    if isinstance(data, BaseModel):
+        body = data.model_dump_json()
+    else:
+        body = dumps_text(data)
+    return f'event: {event}\ndata: {body}\n\n'
+
+
+def event_stream_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(events, media_type='text/event-stream', headers=SSE_HEADERS)
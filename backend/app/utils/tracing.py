@@ -0,0 +1,284 @@
+"""Per-request spans, ``Server-Timing`` headers, JSON logs and an opt-in sampling profiler.
+
+``TracingMiddleware`` opens a ``Trace`` for every HTTP request and keeps it in
+a context variable, so ``span(name)`` blocks anywhere below it (auth, LLM
+calls, Supabase requests, stage persistence, including tasks the request
+starts) record into that request. Outside a request ``span`` costs one
+context-variable read.
+
+When the response starts, the spans finished so far are summed per name into a
+``Server-Timing`` header next to an ``X-Trace-Id``. When the response ends, a
+trace line with every span is logged as JSON if the request took at least
+``TRACE_LOG_MIN_MS``.
+
+A request is profiled when it carries ``X-Profile-Token: <PROFILE_ADMIN_TOKEN>``
+or is picked at ``PROFILE_SAMPLE_RATE``. A background thread samples the event
+loop thread's Python stack every ``PROFILE_INTERVAL_MS`` while the request is in
+flight. The loop is shared, so the samples cover whatever that worker ran in
+the meantime, other requests included. The report (top functions plus
+collapsed stacks for flame graphs) goes into the trace log and is kept for
+``GET /debug/profiles/{trace_id}``.
+"""
+
+import hmac
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..config import Settings, get_settings
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'x-profile-token'
+_TOKEN_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]')
+
+# Recent profile reports by trace id, for ``GET /debug/profiles/{trace_id}``.
+profile_reports: TTLCache[Dict[str, Any]] = TTLCache(maxsize=64, ttl=3600)
+
+
+def is_profile_admin(token: Optional[str]) -> bool:
+    admin_token = get_settings().profile_admin_token
+    return bool(admin_token and token and hmac.compare_digest(token, admin_token))
+
+
+@dataclass
+class Span:
+    name: str
+    start: float
+    duration: float
+    attrs: Dict[str, Any]
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    started: float = field(default_factory=time.perf_counter)
+    spans: List[Span] = field(default_factory=list)
+    samples: Optional[Counter] = None
+
+    def server_timing(self) -> str:
+        totals: Dict[str, List[float]] = {}
+        for item in self.spans:
+            entry = totals.setdefault(item.name, [0.0, 0])
+            entry[0] += item.duration
+            entry[1] += 1
+        parts = [
+            f'{_TOKEN_UNSAFE.sub("_", name)};dur={duration * 1000:.1f}' + (f';desc="{count}x"' if count > 1 else '')
+            for name, (duration, count) in totals.items()
+        ]
+        parts.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.1f}')
+        return ', '.join(parts)
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar('trace', default=None)
+
+
+def add_span(name: str, started: float, **attrs: Any) -> None:
+    """Record a span that began at ``started`` (``time.perf_counter()``) and ends now."""
+    trace = _current.get()
+    if trace is not None:
+        trace.spans.append(Span(name, started, time.perf_counter() - started, attrs))
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[None]:
+    """Time the block as ``name`` in the current request's trace, if there is one."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.spans.append(Span(name, started, time.perf_counter() - started, attrs))
+
+
+def _frame_label(frame: Any) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}:{code.co_name}'
+
+
+class SamplingProfiler:
+    """One daemon thread that samples a target thread's stack for every subscribed ``Counter``."""
+
+    def __init__(self, interval: float) -> None:
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._subscribers: List[Counter] = []
+        self._thread: Optional[threading.Thread] = None
+        self._target = threading.get_ident()
+
+    def subscribe(self) -> Counter:
+        samples: Counter = Counter()
+        with self._lock:
+            self._target = threading.get_ident()
+            self._subscribers.append(samples)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='tweetable-profiler', daemon=True)
+                self._thread.start()
+        return samples
+
+    def unsubscribe(self, samples: Counter) -> None:
+        with self._lock:
+            self._subscribers = [item for item in self._subscribers if item is not samples]
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self._interval)
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+                frame = sys._current_frames().get(self._target)
+                if frame is None:
+                    continue
+                stack: List[str] = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                for samples in self._subscribers:
+                    samples[key] += 1
+
+
+def profile_report(samples: Counter, interval: float, top: int = 25) -> Dict[str, Any]:
+    """Self and cumulative sample counts per function, plus collapsed stacks."""
+    own: Counter = Counter()
+    cumulative: Counter = Counter()
+    for stack, count in samples.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for name in set(frames):
+            cumulative[name] += count
+    total = sum(samples.values())
+    return {
+        'samples': total,
+        'interval_ms': interval * 1000,
+        'self': [{'function': name, 'samples': count} for name, count in own.most_common(top)],
+        'cumulative': [{'function': name, 'samples': count} for name, count in cumulative.most_common(top)],
+        'collapsed': [f'{stack} {count}' for stack, count in samples.most_common(top * 4)],
+    }
+
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line; carries the current ``trace_id`` and a trace log's payload."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        trace = _current.get()
+        if trace is not None:
+            entry['trace_id'] = trace.trace_id
+        payload = getattr(record, 'trace', None)
+        if payload is not None:
+            entry.update(payload)
+        else:
+            entry['message'] = record.getMessage()
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(settings: Optional[Settings] = None) -> None:
+    settings = settings or get_settings()
+    if settings.log_format != 'json':
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonLogFormatter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(logging.INFO)
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware that owns the request's ``Trace``."""
+
+    def __init__(self, app: Any, settings: Optional[Settings] = None) -> None:
+        settings = settings or get_settings()
+        self.app = app
+        self.enabled = settings.tracing_enabled
+        self._log_min = settings.trace_log_min_ms / 1000
+        self._sample_rate = settings.profile_sample_rate
+        self._interval = max(settings.profile_interval_ms, 1) / 1000
+        self._profiler: Optional[SamplingProfiler] = None
+
+    def _wants_profile(self, scope: Dict[str, Any]) -> bool:
+        for name, value in scope['headers']:
+            if name == PROFILE_HEADER.encode('latin-1'):
+                return is_profile_admin(value.decode('latin-1'))
+        return self._sample_rate > 0 and random.random() < self._sample_rate
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope['type'] != 'http' or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(uuid.uuid4().hex)
+        if self._wants_profile(scope):
+            if self._profiler is None:
+                self._profiler = SamplingProfiler(self._interval)
+            trace.samples = self._profiler.subscribe()
+        status_code = 500
+
+        async def send_with_timing(message: Dict[str, Any]) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+                headers: List[Tuple[bytes, bytes]] = list(message.get('headers', []))
+                headers.append((b'server-timing', trace.server_timing().encode('latin-1')))
+                headers.append((b'x-trace-id', trace.trace_id.encode('latin-1')))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        token = _current.set(trace)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._finish(trace, scope, status_code)
+
+    def _finish(self, trace: Trace, scope: Dict[str, Any], status_code: int) -> None:
+        duration = time.perf_counter() - trace.started
+        report = None
+        if trace.samples is not None:
+            self._profiler.unsubscribe(trace.samples)
+            report = profile_report(trace.samples, self._interval)
+            profile_reports.set(trace.trace_id, report)
+        if duration < self._log_min and report is None:
+            return
+
+        payload: Dict[str, Any] = {
+            'trace_id': trace.trace_id,
+            'method': scope['method'],
+            'path': scope['path'],
+            'status': status_code,
+            'duration_ms': round(duration * 1000, 1),
+            'spans': [
+                {
+                    'name': item.name,
+                    'start_ms': round((item.start - trace.started) * 1000, 1),
+                    'duration_ms': round(item.duration * 1000, 1),
+                    **item.attrs
+                }
+                for item in trace.spans
+            ],
+        }
+        if report is not None:
+            payload['profile'] = report
+        logger.info('trace %s', json.dumps(payload), extra={'trace': payload})
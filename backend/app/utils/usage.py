@@ -1,53 +1,176 @@
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Tuple
+from typing import Dict, Optional, Tuple
 
-from supabase import Client
+from ..config import get_settings
+from ..db import Database
+
+logger = logging.getLogger(__name__)
+
+USAGE_FIELDS = ('uploads', 'generations')
+FREE_UPLOAD_LIMIT = 3
+FREE_GENERATION_LIMIT = 25
 
 
 def current_month_key() -> str:
     return datetime.utcnow().strftime('%Y-%m')
 
 
-def get_plan_and_usage(supabase: Client, user_id: str) -> Tuple[str, int, int]:
+class UsageBuffer:
+    """Write-behind buffer for monthly usage counters.
+
+    Increments land in memory per (user_id, month, field) and are flushed as
+    aggregated deltas through one ``increment_usage_bulk`` RPC, either every
+    ``flush_interval`` seconds, as soon as ``max_pending`` rows are waiting, or
+    on shutdown. Quota checks add the pending deltas so enforcement never lags
+    behind the buffer.
+    """
+
+    def __init__(self, flush_interval: float, max_pending: int) -> None:
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._pending: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: dict.fromkeys(USAGE_FIELDS, 0))
+        self._in_flight: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._db: Optional[Database] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._closing = False
+
+    def add(self, db: Database, user_id: str, field: str, amount: int = 1) -> None:
+        if field not in USAGE_FIELDS:
+            raise ValueError(f'Unknown usage field: {field}')
+        self._pending[(user_id, current_month_key())][field] += amount
+        self._db = db
+        self._ensure_flusher()
+        if len(self._pending) >= self._max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    def pending(self, user_id: str, month: str) -> Tuple[int, int]:
+        uploads = generations = 0
+        # Deltas being flushed right now are not in the table yet either.
+        for source in (self._pending, self._in_flight):
+            deltas = source.get((user_id, month))
+            if deltas:
+                uploads += deltas['uploads']
+                generations += deltas['generations']
+        return uploads, generations
+
+    def _ensure_flusher(self) -> None:
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name='usage-flusher')
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._pending or self._db is None:
+            return
+
+        batch, self._pending = self._pending, defaultdict(lambda: dict.fromkeys(USAGE_FIELDS, 0))
+        rows = [
+            {'user_id': user_id, 'month': month, **deltas}
+            for (user_id, month), deltas in batch.items()
+            if any(deltas.values())
+        ]
+        if not rows:
+            return
+        self._in_flight = batch
+        try:
+            await self._db.usage.increment_many(rows)
+        except Exception as exc:  # pragma: no cover - keep deltas for the next attempt
+            logger.warning('Failed to flush %d usage rows: %s', len(rows), exc)
+            for key, deltas in batch.items():
+                for field, amount in deltas.items():
+                    self._pending[key][field] += amount
+        finally:
+            self._in_flight = {}
+
+    async def close(self) -> None:
+        if self._task is not None:
+            # Stop the loop instead of cancelling it: a cancelled RPC would lose the deltas in ``_in_flight``.
+            self._closing = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+_settings = get_settings()
+usage_buffer = UsageBuffer(
+    flush_interval=_settings.usage_flush_interval_seconds,
+    max_pending=_settings.usage_flush_max_pending
+)
+
+
+async def get_plan_and_usage(db: Database, user_id: str) -> Tuple[str, int, int]:
     month = current_month_key()
-    plan_resp = (
-        supabase.table('users').select('plan').eq('id', user_id).limit(1).execute()
+    plan, (uploads, generations) = await asyncio.gather(
+        db.users.get_plan(user_id),
+        db.usage.get_counts(user_id, month)
     )
-    plan = 'free'
-    rows = plan_resp.data or []
-    if rows:
-        plan = rows[0].get('plan') or 'free'
+    pending_uploads, pending_generations = usage_buffer.pending(user_id, month)
+    return plan, uploads + pending_uploads, generations + pending_generations
 
-    usage_resp = (
-        supabase.table('usage').select('uploads,generations').eq('user_id', user_id).eq('month', month).limit(1).execute()
-    )
-    uploads = generations = 0
-    rows = usage_resp.data or []
-    if rows:
-        uploads = rows[0].get('uploads') or 0
-        generations = rows[0].get('generations') or 0
 
-    return plan, uploads, generations
+def increment_upload(db: Database, user_id: str) -> None:
+    usage_buffer.add(db, user_id, 'uploads')
 
 
-def increment_upload(supabase: Client, user_id: str) -> None:
-    month = current_month_key()
-    supabase.table('usage').upsert({
-        'user_id': user_id,
-        'month': month,
-        'uploads': 1,
-        'generations': 0,
-    }, on_conflict='user_id,month', ignore_duplicates=False).execute()
-    supabase.rpc('increment_usage', {'p_user_id': user_id, 'p_month': month, 'p_field': 'uploads'}).execute()
+def increment_generation(db: Database, user_id: str) -> None:
+    usage_buffer.add(db, user_id, 'generations')
+
 
+@dataclass
+class GenerationReservation:
+    user_id: str
+    month: str
+    note_text: Optional[str]
+    plan: str
+    uploads: int
+    generations: int
+    reserved: bool
 
-def increment_generation(supabase: Client, user_id: str) -> None:
+
+async def reserve_generation(
+    db: Database, user_id: str, note_id: Optional[str], require_note: bool
+) -> GenerationReservation:
+    """Load the note, plan and usage and atomically claim a generation slot in one round trip.
+
+    ``reserved`` is False when the free plan is exhausted or when
+    ``require_note`` is set and the note could not be found; no slot is taken
+    in either case.
+    """
     month = current_month_key()
-    supabase.table('usage').upsert({
-        'user_id': user_id,
-        'month': month,
-        'uploads': 0,
-        'generations': 1,
-    }, on_conflict='user_id,month', ignore_duplicates=False).execute()
-    supabase.rpc('increment_usage', {'p_user_id': user_id, 'p_month': month, 'p_field': 'generations'}).execute()
+    _pending_uploads, pending_generations = usage_buffer.pending(user_id, month)
+    row = await db.usage.reserve_generation(
+        user_id, month, note_id, FREE_GENERATION_LIMIT, pending_generations, require_note
+    )
+    return GenerationReservation(
+        user_id=user_id,
+        month=month,
+        note_text=row.get('note_content'),
+        plan=row.get('plan') or 'free',
+        uploads=row.get('uploads') or 0,
+        generations=row.get('generations') or 0,
+        reserved=bool(row.get('reserved'))
+    )
+
 
+async def refund_generation(db: Database, reservation: GenerationReservation) -> None:
+    if not reservation.reserved:
+        return
+    try:
+        await db.usage.refund_generation(reservation.user_id, reservation.month)
+    except Exception as exc:  # pragma: no cover - refund failures must not mask the original error
+        logger.warning('Failed to refund generation for %s: %s', reservation.user_id, exc)
@@ -0,0 +1 @@
+"""Offline benchmarks for the Tweetable backend (run with ``python -m benchmarks.<name>``)."""
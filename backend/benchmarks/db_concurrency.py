@@ -0,0 +1,96 @@
+"""Show that Supabase queries no longer stall the event loop.
+
+Runs N concurrent ``drafts`` queries against a fake PostgREST endpoint that
+takes ``--latency`` seconds per request, once through the legacy synchronous
+postgrest client (what supabase-py's ``.execute()`` does) and once through the
+pooled async ``Database`` layer, while a ticker measures event-loop lag.
+
+    python -m benchmarks.db_concurrency --requests 50 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+from postgrest import SyncPostgrestClient
+
+from app.config import Settings
+from app.db import Database
+
+ROWS = [{'id': '1', 'content': 'hello', 'persona': 'builder', 'metadata': None, 'created_at': None}]
+
+
+def _sync_transport(latency: float) -> httpx.MockTransport:
+    def handler(_: httpx.Request) -> httpx.Response:
+        time.sleep(latency)
+        return httpx.Response(200, json=ROWS)
+    return httpx.MockTransport(handler)
+
+
+def _async_transport(latency: float) -> httpx.MockTransport:
+    async def handler(_: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json=ROWS)
+    return httpx.MockTransport(handler)
+
+
+async def _measure(run_queries, tick: float = 0.005) -> dict:
+    lags: list[float] = []
+    done = asyncio.Event()
+
+    async def ticker() -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(tick)
+            lags.append(time.perf_counter() - start - tick)
+
+    ticker_task = asyncio.create_task(ticker())
+    started = time.perf_counter()
+    await run_queries()
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ticker_task
+
+    lags = lags or [0.0]
+    return {
+        'wall_seconds': round(elapsed, 4),
+        'loop_lag_max_ms': round(max(lags) * 1000, 2),
+        'loop_lag_mean_ms': round(statistics.fmean(lags) * 1000, 2),
+    }
+
+
+async def main(requests: int, latency: float) -> dict:
+    sync_client = SyncPostgrestClient('http://fake.local/rest/v1')
+    sync_client.session = httpx.Client(base_url='http://fake.local/rest/v1', transport=_sync_transport(latency))
+
+    async def blocking_queries() -> None:
+        async def one() -> None:
+            sync_client.from_('drafts').select('*').eq('user_id', 'u').execute()
+        await asyncio.gather(*(one() for _ in range(requests)))
+
+    settings = Settings(supabase_url='http://fake.local', supabase_service_key='service-key')
+    database = Database(settings, transport=_async_transport(latency))
+
+    async def async_queries() -> None:
+        await asyncio.gather(*(database.drafts.list_page('u', limit=50) for _ in range(requests)))
+
+    results = {
+        'requests': requests,
+        'latency_seconds': latency,
+        'sync_supabase': await _measure(blocking_queries),
+        'async_repository': await _measure(async_queries),
+    }
+    sync_client.session.close()
+    await database.aclose()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args.requests, args.latency)), indent=2))
@@ -0,0 +1,135 @@
+"""OpenAI-compatible stand-in for load tests, with configurable latency, jitter and failures.
+
+Serves ``POST /v1/chat/completions`` (plain and streamed, including the
+``include_usage`` chunk). Every reply is the same JSON object carrying the keys
+of every prompt in the backend (voice profile, ideas, angles, tweets,
+single tweet slots, shitpost, tone scores, playground text), so each stage
+validates whatever it asked for. Point the backend at it with ``OPENAI_BASE_URL``.
+
+    python -m benchmarks.fake_openai --port 8101 --latency 0.4 --jitter 0.2 --error-rate 0.01
+    OPENAI_BASE_URL=http://127.0.0.1:8101/v1 OPENAI_API_KEY=fake uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+TONE = {
+    'professional_casual': 62,
+    'polished_chaotic': 48,
+    'calm_enraged': 35,
+    'optimistic_cynical': 55,
+    'insightful_entertaining': 58,
+    'clean_profane': 20,
+}
+
+REPLY: Dict[str, Any] = {
+    'voice_profile': 'Dry, direct builder voice with a habit of self-deprecating asides.',
+    'stylistic_quirks': ['short declarative openers', 'parenthetical jokes', 'numbers over adjectives'],
+    'persona': 'Tired but hopeful indie hacker',
+    'tone_scores': TONE,
+    **TONE,
+    'ideas': [
+        {
+            'title': f'Idea {index}',
+            'summary': f'Summary of idea {index} in one sentence.',
+            'virality': 3,
+            'relatability': 4,
+            'emotional_punch': 2,
+        }
+        for index in range(1, 6)
+    ],
+    'angles': [{'idea_title': f'Idea {index}', 'angle': f'A sharper take on idea {index}.'} for index in range(1, 6)],
+    'short_tweets': [f'Short tweet {index}.' for index in range(1, 5)],
+    'long_tweets': [
+        f'Long tweet {index} that goes on for a while to look like the real thing, long enough to clear the 100 character floor.'
+        for index in range(1, 5)
+    ],
+    'threads': [[f'Thread {thread} post {post}' for post in range(1, 4)] for thread in range(1, 3)],
+    'tweet': 'A fresh short tweet.',
+    'thread': ['Fresh thread post 1', 'Fresh thread post 2', 'Fresh thread post 3'],
+    'shitpost': 'shipping on a friday because the vibes said so',
+    'text': 'playground tweet',
+}
+REPLY_TEXT = json.dumps(REPLY)
+
+
+def create_app(latency: float = 0.3, jitter: float = 0.1, error_rate: float = 0.0, stream_chunks: int = 16) -> FastAPI:
+    app = FastAPI(title='fake-openai')
+    app.state.calls = 0
+
+    def _completion(body: Dict[str, Any], prompt_tokens: int) -> Dict[str, Any]:
+        return {
+            'id': f'chatcmpl-fake-{app.state.calls}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'fake'),
+            'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': REPLY_TEXT}}],
+            'usage': _usage(prompt_tokens),
+        }
+
+    def _usage(prompt_tokens: int) -> Dict[str, int]:
+        completion_tokens = len(REPLY_TEXT) // 4
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+        }
+
+    async def _chunks(body: Dict[str, Any], prompt_tokens: int, delay: float) -> AsyncIterator[bytes]:
+        base = {
+            'id': f'chatcmpl-fake-{app.state.calls}',
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': body.get('model', 'fake'),
+        }
+        size = -(-len(REPLY_TEXT) // stream_chunks)
+        for start in range(0, len(REPLY_TEXT), size):
+            await asyncio.sleep(delay)
+            chunk = {**base, 'choices': [{'index': 0, 'delta': {'content': REPLY_TEXT[start:start + size]}, 'finish_reason': None}]}
+            yield f'data: {json.dumps(chunk)}\n\n'.encode('utf-8')
+        if (body.get('stream_options') or {}).get('include_usage'):
+            yield f"data: {json.dumps({**base, 'choices': [], 'usage': _usage(prompt_tokens)})}\n\n".encode('utf-8')
+        yield b'data: [DONE]\n\n'
+
+    @app.post('/v1/chat/completions')
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.calls += 1
+        delay = latency + random.uniform(0, jitter)
+        if random.random() < error_rate:
+            await asyncio.sleep(delay / 2)
+            return JSONResponse(
+                status_code=503,
+                content={'error': {'message': 'fake upstream failure', 'type': 'server_error', 'code': None}}
+            )
+
+        prompt_tokens = sum(len(str(message.get('content', ''))) for message in body.get('messages', [])) // 4
+        if body.get('stream'):
+            # Spread the latency over the chunks, like a model emitting tokens.
+            return StreamingResponse(
+                _chunks(body, prompt_tokens, delay / stream_chunks), media_type='text/event-stream'
+            )
+        await asyncio.sleep(delay)
+        return _completion(body, prompt_tokens)
+
+    return app
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8101)
+    parser.add_argument('--latency', type=float, default=0.3, help='Base seconds per completion.')
+    parser.add_argument('--jitter', type=float, default=0.1, help='Extra uniform random seconds per completion.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of calls answered with a 503.')
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.jitter, args.error_rate), host=args.host, port=args.port, log_level='warning')
@@ -0,0 +1,162 @@
+"""In-process stand-in for a Redis server, for exercising the ``redis`` rate-limit backend.
+
+Speaks enough RESP2 for ``RedisBucketStore``: PING, AUTH, SELECT, TIME,
+HMGET/HSET/PEXPIRE/DEL on hashes, and EVAL/EVALSHA/SCRIPT LOAD for the one
+script it knows, ``TOKEN_BUCKET_SCRIPT``, which it runs natively in Python
+with the same semantics. Commands run one at a time on the event loop, so a
+script is atomic here just as it is in Redis.
+
+    python -m benchmarks.fake_redis --port 6390
+    RATE_LIMIT_BACKEND=redis RATE_LIMIT_REDIS_URL=redis://127.0.0.1:6390/0 uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import hashlib
+import math
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.limiter import TOKEN_BUCKET_SCRIPT
+
+TOKEN_BUCKET_SHA = hashlib.sha1(TOKEN_BUCKET_SCRIPT.encode('utf-8')).hexdigest()
+
+
+class _Error(Exception):
+    pass
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self._hashes: Dict[str, Dict[str, str]] = {}
+        self._expires: Dict[str, float] = {}
+        self._scripts = {TOKEN_BUCKET_SHA: TOKEN_BUCKET_SCRIPT}
+        self._loaded: set[str] = set()
+        self.commands = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> Tuple[str, int]:
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _hash(self, key: str) -> Dict[str, str]:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self._hashes.pop(key, None)
+            self._expires.pop(key, None)
+        return self._hashes.setdefault(key, {})
+
+    def _token_bucket(self, key: str, capacity: float, rate: float, cost: float) -> List[Any]:
+        now = time.time()
+        bucket = self._hash(key)
+        tokens = float(bucket.get('tokens', capacity))
+        ts = float(bucket.get('ts', now))
+        tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+        allowed, retry_after = 0, 0.0
+        if tokens >= cost:
+            tokens -= cost
+            allowed = 1
+        else:
+            retry_after = (cost - tokens) / rate
+        bucket.update(tokens=repr(tokens), ts=repr(now))
+        self._expires[key] = now + math.ceil(capacity / rate * 1000) / 1000
+        return [allowed, repr(tokens), repr(retry_after)]
+
+    def _eval(self, script: str, args: List[str]) -> Any:
+        if script != TOKEN_BUCKET_SCRIPT:
+            raise _Error('ERR fake redis only runs the rate limiter script')
+        numkeys = int(args[0])
+        keys, argv = args[1:1 + numkeys], args[1 + numkeys:]
+        return self._token_bucket(keys[0], float(argv[0]), float(argv[1]), float(argv[2]))
+
+    def execute(self, args: List[str]) -> Any:
+        self.commands += 1
+        command = args[0].upper()
+        if command == 'PING':
+            return 'PONG'
+        if command in ('AUTH', 'SELECT'):
+            return 'OK'
+        if command == 'TIME':
+            now = time.time()
+            return [str(int(now)), str(int((now % 1) * 1_000_000))]
+        if command == 'HMGET':
+            bucket = self._hash(args[1])
+            return [bucket.get(field) for field in args[2:]]
+        if command == 'HSET':
+            bucket = self._hash(args[1])
+            pairs = args[2:]
+            bucket.update(zip(pairs[::2], pairs[1::2]))
+            return len(pairs) // 2
+        if command == 'PEXPIRE':
+            self._expires[args[1]] = time.time() + int(args[2]) / 1000
+            return 1
+        if command == 'DEL':
+            return sum(self._hashes.pop(key, None) is not None for key in args[1:])
+        if command == 'SCRIPT' and args[1].upper() == 'LOAD':
+            sha = hashlib.sha1(args[2].encode('utf-8')).hexdigest()
+            self._loaded.add(sha)
+            return sha
+        if command == 'EVAL':
+            self._loaded.add(hashlib.sha1(args[1].encode('utf-8')).hexdigest())
+            return self._eval(args[1], args[2:])
+        if command == 'EVALSHA':
+            # Like a fresh Redis, the first EVALSHA misses until the script was seen once.
+            if args[1] not in self._loaded:
+                raise _Error('NOSCRIPT No matching script. Please use EVAL.')
+            return self._eval(self._scripts[args[1]], args[2:])
+        raise _Error(f"ERR unknown command '{args[0]}'")
+
+    @staticmethod
+    def _encode(value: Any) -> bytes:
+        if value is None:
+            return b'$-1\r\n'
+        if isinstance(value, int):
+            return b':%d\r\n' % value
+        if isinstance(value, list):
+            return b'*%d\r\n' % len(value) + b''.join(FakeRedis._encode(item) for item in value)
+        data = str(value).encode('utf-8')
+        return b'$%d\r\n%s\r\n' % (len(data), data)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    break
+                args = []
+                for _ in range(int(header[1:-2])):
+                    length = int((await reader.readline())[1:-2])
+                    args.append((await reader.readexactly(length + 2))[:-2].decode('utf-8'))
+                try:
+                    reply = self._encode(self.execute(args))
+                except _Error as error:
+                    reply = b'-%s\r\n' % str(error).encode('utf-8')
+                writer.write(reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _main(host: str, port: int) -> None:
+    server = FakeRedis()
+    bound_host, bound_port = await server.start(host, port)
+    print(f'fake redis listening on redis://{bound_host}:{bound_port}/0', flush=True)
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_main(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,170 @@
+"""In-memory PostgREST and GoTrue stand-in for load tests.
+
+Implements the slice of PostgREST the repositories use: ``select``, ``eq.``
+filters, ``order`` and ``limit`` on reads; inserts and ``on_conflict`` upserts
+(merge or ignore duplicates); ``eq.``-filtered updates and deletes; and the
+``generation_preflight``, ``increment_usage_bulk`` and ``refund_generation``
+RPCs. Keyset ``or=`` filters are ignored, so every read is a first page.
+``GET /auth/v1/user`` answers with the bearer token's ``sub`` without
+verifying it. Each request waits ``latency`` seconds first.
+
+    python -m benchmarks.fake_supabase --port 8102 --latency 0.005
+    SUPABASE_URL=http://127.0.0.1:8102 SUPABASE_SERVICE_ROLE_KEY=fake uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Query parameters that are not column filters.
+_RESERVED = {'select', 'order', 'limit', 'offset', 'on_conflict', 'or', 'columns'}
+
+
+def _matches(row: Dict[str, Any], filters: Dict[str, str]) -> bool:
+    for column, condition in filters.items():
+        operator, _, value = condition.partition('.')
+        if operator == 'eq' and str(row.get(column)) != value:
+            return False
+    return True
+
+
+def _project(row: Dict[str, Any], select: Optional[str]) -> Dict[str, Any]:
+    if not select or select == '*':
+        return dict(row)
+    return {column: row.get(column) for column in select.split(',')}
+
+
+class FakeSupabase:
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.requests = 0
+
+    def _filters(self, request: Request) -> Dict[str, str]:
+        return {key: value for key, value in request.query_params.items() if key not in _RESERVED}
+
+    def select(self, table: str, request: Request) -> List[Dict[str, Any]]:
+        params = request.query_params
+        rows = [row for row in self.tables.get(table, []) if _matches(row, self._filters(request))]
+        for item in reversed((params.get('order') or '').split(',')):
+            if item:
+                column, _, direction = item.partition('.')
+                rows.sort(key=lambda row: str(row.get(column) or ''), reverse=direction.startswith('desc'))
+        if params.get('limit'):
+            rows = rows[:int(params['limit'])]
+        return [_project(row, params.get('select')) for row in rows]
+
+    def write(self, table: str, request: Request, body: Any) -> List[Dict[str, Any]]:
+        records = body if isinstance(body, list) else [body]
+        conflict = [column for column in (request.query_params.get('on_conflict') or '').split(',') if column]
+        ignore = 'ignore-duplicates' in request.headers.get('prefer', '')
+        rows = self.tables.setdefault(table, [])
+        written = []
+        for record in records:
+            existing = next(
+                (row for row in rows if conflict and all(row.get(column) == record.get(column) for column in conflict)),
+                None
+            )
+            if existing is not None:
+                if not ignore:
+                    existing.update(record)
+                    written.append(existing)
+                continue
+            row = {'id': str(uuid.uuid4()), 'created_at': datetime.now(timezone.utc).isoformat(), **record}
+            rows.append(row)
+            written.append(row)
+        return [dict(row) for row in written]
+
+    def update(self, table: str, request: Request, body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        rows = [row for row in self.tables.get(table, []) if _matches(row, self._filters(request))]
+        for row in rows:
+            row.update(body)
+        return [dict(row) for row in rows]
+
+    def delete(self, table: str, request: Request) -> List[Dict[str, Any]]:
+        filters = self._filters(request)
+        rows = self.tables.get(table, [])
+        removed = [row for row in rows if _matches(row, filters)]
+        self.tables[table] = [row for row in rows if not _matches(row, filters)]
+        return removed
+
+    def rpc(self, function: str, params: Dict[str, Any]) -> Any:
+        if function == 'generation_preflight':
+            user = next((row for row in self.tables.get('users', []) if row.get('id') == params.get('p_user_id')), {})
+            note = next((row for row in self.tables.get('notes', []) if row.get('id') == params.get('p_note_id')), {})
+            found = bool(note) or not params.get('p_require_note')
+            return [{
+                'note_content': note.get('content'),
+                'plan': user.get('plan', 'free'),
+                'uploads': 0,
+                'generations': 0,
+                'reserved': found,
+            }]
+        return None
+
+
+def _token_subject(authorization: str) -> Optional[str]:
+    try:
+        payload = authorization.split(' ', 1)[1].split('.')[1]
+        return json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4))).get('sub')
+    except (IndexError, ValueError):
+        return None
+
+
+def create_app(latency: float = 0.0) -> FastAPI:
+    app = FastAPI(title='fake-supabase')
+    store = app.state.store = FakeSupabase(latency)
+
+    @app.middleware('http')
+    async def delay(request: Request, call_next):
+        store.requests += 1
+        if store.latency:
+            await asyncio.sleep(store.latency)
+        return await call_next(request)
+
+    @app.get('/auth/v1/user')
+    async def auth_user(request: Request):
+        subject = _token_subject(request.headers.get('authorization', ''))
+        if not subject:
+            return JSONResponse(status_code=401, content={'msg': 'invalid token'})
+        return {'id': subject, 'aud': 'authenticated', 'role': 'authenticated'}
+
+    @app.post('/rest/v1/rpc/{function}')
+    async def rpc(function: str, request: Request):
+        return store.rpc(function, await request.json())
+
+    @app.get('/rest/v1/{table}')
+    async def select(table: str, request: Request):
+        return store.select(table, request)
+
+    @app.post('/rest/v1/{table}', status_code=201)
+    async def insert(table: str, request: Request):
+        return store.write(table, request, await request.json())
+
+    @app.patch('/rest/v1/{table}')
+    async def update(table: str, request: Request):
+        return store.update(table, request, await request.json())
+
+    @app.delete('/rest/v1/{table}')
+    async def delete(table: str, request: Request):
+        return store.delete(table, request)
+
+    return app
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8102)
+    parser.add_argument('--latency', type=float, default=0.005, help='Seconds added to every request.')
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency), host=args.host, port=args.port, log_level='warning')
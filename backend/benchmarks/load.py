@@ -0,0 +1,365 @@
+"""Offline load test: throughput, tail latency and event-loop lag of the whole app.
+
+Boots ``app.main:app`` under uvicorn in its own process, wired through
+``OPENAI_BASE_URL`` and ``SUPABASE_URL`` to ``benchmarks.fake_openai`` and
+``benchmarks.fake_supabase`` (each in its own process too), then drives every
+scenario for ``--seconds`` at ``--concurrency`` in-flight requests. Each
+request uses a fresh note so the LLM cache and note-analysis reuse stay out of
+the numbers. Rate limiting is switched off for the run.
+
+Per scenario the report has requests per second, p50/p95/p99/max latency,
+non-2xx responses by status, and the app's event-loop lag (how late a 10 ms
+ticker inside the app process fired). It is written as JSON together with the
+git commit and the run's settings; ``--compare`` prints the change against an
+earlier report.
+
+    python -m benchmarks.load --concurrency 32 --seconds 10 --openai-latency 0.3
+    python -m benchmarks.load --scenarios drafts,upload --compare benchmarks/results/abc1234.json
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+JWT_SECRET = 'benchmark-secret'
+USERS = [f'00000000-0000-4000-8000-{index:012d}' for index in range(8)]
+TONE = {
+    'professional_casual': 50,
+    'polished_chaotic': 50,
+    'calm_enraged': 50,
+    'optimistic_cynical': 50,
+    'insightful_entertaining': 50,
+    'clean_profane': 50,
+}
+NOTE = (
+    'Shipped the onboarding rewrite today. Three weeks of work, and the thing users noticed first was the new button colour.\n\n'
+    'Lesson re-learned: nobody sees the plumbing. They see the paint, the speed, and whether it broke.\n\n'
+    'Next up: cutting the signup form from nine fields to three, and finding out which six we never needed.'
+)
+# Everything /pipeline/tweets/{kind}/{index} needs, so the scenario does not touch the stage tables.
+SLOT_BODY = {
+    'voice_profile': {
+        'voice_profile': 'Dry, direct builder voice.',
+        'stylistic_quirks': ['short declarative openers'],
+        'persona': 'Indie hacker',
+        'tone_scores': TONE,
+    },
+    'angles': {'angles': [{'idea_title': 'Invisible work', 'angle': 'Nobody sees the plumbing, so say it out loud.'}]},
+    'tweets': {
+        'short_tweets': [f'Nobody sees the plumbing, take {index}.' for index in range(4)],
+        'long_tweets': [f'Long take {index}: ' + 'three weeks of refactoring and they noticed the button colour. ' * 2 for index in range(4)],
+        'threads': [[f'Thread {thread} post {post}: the signup form had nine fields.' for post in range(3)] for thread in range(2)],
+    },
+}
+RESULTS_DIR = Path(__file__).parent / 'results'
+LAG_TICK = 0.01
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _token(user_id: str) -> str:
+    header = _b64(json.dumps({'alg': 'HS256', 'typ': 'JWT'}).encode())
+    claims = _b64(json.dumps({'sub': user_id, 'aud': 'authenticated', 'exp': int(time.time()) + 86400}).encode())
+    signature = hmac.new(JWT_SECRET.encode(), f'{header}.{claims}'.encode(), hashlib.sha256).digest()
+    return f'{header}.{claims}.{_b64(signature)}'
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _serve_fake(module: str, port: int, options: Dict[str, float]) -> None:
+    import uvicorn
+
+    if module == 'openai':
+        from .fake_openai import create_app
+    else:
+        from .fake_supabase import create_app
+    uvicorn.run(create_app(**options), host='127.0.0.1', port=port, log_level='warning')
+
+
+def _serve_app(port: int, env: Dict[str, str], control) -> None:
+    # Settings are read at import time, so the environment must be in place first.
+    os.environ.update(env)
+    import uvicorn
+
+    from app.main import app
+
+    async def main() -> None:
+        server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+        lags: List[float] = []
+
+        async def ticker() -> None:
+            expected = time.perf_counter() + LAG_TICK
+            while True:
+                await asyncio.sleep(LAG_TICK)
+                now = time.perf_counter()
+                lags.append(max(0.0, now - expected))
+                expected = now + LAG_TICK
+
+        async def commands() -> None:
+            while True:
+                command = await asyncio.to_thread(control.recv)
+                if command == 'reset':
+                    lags.clear()
+                elif command == 'report':
+                    control.send(list(lags))
+                else:
+                    server.should_exit = True
+                    return
+
+        tasks = [asyncio.create_task(ticker()), asyncio.create_task(commands())]
+        await server.serve()
+        for task in tasks:
+            task.cancel()
+
+    asyncio.run(main())
+
+
+def _note(counter: List[int]) -> str:
+    counter[0] += 1
+    return f'{NOTE}\n\nRun {counter[0]} at {time.time_ns()}.'
+
+
+def _tone(counter: List[int]) -> Dict[str, int]:
+    # A different slider position per request keeps concurrent prompts distinct, so none are coalesced.
+    counter[0] += 1
+    return {**TONE, 'clean_profane': counter[0] % 101}
+
+
+Scenario = Callable[[httpx.AsyncClient, Dict[str, str], List[int]], Any]
+
+SCENARIOS: Dict[str, Scenario] = {
+    'generate': lambda client, headers, counter: client.post(
+        '/generate', headers=headers, json={'prompt': _note(counter), 'persona': 'builder'}
+    ),
+    'pipeline_run': lambda client, headers, counter: client.post(
+        '/pipeline/run', headers=headers, json={'note_text': _note(counter)}
+    ),
+    'tone_analyze': lambda client, headers, counter: client.post(
+        '/tone/analyze', headers=headers, json={'note_text': _note(counter)}
+    ),
+    'tone_generate': lambda client, headers, counter: client.post(
+        '/tone/generate', headers=headers, json={'note_text': _note(counter), 'tone': TONE}
+    ),
+    'tweet_slot': lambda client, headers, counter: client.post(
+        f'/pipeline/tweets/short_tweets/{counter[0] % 4}', headers=headers, json={**SLOT_BODY, 'tone_overrides': _tone(counter)}
+    ),
+    'drafts': lambda client, headers, counter: client.get('/drafts', headers=headers, params={'limit': 20}),
+    'upload': lambda client, headers, counter: client.post(
+        '/upload', headers=headers, json={'note_text': _note(counter), 'file_name': 'bench.txt'}
+    ),
+}
+
+
+def _percentile(ordered: List[float], share: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))] if ordered else 0.0
+
+
+def _summary_ms(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        'p50_ms': round(_percentile(ordered, 0.50) * 1000, 2),
+        'p95_ms': round(_percentile(ordered, 0.95) * 1000, 2),
+        'p99_ms': round(_percentile(ordered, 0.99) * 1000, 2),
+        'max_ms': round(ordered[-1] * 1000, 2) if ordered else 0.0,
+    }
+
+
+async def _drive(base_url: str, scenario: Scenario, concurrency: int, seconds: float) -> Dict[str, Any]:
+    tokens = [{'Authorization': f'Bearer {_token(user)}'} for user in USERS]
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    counter = [0]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120.0) as client:
+        deadline = time.perf_counter() + seconds
+
+        async def worker(index: int) -> None:
+            headers = tokens[index % len(tokens)]
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    response = await scenario(client, headers, counter)
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as error:
+                    statuses[type(error).__name__] += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(index) for index in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ok = sum(count for status, count in statuses.items() if isinstance(status, int) and status < 300)
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1),
+        'ok': ok,
+        'errors': {str(status): count for status, count in statuses.items() if status not in range(200, 300)},
+        'latency': _summary_ms(latencies),
+    }
+
+
+async def _seed(supabase_url: str) -> None:
+    headers = {'apikey': 'benchmark', 'Authorization': 'Bearer benchmark', 'Prefer': 'return=representation'}
+    async with httpx.AsyncClient(base_url=f'{supabase_url}/rest/v1', headers=headers) as client:
+        await client.post('/users', json=[{'id': user, 'plan': 'pro'} for user in USERS])
+        await client.post('/drafts', json=[
+            {'user_id': user, 'content': f'Draft {index}', 'persona': 'builder', 'metadata': None}
+            for user in USERS for index in range(50)
+        ])
+
+
+async def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f'{url} did not come up within {timeout:g}s')
+            await asyncio.sleep(0.1)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    context = multiprocessing.get_context('spawn')
+    openai_port, supabase_port, app_port = _free_port(), _free_port(), _free_port()
+    supabase_url = f'http://127.0.0.1:{supabase_port}'
+    app_url = f'http://127.0.0.1:{app_port}'
+    workdir = tempfile.mkdtemp(prefix='tweetable-load-')
+    env = {
+        'OPENAI_API_KEY': 'benchmark',
+        'OPENAI_BASE_URL': f'http://127.0.0.1:{openai_port}/v1',
+        'OPENAI_MAX_CONCURRENCY': str(args.openai_concurrency),
+        'SUPABASE_URL': supabase_url,
+        'SUPABASE_SERVICE_ROLE_KEY': 'benchmark',
+        'SUPABASE_JWT_SECRET': JWT_SECRET,
+        'RATE_LIMIT_ENABLED': 'false',
+        'PIPELINE_BATCH_PATH': os.path.join(workdir, 'batch.sqlite3'),
+        'LLM_CACHE_PATH': '',
+        'TRACE_LOG_MIN_MS': '600000',
+    }
+
+    parent, child = context.Pipe()
+    processes = [
+        context.Process(target=_serve_fake, args=('openai', openai_port, {
+            'latency': args.openai_latency, 'jitter': args.openai_jitter, 'error_rate': args.openai_error_rate
+        }), daemon=True),
+        context.Process(target=_serve_fake, args=('supabase', supabase_port, {'latency': args.db_latency}), daemon=True),
+        context.Process(target=_serve_app, args=(app_port, env, child), daemon=True),
+    ]
+    for process in processes:
+        process.start()
+
+    report: Dict[str, Any] = {
+        'commit': _git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'settings': {
+            key: getattr(args, key)
+            for key in ('concurrency', 'seconds', 'openai_latency', 'openai_jitter', 'openai_error_rate',
+                        'openai_concurrency', 'db_latency')
+        },
+        'scenarios': {},
+    }
+    try:
+        asyncio.run(_wait_ready(f'http://127.0.0.1:{openai_port}/docs'))
+        asyncio.run(_wait_ready(f'{supabase_url}/docs'))
+        asyncio.run(_wait_ready(f'{app_url}/health'))
+        asyncio.run(_seed(supabase_url))
+
+        for name in args.scenarios.split(','):
+            parent.send('reset')
+            result = asyncio.run(_drive(app_url, SCENARIOS[name], args.concurrency, args.seconds))
+            parent.send('report')
+            result['loop_lag'] = _summary_ms(parent.recv())
+            report['scenarios'][name] = result
+            print(f"{name}: {result['rps']} rps, p99 {result['latency']['p99_ms']} ms, "
+                  f"loop lag p99 {result['loop_lag']['p99_ms']} ms", file=sys.stderr)
+    finally:
+        parent.send('stop')
+        processes[2].join(timeout=10)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+    return report
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+    """Relative change per scenario for RPS, latency percentiles and loop lag p99."""
+    def change(new: float, old: float) -> str:
+        return f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+
+    changes: Dict[str, Dict[str, str]] = {}
+    for name, result in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        changes[name] = {
+            'rps': change(result['rps'], before['rps']),
+            **{key: change(result['latency'][key], before['latency'][key]) for key in ('p50_ms', 'p95_ms', 'p99_ms')},
+            'loop_lag_p99_ms': change(result['loop_lag']['p99_ms'], before['loop_lag']['p99_ms']),
+        }
+    return changes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma-separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight at once.')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Duration of each scenario.')
+    parser.add_argument('--openai-latency', type=float, default=0.3)
+    parser.add_argument('--openai-jitter', type=float, default=0.1)
+    parser.add_argument('--openai-error-rate', type=float, default=0.0)
+    parser.add_argument('--openai-concurrency', type=int, default=64, help='OPENAI_MAX_CONCURRENCY for the app.')
+    parser.add_argument('--db-latency', type=float, default=0.005)
+    parser.add_argument('--output', help='Report path (default: benchmarks/results/<commit>.json).')
+    parser.add_argument('--compare', help='Earlier report to diff against.')
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios.split(',')) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    result = run(args)
+    if args.compare:
+        result['compared_to'] = {'path': args.compare, 'changes': compare(result, json.loads(Path(args.compare).read_text()))}
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{result['commit'] or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2) + '\n')
+    print(json.dumps(result, indent=2))
+    print(f'wrote {output}', file=sys.stderr)
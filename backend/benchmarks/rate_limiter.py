@@ -0,0 +1,115 @@
+"""Throughput and cross-worker accuracy of the rate-limit backends.
+
+For each backend, ``--workers`` processes hammer the same bucket for
+``--seconds``. The report shows how many units each backend let through
+compared with what the policy allows (capacity plus refill over the run), plus
+per-call latency. The per-process ``memory`` backend is expected to overshoot
+by roughly ``--workers`` times; ``shared`` and ``redis`` should not. The redis
+backend runs against the in-process ``benchmarks.fake_redis`` stand-in.
+
+    python -m benchmarks.rate_limiter --workers 4 --seconds 2
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+
+from app.utils.limiter import BucketPolicy, MemoryBucketStore, RedisBucketStore, SharedMemoryBucketStore
+
+from .fake_redis import FakeRedis
+
+POLICY = BucketPolicy(capacity=100, refill_per_second=50)
+
+
+def _make_store(backend: str, target: str):
+    if backend == 'memory':
+        return MemoryBucketStore()
+    if backend == 'shared':
+        return SharedMemoryBucketStore(target, slots=1024)
+    return RedisBucketStore(target, pool_size=4)
+
+
+async def _hammer(backend: str, target: str, deadline: float) -> dict:
+    store = _make_store(backend, target)
+    allowed = calls = 0
+    latencies: list[float] = []
+    while time.time() < deadline:
+        started = time.perf_counter()
+        result = await store.take('user:bench', 1, POLICY)
+        latencies.append(time.perf_counter() - started)
+        calls += 1
+        allowed += result.allowed
+        # Yield so a worker does not spin on one core without ever sleeping.
+        await asyncio.sleep(0)
+    await store.aclose()
+    return {'calls': calls, 'allowed': allowed, 'latencies': latencies}
+
+
+def _worker(backend: str, target: str, start_at: float, seconds: float, results) -> None:
+    while time.time() < start_at:
+        time.sleep(0.001)
+    results.put(asyncio.run(_hammer(backend, target, start_at + seconds)))
+
+
+def _run_backend(backend: str, target: str, workers: int, seconds: float) -> dict:
+    results = multiprocessing.Queue()
+    start_at = time.time() + 0.5
+    processes = [
+        multiprocessing.Process(target=_worker, args=(backend, target, start_at, seconds, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = sorted(latency for outcome in outcomes for latency in outcome['latencies'])
+    calls = sum(outcome['calls'] for outcome in outcomes)
+    return {
+        'calls': calls,
+        'calls_per_second': round(calls / seconds),
+        'allowed': sum(outcome['allowed'] for outcome in outcomes),
+        'policy_allows': int(POLICY.capacity + POLICY.refill_per_second * seconds),
+        'latency_p50_us': round(statistics.median(latencies) * 1e6, 1),
+        'latency_p99_us': round(latencies[int(len(latencies) * 0.99)] * 1e6, 1),
+    }
+
+
+def _serve_fake_redis(ready) -> None:
+    async def main() -> None:
+        host, port = await FakeRedis().start()
+        ready.put(f'redis://{host}:{port}/0')
+        await asyncio.Event().wait()
+    asyncio.run(main())
+
+
+def main(workers: int, seconds: float) -> dict:
+    report = {'workers': workers, 'seconds': seconds}
+    report['memory'] = _run_backend('memory', '', workers, seconds)
+
+    with tempfile.TemporaryDirectory() as directory:
+        report['shared'] = _run_backend('shared', os.path.join(directory, 'buckets.bin'), workers, seconds)
+
+    ready = multiprocessing.Queue()
+    server = multiprocessing.Process(target=_serve_fake_redis, args=(ready,), daemon=True)
+    server.start()
+    try:
+        report['redis'] = _run_backend('redis', ready.get(timeout=10), workers, seconds)
+    finally:
+        server.terminate()
+        server.join()
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+    print(json.dumps(main(args.workers, args.seconds), indent=2))
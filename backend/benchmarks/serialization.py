@@ -0,0 +1,150 @@
+"""CPU per /pipeline/run spent on JSON, stdlib path versus the orjson/pydantic-core path.
+
+Builds a ``PipelineRunResponse``-sized result (8 ideas, 8 angles, 4+4 tweets,
+2 threads) and times, per request:
+
+- parsing the LLM replies for ideas, angles and shitpost: ``json.loads`` then
+  ``model_validate`` versus ``model_validate_json`` on the raw text;
+- rendering the idea/angle lists into the stage 3-5 prompts: ``model_dump``
+  then ``json.dumps(indent=2)`` for every prompt versus one cached
+  ``prompt_json`` per list;
+- writing the response: FastAPI's ``response_model`` handling plus
+  ``JSONResponse`` versus ``ModelResponse``.
+
+    python -m benchmarks.serialization --repeat 2000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Callable, Dict
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.schemas import IdeasResponse, InsightAnglesResponse, PipelineRunResponse, ShitpostResponse
+from app.utils.serialization import ModelResponse
+
+IDEAS = {
+    'ideas': [
+        {
+            'title': f'Idea {index}: the onboarding rewrite nobody noticed',
+            'summary': 'Users judge the paint, not the plumbing; three weeks of refactoring went unseen. ' * 2,
+            'virality': 3,
+            'relatability': 4,
+            'emotional_punch': 2,
+        }
+        for index in range(8)
+    ]
+}
+ANGLES = {
+    'angles': [
+        {'idea_title': f'Idea {index}', 'angle': 'Contrarian take: invisible work is the job, say so out loud. ' * 2}
+        for index in range(8)
+    ]
+}
+SHITPOST = {'shitpost': 'shipping on a friday because the vibes said so'}
+RESULT = {
+    'session_id': '9b1f3c1e-6d5a-4b8e-9a57-3f1d2c4b5a6e',
+    'voice_profile': {
+        'voice_profile': 'Dry, direct builder voice with self-deprecating asides.',
+        'stylistic_quirks': ['short declarative openers', 'parenthetical jokes', 'numbers over adjectives'],
+        'persona': 'Tired but hopeful indie hacker',
+        'tone_scores': {
+            'professional_casual': 62,
+            'polished_chaotic': 48,
+            'calm_enraged': 35,
+            'optimistic_cynical': 55,
+            'insightful_entertaining': 58,
+            'clean_profane': 20,
+        },
+    },
+    'ideas': IDEAS,
+    'angles': ANGLES,
+    'tweets': {
+        'short_tweets': [f'Short tweet {index}: nobody sees the plumbing.' for index in range(4)],
+        'long_tweets': [f'Long tweet {index}: ' + 'three weeks of refactoring and they noticed the button. ' * 4 for index in range(4)],
+        'threads': [[f'Thread {thread} post {post}: ' + 'the signup form had nine fields. ' * 3 for post in range(4)] for thread in range(2)],
+    },
+    'shitpost': SHITPOST,
+}
+
+
+def _time(fn: Callable[[], Any], repeat: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def run(repeat: int) -> Dict[str, Any]:
+    replies = {model: json.dumps(payload) for model, payload in (
+        (IdeasResponse, IDEAS), (InsightAnglesResponse, ANGLES), (ShitpostResponse, SHITPOST)
+    )}
+    ideas = IdeasResponse.model_validate(IDEAS)
+    angles = InsightAnglesResponse.model_validate(ANGLES)
+    response = PipelineRunResponse.model_validate(RESULT)
+    field = create_response_field('Response_run_pipeline', PipelineRunResponse)
+    loop = asyncio.new_event_loop()
+
+    def parse_legacy() -> None:
+        for model, text in replies.items():
+            model.model_validate(json.loads(text))
+
+    def parse_direct() -> None:
+        for model, text in replies.items():
+            model.model_validate_json(text)
+
+    def prompts_legacy() -> None:
+        json.dumps(ideas.model_dump()['ideas'], indent=2)
+        for _ in range(2):
+            json.dumps(angles.model_dump()['angles'], indent=2)
+
+    def prompts_fragments() -> None:
+        # Fresh instances, as each request has; the second angles render is a cache hit.
+        fresh_ideas = IdeasResponse.model_construct(ideas=ideas.ideas)
+        fresh_angles = InsightAnglesResponse.model_construct(angles=angles.angles)
+        fresh_ideas.prompt_json
+        for _ in range(2):
+            fresh_angles.prompt_json
+
+    def respond_legacy() -> None:
+        content = loop.run_until_complete(serialize_response(field=field, response_content=response))
+        JSONResponse(content)
+
+    def respond_direct() -> None:
+        ModelResponse(response)
+
+    steps = {
+        'parse_llm_replies': (parse_legacy, parse_direct),
+        'render_prompt_fragments': (prompts_legacy, prompts_fragments),
+        'write_response': (respond_legacy, respond_direct),
+    }
+    report: Dict[str, Any] = {'repeat': repeat, 'response_bytes': len(ModelResponse(response).body), 'steps': {}}
+    total_before = total_after = 0.0
+    for name, (before, after) in steps.items():
+        before_us, after_us = _time(before, repeat), _time(after, repeat)
+        total_before += before_us
+        total_after += after_us
+        report['steps'][name] = {
+            'stdlib_us': round(before_us, 1),
+            'fast_us': round(after_us, 1),
+            'speedup': round(before_us / after_us, 2),
+        }
+    report['per_request'] = {
+        'stdlib_us': round(total_before, 1),
+        'fast_us': round(total_after, 1),
+        'saved_us': round(total_before - total_after, 1),
+    }
+    loop.close()
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2000, help='Iterations per measurement.')
+    args = parser.parse_args()
+    print(json.dumps(run(args.repeat), indent=2))
@@ -0,0 +1,121 @@
+"""Compare the local tone scorer with reference tone scores, and optionally refit its weights.
+
+Reads ``benchmarks/data/tone_calibration.jsonl`` (one ``{"text", "scores",
+"source"}`` object per line) and reports, per dimension, the mean absolute
+error and Pearson correlation between ``LocalToneScorer`` and the reference
+scores, plus the scorer's latency per text. The committed references are
+hand-labelled (``"source": "hand"``). ``--relabel`` replaces them with the
+configured model's answers to the ``/tone/analyze`` prompt (needs
+``OPENAI_API_KEY``), so the set tracks the scores the refinement mode returns.
+
+``--fit`` (needs NumPy) solves a ridge regression from the scaled features to
+the references' logits and prints a ``WEIGHTS`` table to paste into
+``app/services/tone_scorer.py``.
+
+    python -m benchmarks.tone_calibration
+    python -m benchmarks.tone_calibration --relabel --fit
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.services.tone_scorer import DIMENSIONS, FEATURE_NAMES, FEATURES, extract_features, local_tone_scorer, np
+
+DATA = Path(__file__).parent / 'data' / 'tone_calibration.jsonl'
+
+
+def load(path: Path) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines() if line.strip()]
+
+
+async def relabel(rows: List[Dict[str, Any]]) -> None:
+    from app.services.llm_gateway import llm_gateway
+    from app.services.tone_service import tone_service
+
+    results = await asyncio.gather(*(tone_service.try_analyze(row['text']) for row in rows))
+    for row, result in zip(rows, results):
+        if result is not None:
+            row['scores'] = result.model_dump()
+            row['source'] = llm_gateway.model
+    await llm_gateway.aclose()
+
+
+def _correlation(left: List[float], right: List[float]) -> float:
+    try:
+        return statistics.correlation(left, right)
+    except statistics.StatisticsError:
+        return float('nan')
+
+
+def evaluate(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    texts = [row['text'] for row in rows]
+    latencies = []
+    for text in texts:
+        started = time.perf_counter()
+        local_tone_scorer.score(text)
+        latencies.append(time.perf_counter() - started)
+    predicted = [score.model_dump() for score in local_tone_scorer.score_many(texts)]
+
+    dimensions = {}
+    for dimension in DIMENSIONS:
+        ours = [float(score[dimension]) for score in predicted]
+        theirs = [float(row['scores'][dimension]) for row in rows]
+        dimensions[dimension] = {
+            'mae': round(statistics.fmean(abs(a - b) for a, b in zip(ours, theirs)), 1),
+            'pearson': round(_correlation(ours, theirs), 2),
+        }
+    latencies.sort()
+    return {
+        'texts': len(rows),
+        'sources': sorted({row.get('source', 'unknown') for row in rows}),
+        'numpy': np is not None,
+        'mae': round(statistics.fmean(entry['mae'] for entry in dimensions.values()), 1),
+        'dimensions': dimensions,
+        'latency_us': {
+            'p50': round(latencies[len(latencies) // 2] * 1e6, 1),
+            'max': round(latencies[-1] * 1e6, 1),
+        },
+    }
+
+
+def fit(rows: List[Dict[str, Any]], ridge: float) -> Dict[str, Any]:
+    if np is None:
+        raise SystemExit('--fit needs numpy')
+    saturation = np.asarray([FEATURES[name] for name in FEATURE_NAMES])
+    features = np.minimum(np.asarray([extract_features(row['text']) for row in rows]) / saturation, 1.0)
+    design = np.hstack([features, np.ones((len(rows), 1))])
+    penalty = ridge * np.eye(design.shape[1])
+    penalty[-1, -1] = 0.0  # leave the bias unpenalised
+    weights = {}
+    for dimension in DIMENSIONS:
+        targets = np.clip(np.asarray([row['scores'][dimension] for row in rows], dtype=float), 1, 99) / 100
+        logits = np.log(targets / (1 - targets))
+        solution = np.linalg.solve(design.T @ design + penalty, design.T @ logits)
+        weights[dimension] = (
+            round(float(solution[-1]), 2),
+            {name: round(float(value), 2) for name, value in zip(FEATURE_NAMES, solution[:-1]) if abs(value) >= 0.05},
+        )
+    return weights
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', type=Path, default=DATA)
+    parser.add_argument('--relabel', action='store_true', help='Re-score every text with the model and save the file.')
+    parser.add_argument('--fit', action='store_true', help='Print refitted WEIGHTS (needs numpy).')
+    parser.add_argument('--ridge', type=float, default=1.0, help='L2 penalty for --fit.')
+    args = parser.parse_args()
+
+    rows = load(args.data)
+    if args.relabel:
+        asyncio.run(relabel(rows))
+        args.data.write_text(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows), encoding='utf-8')
+    report = evaluate(rows)
+    if args.fit:
+        report['fitted_weights'] = fit(rows, args.ridge)
+    print(json.dumps(report, indent=2))
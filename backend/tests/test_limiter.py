@@ -0,0 +1,135 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.config import Settings
+from app.main import app
+from app.utils.auth import get_current_user
+from app.utils.limiter import (
+    BucketPolicy,
+    MemoryBucketStore,
+    RateLimiter,
+    RedisBucketStore,
+    SharedMemoryBucketStore,
+    limiter,
+)
+from benchmarks.fake_redis import FakeRedis
+
+
+@asynccontextmanager
+async def memory_store(_):
+    store = MemoryBucketStore()
+    yield store
+    await store.aclose()
+
+
+@asynccontextmanager
+async def shared_store(tmp_path):
+    store = SharedMemoryBucketStore(str(tmp_path / 'buckets.bin'), slots=64)
+    yield store
+    await store.aclose()
+
+
+@asynccontextmanager
+async def redis_store(_):
+    server = FakeRedis()
+    host, port = await server.start()
+    store = RedisBucketStore(f'redis://{host}:{port}/0')
+    try:
+        yield store
+    finally:
+        await store.aclose()
+        await server.close()
+
+
+STORES = pytest.mark.parametrize('open_store', [memory_store, shared_store, redis_store], ids=['memory', 'shared', 'redis'])
+
+
+@STORES
+def test_store_allows_until_empty_then_denies_with_retry_after(open_store, tmp_path):
+    policy = BucketPolicy(capacity=3, refill_per_second=1)
+
+    async def scenario():
+        async with open_store(tmp_path) as store:
+            first = await store.take('user:a', 2, policy)
+            second = await store.take('user:a', 2, policy)
+            return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.allowed and first.remaining == pytest.approx(1, abs=0.05)
+    assert not second.allowed
+    assert second.remaining == pytest.approx(1, abs=0.05)
+    assert second.retry_after == pytest.approx(1, abs=0.05)
+
+
+@STORES
+def test_store_refills_over_time(open_store, tmp_path):
+    policy = BucketPolicy(capacity=2, refill_per_second=50)
+
+    async def scenario():
+        async with open_store(tmp_path) as store:
+            drained = await store.take('user:a', 2, policy)
+            denied = await store.take('user:a', 1, policy)
+            await asyncio.sleep(denied.retry_after + 0.02)
+            refilled = await store.take('user:a', 1, policy)
+            return drained, denied, refilled
+
+    drained, denied, refilled = asyncio.run(scenario())
+    assert drained.allowed
+    assert not denied.allowed and 0 < denied.retry_after <= 0.03
+    assert refilled.allowed
+
+
+@STORES
+def test_store_keeps_buckets_per_key(open_store, tmp_path):
+    policy = BucketPolicy(capacity=1, refill_per_second=0.01)
+
+    async def scenario():
+        async with open_store(tmp_path) as store:
+            return [
+                (await store.take(key, 1, policy)).allowed
+                for key in ('user:a', 'user:b', 'user:a')
+            ]
+
+    assert asyncio.run(scenario()) == [True, True, False]
+
+
+def _request() -> Request:
+    return Request({'type': 'http', 'method': 'POST', 'path': '/', 'headers': [], 'client': ('203.0.113.7', 1234)})
+
+
+def test_charge_larger_than_the_bucket_is_refused_with_413():
+    rate_limiter = RateLimiter(
+        Settings(rate_limit_enabled=True, rate_limit_plans='anonymous=10/60,free=30/60'),
+        store=MemoryBucketStore()
+    )
+
+    async def scenario():
+        allowed = await rate_limiter.units_allowed(_request(), None, 'pipeline_batch')
+        with pytest.raises(HTTPException) as refused:
+            await rate_limiter.hit(_request(), None, 'pipeline_batch', units=3)
+        charged = await rate_limiter.hit(_request(), None, 'pipeline_batch', units=2)
+        return allowed, refused.value, charged
+
+    allowed, refused, charged = asyncio.run(scenario())
+    assert allowed == ('anonymous', 2)
+    assert refused.status_code == 413
+    assert charged.allowed and charged.remaining == pytest.approx(0, abs=0.05)
+
+
+def test_batch_larger_than_the_plan_allows_is_refused_with_413(monkeypatch):
+    monkeypatch.setattr(limiter, 'enabled', True)
+    monkeypatch.setattr(limiter, 'plans', {'free': BucketPolicy(capacity=30, refill_per_second=0.5)})
+    monkeypatch.setattr(limiter, '_store', MemoryBucketStore())
+    app.dependency_overrides[get_current_user] = lambda: {'id': 'user-1'}
+    try:
+        response = TestClient(app).post('/pipeline/batch', json={'notes': ['note'] * 7})
+    finally:
+        app.dependency_overrides.pop(get_current_user)
+
+    assert response.status_code == 413
+    assert response.json()['detail'] == 'A batch can contain at most 6 notes on the free plan'
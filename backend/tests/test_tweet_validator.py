@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+
+from app.services.tweet_validator import (
+    LONG_MIN,
+    SHORT_MAX,
+    THREAD_MAX,
+    TWEET_MAX,
+    find_issues,
+    normalize_batch,
+    repair_tweets,
+    slot_issues,
+    weighted_length,
+)
+
+
+def _batch(**overrides):
+    batch = {
+        'short_tweets': ['short one', 'short two', 'short three', 'short four'],
+        'long_tweets': [f'long tweet number {index} ' + 'word ' * 25 for index in range(4)],
+        'threads': [['thread a1', 'thread a2', 'thread a3'], ['thread b1', 'thread b2', 'thread b3']],
+    }
+    batch.update(overrides)
+    return batch
+
+
+def _problems(batch):
+    return [(issue.slot, issue.problem, issue.detail) for issue in find_issues(batch)]
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('hello', 5),
+    ('see https://example.com/a/very/long/path?with=query', 4 + 23),
+    ('example.com', 23),
+    ('\U0001F525', 2),
+    ('\U0001F44D\U0001F3FD', 2),
+    ('\U0001F468\u200d\U0001F469\u200d\U0001F467', 2),
+    ('\U0001F1FA\U0001F1F8', 2),
+    ('你好', 4),
+    ('é', 1),
+    ('“smart quotes”', 14),
+])
+def test_weighted_length_counts_links_emoji_and_cjk_like_twitter(text, expected):
+    assert weighted_length(text) == expected
+
+
+def test_well_formed_batch_has_no_issues():
+    assert find_issues(_batch()) == []
+
+
+def test_short_tweets_must_stay_under_100():
+    batch = _batch(short_tweets=['a' * SHORT_MAX, 'b' * (SHORT_MAX + 1), '你' * 50, 'short four'])
+
+    assert _problems(batch) == [
+        ('short_tweets[1]', 'too_long', 'was 100 characters'),
+        ('short_tweets[2]', 'too_long', 'was 100 characters'),
+    ]
+
+
+def test_long_tweets_must_be_between_100_and_280():
+    with_link = 'a' * 77 + ' https://example.com'
+    batch = _batch(long_tweets=['a' * (LONG_MIN - 1), 'b' * TWEET_MAX, 'c' * (TWEET_MAX + 1), with_link])
+
+    assert len(with_link) < LONG_MIN
+    assert _problems(batch) == [
+        ('long_tweets[0]', 'too_short', 'was 99 characters'),
+        ('long_tweets[2]', 'too_long', 'was 281 characters'),
+    ]
+
+
+def test_thread_posts_must_fit_in_a_tweet():
+    batch = _batch(threads=[['thread a1', 'x' * (TWEET_MAX + 1), ''], ['thread b1', 'thread b2', 'thread b3']])
+
+    assert _problems(batch) == [
+        ('threads[0][1]', 'too_long', 'was 281 characters'),
+        ('threads[0][2]', 'empty', 'was empty'),
+    ]
+
+
+def test_normalize_batch_pads_missing_slots_and_bounds_threads():
+    batch = normalize_batch(['only one', 7], None, [['t'] * (THREAD_MAX + 2)])
+
+    assert batch['short_tweets'] == ['only one', '', '', '']
+    assert batch['long_tweets'] == ['', '', '', '']
+    assert batch['threads'] == [['t'] * THREAD_MAX, ['', '', '']]
+    assert {issue.problem for issue in find_issues(batch)} == {'empty', 'duplicate'}
+
+
+def test_repeats_are_flagged_against_the_first_occurrence():
+    batch = _batch(short_tweets=['short one', 'Short one!', 'short three', 'short four'])
+    batch['threads'][1][0] = 'SHORT ONE'
+
+    assert _problems(batch) == [
+        ('short_tweets[1]', 'duplicate', 'repeated short_tweets[0]'),
+        ('threads[1][0]', 'duplicate', 'repeated short_tweets[0]'),
+    ]
+
+
+def test_slot_issues_include_the_slots_that_repeat_it():
+    batch = _batch(short_tweets=['short one', 'short one', 'x' * 120, 'short four'])
+
+    assert [issue.slot for issue in slot_issues(batch, 'short_tweets', 0)] == ['short_tweets[1]']
+    assert [issue.slot for issue in slot_issues(batch, 'short_tweets', 2)] == ['short_tweets[2]']
+    assert slot_issues(batch, 'long_tweets', 0) == []
+
+
+def _call_returning(slots, prompts=None):
+    async def call(prompt, stage):
+        if prompts is not None:
+            prompts.append((prompt, stage))
+        return {'slots': slots}
+
+    return call
+
+
+def test_repair_replaces_only_the_failing_slots():
+    batch = _batch(short_tweets=['x' * 120, 'short two', 'short three', 'short four'])
+    prompts = []
+
+    repaired, events = asyncio.run(repair_tweets(
+        batch, _call_returning({'short_tweets[0]': ' fixed short '}, prompts), stage='tweets_repair', context='note'
+    ))
+
+    assert repaired['short_tweets'] == ['fixed short', 'short two', 'short three', 'short four']
+    assert repaired['long_tweets'] == batch['long_tweets']
+    assert events == [{'kind': 'short_tweets', 'index': 0, 'text': 'fixed short'}]
+    assert batch['short_tweets'][0] == 'x' * 120
+    [(prompt, stage)] = prompts
+    assert stage == 'tweets_repair'
+    assert '- short_tweets[0]: a short tweet under 100 characters (was 120 characters)' in prompt
+    assert '- short_tweets[1]: short two' in prompt
+
+
+def test_repair_discards_replacements_that_still_fail():
+    batch = _batch(
+        short_tweets=['x' * 120, 'short two', 'short three', 'short four'],
+        threads=[['thread a1', '', 'thread a3'], ['thread b1', 'thread b2', 'thread b3']],
+    )
+    replacements = {'short_tweets[0]': 'y' * 150, 'threads[0][1]': 'short two', 'long_tweets[0]': 'not asked for'}
+
+    repaired, events = asyncio.run(repair_tweets(
+        batch, _call_returning(replacements), stage='tweets_repair', context='note'
+    ))
+
+    assert repaired == batch
+    assert events == []
+
+
+def test_repair_keeps_the_batch_when_the_call_fails():
+    batch = _batch(short_tweets=['', 'short two', 'short three', 'short four'])
+
+    async def call(prompt, stage):
+        raise RuntimeError('model unavailable')
+
+    repaired, events = asyncio.run(repair_tweets(batch, call, stage='tweets_repair', context='note'))
+
+    assert repaired is batch
+    assert events == []
+
+
+def test_repair_skips_the_call_when_nothing_fails():
+    async def call(prompt, stage):  # pragma: no cover - must not be reached
+        raise AssertionError('no repair call expected')
+
+    batch = _batch()
+
+    assert asyncio.run(repair_tweets(batch, call, stage='tweets_repair', context='note')) == (batch, [])
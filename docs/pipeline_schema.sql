@@ -36,6 +36,10 @@ create table if not exists public.shitposts (
   created_at timestamptz default now()
 );
 
+-- The session's note text, so /pipeline/stage/{voice,ideas} can regenerate
+-- without the client resending it.
+alter table public.voice_profiles add column if not exists note_text text;
+
 -- Usage table + increment function expected by backend/app/utils/usage.py
 create table if not exists public.usage (
   user_id uuid references auth.users(id) on delete cascade,
@@ -61,3 +65,105 @@ begin
   end if;
 end;
 $$;
+
+-- Bulk variant used by the backend's write-behind usage buffer: p_rows is a
+-- jsonb array of {user_id, month, uploads, generations} deltas.
+create or replace function public.increment_usage_bulk(p_rows jsonb)
+returns void
+language sql
+as $$
+  insert into public.usage as u (user_id, month, uploads, generations)
+  select (r->>'user_id')::uuid,
+         r->>'month',
+         coalesce((r->>'uploads')::int, 0),
+         coalesce((r->>'generations')::int, 0)
+  from jsonb_array_elements(p_rows) as r
+  on conflict (user_id, month) do update
+    set uploads = u.uploads + excluded.uploads,
+        generations = u.generations + excluded.generations;
+$$;
+
+-- Single-round-trip preflight for /generate: returns the note content, plan
+-- and current counters, and atomically reserves one generation slot. The
+-- usage row is locked while checking so concurrent requests cannot both
+-- take the last free slot. p_pending carries increments the backend has
+-- buffered but not flushed yet. No slot is reserved when the free limit is
+-- reached, or when p_require_note is set and the note does not exist.
+create or replace function public.generation_preflight(
+  p_user_id uuid,
+  p_month text,
+  p_note_id uuid default null,
+  p_free_limit integer default 25,
+  p_pending integer default 0,
+  p_require_note boolean default false
+)
+returns table (note_content text, plan text, uploads integer, generations integer, reserved boolean)
+language plpgsql
+as $$
+declare
+  v_plan text;
+  v_content text;
+  v_uploads integer;
+  v_generations integer;
+begin
+  select coalesce(u.plan, 'free') into v_plan from public.users u where u.id = p_user_id;
+  v_plan := coalesce(v_plan, 'free');
+
+  if p_note_id is not null then
+    select n.content into v_content from public.notes n where n.id = p_note_id and n.user_id = p_user_id;
+  end if;
+
+  insert into public.usage (user_id, month, uploads, generations)
+  values (p_user_id, p_month, 0, 0)
+  on conflict (user_id, month) do nothing;
+
+  select u.uploads, u.generations into v_uploads, v_generations
+  from public.usage u
+  where u.user_id = p_user_id and u.month = p_month
+  for update;
+
+  if (p_require_note and v_content is null)
+     or (v_plan = 'free' and v_generations + p_pending >= p_free_limit) then
+    return query select v_content, v_plan, v_uploads, v_generations, false;
+    return;
+  end if;
+
+  update public.usage u
+  set generations = u.generations + 1
+  where u.user_id = p_user_id and u.month = p_month
+  returning u.uploads, u.generations into v_uploads, v_generations;
+
+  return query select v_content, v_plan, v_uploads, v_generations, true;
+end;
+$$;
+
+-- Returns a slot taken by generation_preflight when the LLM call fails.
+create or replace function public.refund_generation(p_user_id uuid, p_month text)
+returns void
+language sql
+as $$
+  update public.usage
+  set generations = greatest(generations - 1, 0)
+  where user_id = p_user_id and month = p_month;
+$$;
+
+-- Keyset pagination for GET /drafts: newest first, ties broken by id.
+create index if not exists drafts_user_created_idx
+  on public.drafts (user_id, created_at desc, id desc);
+
+-- Upload de-duplication: one notes row per (user, normalized text hash).
+alter table public.notes add column if not exists content_hash text;
+create unique index if not exists notes_user_content_hash_idx
+  on public.notes (user_id, content_hash);
+
+-- Note-level LLM analyses (kind = 'voice' | 'tone') reused across uploads and
+-- pipeline runs of the same text. Rows from another model are ignored.
+create table if not exists public.note_analyses (
+  user_id uuid references auth.users(id) on delete cascade,
+  content_hash text not null,
+  kind text not null,
+  model text not null,
+  data jsonb not null,
+  created_at timestamptz default now(),
+  primary key (user_id, content_hash, kind)
+);
@@ -6,7 +6,7 @@ type UploadZoneProps = {
 
 const ACCEPTED_TYPES = ['text/plain', 'text/markdown'];
 const ACCEPTED_EXTENSIONS = ['.txt', '.md'];
-const MAX_BYTES = 50 * 1024;
+const MAX_BYTES = 512 * 1024;
 
 const UploadZone = ({ onUpload }: UploadZoneProps) => {
   const [status, setStatus] = useState<string | null>(null);
@@ -22,7 +22,7 @@ const UploadZone = ({ onUpload }: UploadZoneProps) => {
     }
 
     if (file.size > MAX_BYTES) {
-      setStatus('Files must be smaller than 50 KB.');
+      setStatus('Files must be smaller than 512 KB.');
       return;
     }
 
@@ -60,7 +60,7 @@ const UploadZone = ({ onUpload }: UploadZoneProps) => {
       return;
     }
     if (new Blob([text]).size > MAX_BYTES) {
-      setStatus('Pasted text must be smaller than 50 KB.');
+      setStatus('Pasted text must be smaller than 512 KB.');
       return;
     }
     setStatus(`Captured ${text.length} characters from clipboard.`);
@@ -76,7 +76,7 @@ const UploadZone = ({ onUpload }: UploadZoneProps) => {
         className="flex cursor-pointer flex-col items-center justify-center rounded-lg border border-dashed border-slate-300 px-6 py-10 text-center transition hover:border-[#1d9bf0] hover:bg-slate-50"
       >
         <span className="text-lg font-semibold text-slate-900">Upload or drop your notes</span>
-        <span className="mt-2 text-sm text-slate-500">Supports .txt or .md up to 50 KB</span>
+        <span className="mt-2 text-sm text-slate-500">Supports .txt or .md up to 512 KB</span>
         <input id="upload" name="note-file" type="file" accept=".txt,.md" className="hidden" onChange={onChange} />
       </label>
 
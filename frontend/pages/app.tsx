@@ -5,7 +5,7 @@ import ToneSlider, { ToneKey, TONE_LABELS } from '@/components/ToneSlider';
 import EditableTweet from '@/components/EditableTweet';
 import UploadZone from '@/components/UploadZone';
 import { useAuth } from '@/hooks/useAuth';
-import { regenerateStage, runPipeline } from '@/utils/api';
+import { regenerateStage, regenerateTweetSlot, runPipeline } from '@/utils/api';
 import type {
   IdeaItem,
   InsightAngle,
@@ -92,33 +92,40 @@ const AppPage = () => {
   };
 
   const regenerateSlot = async (section: 'short' | 'long' | 'thread', index: number) => {
-    const output = await fetchFreshTweets();
-    if (!output) {
-      setStatusMessage('Regeneration failed.');
+    if (!session || !voiceProfile || angles.length === 0) {
+      setStatusMessage('Run voice analysis first.');
       return;
     }
-    const paddedShort = padList(output.short_tweets, 4);
-    const paddedLong = padList(output.long_tweets, 4);
-    const paddedThreads = padThreads(output.threads);
-
-    if (section === 'short') {
-      setShortTweets((prev) => {
-        const next = [...prev];
-        next[index] = paddedShort[index] ?? paddedShort[0] ?? '';
-        return next;
-      });
-    } else if (section === 'long') {
-      setLongTweets((prev) => {
-        const next = [...prev];
-        next[index] = paddedLong[index] ?? paddedLong[0] ?? '';
-        return next;
-      });
-    } else {
-      setThreads((prev) => {
-        const next = [...prev];
-        next[index] = paddedThreads[index] ?? paddedThreads[0] ?? ['', '', ''];
-        return next;
-      });
+    const kind = section === 'short' ? 'short_tweets' : section === 'long' ? 'long_tweets' : 'threads';
+    setLoading(true);
+    setMicroStatus(2);
+    try {
+      // The current (possibly edited) batch goes along so the new slot does not repeat it.
+      const response = await regenerateTweetSlot(
+        kind,
+        index,
+        {
+          session_id: sessionId ?? undefined,
+          voice_profile: voiceProfile,
+          angles: { angles },
+          tweets: { short_tweets: shortTweets, long_tweets: longTweets, threads },
+          tone_overrides: tone
+        },
+        session.access_token
+      );
+      if (section === 'short') {
+        setShortTweets((prev) => prev.map((text, idx) => (idx === index ? response.tweet ?? text : text)));
+      } else if (section === 'long') {
+        setLongTweets((prev) => prev.map((text, idx) => (idx === index ? response.tweet ?? text : text)));
+      } else {
+        setThreads((prev) => prev.map((thread, idx) => (idx === index ? response.thread ?? thread : thread)));
+      }
+      setStatusMessage(section === 'thread' ? 'Thread regenerated.' : 'Tweet regenerated.');
+    } catch (err) {
+      console.error(err);
+      setStatusMessage('Regeneration failed.');
+    } finally {
+      setLoading(false);
     }
   };
 
@@ -1,5 +1,7 @@
 export type StageLiteral = 'voice' | 'ideas' | 'angles' | 'tweets' | 'shitpost';
 
+export type SlotKind = 'short_tweets' | 'long_tweets' | 'threads';
+
 export interface ToneProfile {
   professional_casual: number;
   polished_chaotic: number;
@@ -75,3 +77,40 @@ export interface PipelineStageRequest {
   session_id?: string;
   tone_overrides?: ToneProfile;
 }
+
+export interface PipelineSlotRequest {
+  session_id?: string;
+  voice_profile?: VoiceProfile;
+  angles?: InsightAnglesResponse;
+  tweets?: TweetOutput;
+  tone_overrides?: ToneProfile;
+}
+
+export interface PipelineSlotResponse {
+  session_id: string;
+  kind: SlotKind;
+  index: number;
+  tweet?: string | null;
+  thread?: string[] | null;
+  tweets: TweetOutput;
+}
+
+export type BatchStatus = 'queued' | 'running' | 'completed' | 'failed';
+
+export interface PipelineBatchItem {
+  index: number;
+  session_id: string;
+  status: BatchStatus;
+  result?: PipelineRunResponse | null;
+  error?: string | null;
+}
+
+export interface PipelineBatchResponse {
+  job_id: string;
+  status: BatchStatus;
+  total: number;
+  completed: number;
+  failed: number;
+  created_at: string;
+  items: PipelineBatchItem[];
+}
@@ -1,7 +1,11 @@
 import type {
+  PipelineBatchResponse,
   PipelineRunResponse,
+  PipelineSlotRequest,
+  PipelineSlotResponse,
   PipelineStageRequest,
   PipelineStageResponse,
+  SlotKind,
   StageLiteral,
   ToneProfile
 } from '@/types/pipeline';
@@ -32,9 +36,97 @@ export const postJson = async <TData = unknown, TResponse = unknown>(
 };
 
 export const runPipeline = (
-  data: { note_text: string; include_shitpost?: boolean; session_id?: string; tone_overrides?: ToneProfile },
+  data: {
+    note_text: string;
+    include_shitpost?: boolean;
+    session_id?: string;
+    tone_overrides?: ToneProfile;
+    fast_mode?: boolean;
+  },
   token: string
 ) => postJson<typeof data, PipelineRunResponse>('/pipeline/run', data, token);
 
 export const regenerateStage = (stage: StageLiteral, data: PipelineStageRequest, token: string) =>
   postJson<PipelineStageRequest, PipelineStageResponse>(`/pipeline/stage/${stage}`, data, token);
+
+export const regenerateTweetSlot = (kind: SlotKind, index: number, data: PipelineSlotRequest, token: string) =>
+  postJson<PipelineSlotRequest, PipelineSlotResponse>(`/pipeline/tweets/${kind}/${index}`, data, token);
+
+export const submitPipelineBatch = (
+  data: { notes: string[]; include_shitpost?: boolean; tone_overrides?: ToneProfile; fast_mode?: boolean },
+  token: string
+) => postJson<typeof data, PipelineBatchResponse>('/pipeline/batch', data, token);
+
+export const getPipelineBatch = async (jobId: string, token: string): Promise<PipelineBatchResponse> => {
+  const response = await fetch(`${getApiBaseUrl()}/pipeline/batch/${jobId}`, {
+    headers: { Authorization: `Bearer ${token}` }
+  });
+
+  if (!response.ok) {
+    const detail = await response.text();
+    throw new Error(`Request failed: ${response.status} ${detail}`);
+  }
+
+  return (await response.json()) as PipelineBatchResponse;
+};
+
+export type PipelineStreamEvent =
+  | { event: 'session'; data: { session_id: string } }
+  | { event: StageLiteral; data: unknown }
+  | { event: 'done'; data: { session_id: string } }
+  | { event: 'error'; data: { detail: string } };
+
+export const postEventStream = async (
+  path: string,
+  data: unknown,
+  token: string,
+  onEvent: (event: string, data: unknown) => void
+): Promise<void> => {
+  const response = await fetch(`${getApiBaseUrl()}${path}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Accept: 'text/event-stream',
+      Authorization: `Bearer ${token}`
+    },
+    body: JSON.stringify(data)
+  });
+
+  if (!response.ok || !response.body) {
+    const detail = await response.text();
+    throw new Error(`Request failed: ${response.status} ${detail}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const event = block.match(/^event: (.*)$/m)?.[1] ?? 'message';
+      const payload = block.match(/^data: (.*)$/m)?.[1];
+      if (payload !== undefined) onEvent(event, JSON.parse(payload));
+      boundary = buffer.indexOf('\n\n');
+    }
+  }
+};
+
+export const runPipelineStream = (
+  data: {
+    note_text: string;
+    include_shitpost?: boolean;
+    session_id?: string;
+    tone_overrides?: ToneProfile;
+    fast_mode?: boolean;
+  },
+  token: string,
+  onEvent: (event: PipelineStreamEvent) => void
+) =>
+  postEventStream('/pipeline/run/stream', data, token, (event, payload) =>
+    onEvent({ event, data: payload } as PipelineStreamEvent)
+  );